@@ -0,0 +1,197 @@
+# backend/analytics.py
+
+import os
+import time
+from collections import defaultdict
+
+from flask import current_app
+from sqlalchemy import Integer, cast, func, select
+
+from cache import create_cache
+from config import db
+from models import Show, Venue, Band, ShowBand, Review
+
+DEFAULT_CACHE_SECONDS = 300
+DEFAULT_PRICE_BUCKET = 10
+DEFAULT_BANDS = 20
+MAX_BANDS = 100
+PERCENTILES = (25, 50, 75, 90)
+GROSS_GROUPS = ('city', 'venue', 'month')
+
+# Every report is one or two GROUP BY queries over the columns it needs; no
+# rows are loaded as objects.
+
+
+def month(column):
+    """"YYYY-MM" of a date column, computed by the database."""
+    if db.engine.dialect.name == 'sqlite':
+        return func.strftime('%Y-%m', column)
+    return func.to_char(column, 'YYYY-MM')
+
+
+def in_range(query, start, end):
+    if start:
+        query = query.where(Show.date >= start)
+    if end:
+        query = query.where(Show.date <= end)
+    return query
+
+
+def shows_per_city(start=None, end=None, city=None):
+    period = month(Show.date).label('month')
+    query = (select(Venue.city, period, func.count().label('shows'))
+             .select_from(Show)
+             .join(Venue, Venue.id == Show.venue_id)
+             .where(Show.date.isnot(None))
+             .group_by(Venue.city, period)
+             .order_by(Venue.city, period))
+    if city:
+        query = query.where(Venue.city == city)
+    return [dict(row) for row in db.session.execute(in_range(query, start, end)).mappings()]
+
+
+def percentiles(histogram, count, low, high, width):
+    """Percentiles interpolated within the buckets of histogram ({bucket: count})."""
+    estimates = {}
+    buckets = sorted(histogram.items())
+    for percentile in PERCENTILES:
+        target = count * percentile / 100
+        seen = 0
+        for bucket, in_bucket in buckets:
+            if seen + in_bucket >= target:
+                value = (bucket + (target - seen) / in_bucket) * width
+                estimates[f'p{percentile}'] = round(min(max(value, low), high), 2)
+                break
+            seen += in_bucket
+    return estimates
+
+
+def ticket_prices(start=None, end=None, width=DEFAULT_PRICE_BUCKET):
+    """Ticket price statistics and a histogram per genre of the bands on the
+    bill; a show with bands of two genres counts once for each."""
+    pairs = in_range(
+        select(Show.id, Band.genre, Show.ticket_price.label('price'))
+        .join(ShowBand, ShowBand.show_id == Show.id)
+        .join(Band, Band.id == ShowBand.band_id)
+        .where(Show.ticket_price.isnot(None), Band.genre.isnot(None))
+        .distinct(),
+        start, end,
+    ).subquery()
+
+    # One pass: per genre and price bucket, from which the genre totals follow.
+    # Prices are never negative, so truncating is flooring.
+    bucket = cast(pairs.c.price / width, Integer).label('bucket')
+    genres = {}
+    for row in db.session.execute(
+        select(pairs.c.genre, bucket, func.count().label('shows'), func.min(pairs.c.price).label('min'),
+               func.max(pairs.c.price).label('max'), func.sum(pairs.c.price).label('total'))
+        .group_by(pairs.c.genre, bucket)
+        .order_by(pairs.c.genre, bucket)
+    ):
+        stats = genres.setdefault(row.genre, {'genre': row.genre, 'shows': 0, 'min': row.min, 'max': row.max,
+                                              'total': 0, 'histogram': {}})
+        stats['shows'] += row.shows
+        stats['min'] = min(stats['min'], row.min)
+        stats['max'] = max(stats['max'], row.max)
+        stats['total'] += float(row.total)
+        stats['histogram'][row.bucket] = row.shows
+
+    for stats in genres.values():
+        histogram = stats['histogram']
+        stats['average'] = round(stats.pop('total') / stats['shows'], 2)
+        stats['percentiles'] = percentiles(histogram, stats['shows'], stats['min'], stats['max'], width)
+        stats['histogram'] = [{'from': bucket * width, 'to': (bucket + 1) * width, 'shows': histogram[bucket]}
+                              for bucket in sorted(histogram)]
+    return list(genres.values())
+
+
+def band_rating_trends(band_ids=None, start=None, end=None, limit=DEFAULT_BANDS):
+    """Reviews and average rating per band per month of the reviewed show.
+
+    Without band_ids, the limit bands with the most reviews. At most
+    MAX_BANDS bands are reported.
+    """
+    if band_ids is None:
+        band_ids = db.session.execute(
+            select(Band.id).order_by(Band.rating_count.desc(), Band.id).limit(limit)
+        ).scalars().all()
+    names = dict(db.session.execute(select(Band.id, Band.name).where(Band.id.in_(band_ids))).all())
+
+    bills = (select(ShowBand.show_id, ShowBand.band_id)
+             .where(ShowBand.band_id.in_(list(names)))
+             .distinct()
+             .subquery())
+    period = month(Show.date).label('month')
+    query = (select(bills.c.band_id, period, func.count().label('reviews'),
+                    func.avg(Review.rating).label('average'))
+             .select_from(bills)
+             .join(Show, Show.id == bills.c.show_id)
+             .join(Review, Review.show_id == bills.c.show_id)
+             .where(Show.date.isnot(None))
+             .group_by(bills.c.band_id, period)
+             .order_by(bills.c.band_id, period))
+    months = defaultdict(list)
+    for row in db.session.execute(in_range(query, start, end)):
+        months[row.band_id].append({'month': row.month, 'reviews': row.reviews,
+                                    'average': round(float(row.average), 2)})
+    return [{'band_id': band_id, 'name': names[band_id], 'months': months[band_id]} for band_id in band_ids
+            if band_id in names]
+
+
+def gross(by='city', start=None, end=None, limit=None):
+    """Estimated gross (venue capacity times ticket price) per city, venue or
+    month, highest first (months in order). Shows without a capacity or price
+    count toward shows but not priced_shows."""
+    estimate = Venue.capacity * Show.ticket_price
+    if by == 'month':
+        keys = [month(Show.date).label('month')]
+    elif by == 'venue':
+        keys = [Venue.id.label('venue_id'), Venue.name, Venue.city]
+    else:
+        keys = [Venue.city]
+    query = (select(*keys, func.count().label('shows'), func.count(estimate).label('priced_shows'),
+                    func.coalesce(func.sum(estimate), 0).label('estimated_gross'))
+             .select_from(Show)
+             .join(Venue, Venue.id == Show.venue_id)
+             .group_by(*keys))
+    if by == 'month':
+        query = query.where(Show.date.isnot(None)).order_by(keys[0])
+    else:
+        query = query.order_by(func.coalesce(func.sum(estimate), 0).desc(), *keys)
+    if limit:
+        query = query.limit(limit)
+    return [dict(row) for row in db.session.execute(in_range(query, start, end)).mappings()]
+
+
+def cached_report(key, compute):
+    """(report, hit, seconds until it is recomputed) for compute().
+
+    Reports are cached per ANALYTICS_CACHE_SECONDS bucket of the clock, so
+    with a shared (Redis) cache every worker serves the same figures and they
+    all move on to fresh ones at the same moment.
+    """
+    cache = current_app.extensions.get('analytics_cache')
+    if cache is None:
+        return compute(), False, 0
+    seconds = current_app.config['ANALYTICS_CACHE_SECONDS']
+    now = time.time()
+    bucket = int(now // seconds)
+    remaining = max(int((bucket + 1) * seconds - now), 1)
+    key = f'analytics:{bucket}:{key}'
+    report = cache.get(key)
+    if report is not None:
+        return report, True, remaining
+    report = compute()
+    cache.set(key, report, ())
+    return report, False, remaining
+
+
+def init_analytics(app):
+    """ANALYTICS_CACHE_SECONDS: how long /api/analytics reports are reused
+    (default 300; 0 computes every request). Uses CACHE_URL, so call after
+    init_cache."""
+    app.config.setdefault('ANALYTICS_CACHE_SECONDS',
+                          int(os.environ.get('ANALYTICS_CACHE_SECONDS', DEFAULT_CACHE_SECONDS)))
+    seconds = app.config['ANALYTICS_CACHE_SECONDS']
+    if app.config['CACHE_ENABLED'] and seconds > 0:
+        app.extensions['analytics_cache'] = create_cache(app.config['CACHE_URL'], ttl=seconds)
@@ -1,21 +1,53 @@
 # backend/app.py
 
+import os
+
+import click
 from flask import Flask
-from flask_migrate import Migrate
+from flask.cli import with_appcontext
+from flask_migrate import Migrate, stamp, upgrade
+from sqlalchemy import inspect
 from flask_cors import CORS
 
-from config import db
+from analytics import init_analytics
+from changes import changes_cli, init_changes
+from compress import init_compression
+from config import db, init_database
+from documents import documents_cli, init_documents
+from export import export_command
+from jobs import init_jobs, jobs_cli
+from json_provider import init_json
+from metrics import init_metrics
+from ratelimit import init_ratelimit
+from cache import init_cache
+from ratings import ratings_cli
+from recommendations import init_recommendations, recommendations_cli
+from search import exclude_search_tables, init_search, search_cli
+from seed import seed_cli
 from models import Band, Venue, Show, User, Review, ShowBand, Musician
-from routes import shows_bp, reviews_bp, bands_bp, venues_bp, users_bp, musicians_bp
+from routes import shows_bp, reviews_bp, bands_bp, venues_bp, users_bp, musicians_bp, search_bp, changes_bp, analytics_bp, export_bp
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+# First migration: the schema db.create_all() produced before migrations existed.
+BASELINE_REVISION = '53a69e18a120'
 
 def create_app():
     app = Flask(__name__)
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///app.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.json.compact = False
+    init_json(app)
 
-    db.init_app(app)
-    Migrate(app, db)
+    init_database(app)
+    init_cache(app)
+    init_analytics(app)
+    init_recommendations(app)
+    init_search(app)
+    init_documents(app)
+    init_changes(app)
+    init_metrics(app)
+    init_compression(app)
+    init_ratelimit(app)
+    init_jobs(app)
+    Migrate(app, db, directory=MIGRATIONS_DIR, render_as_batch=True, include_name=exclude_search_tables)
     CORS(app)
 
     app.register_blueprint(shows_bp)
@@ -24,6 +56,19 @@ def create_app():
     app.register_blueprint(venues_bp)
     app.register_blueprint(users_bp)
     app.register_blueprint(musicians_bp)
+    app.register_blueprint(search_bp)
+    app.register_blueprint(changes_bp)
+    app.register_blueprint(analytics_bp)
+    app.register_blueprint(export_bp)
+    app.cli.add_command(ratings_cli)
+    app.cli.add_command(recommendations_cli)
+    app.cli.add_command(search_cli)
+    app.cli.add_command(seed_cli)
+    app.cli.add_command(documents_cli)
+    app.cli.add_command(changes_cli)
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(export_command)
+    app.cli.add_command(upgrade_schema_command)
 
     @app.route('/')
     def home():
@@ -35,16 +80,33 @@ def create_app():
 
     return app
 
-app = create_app()
+def upgrade_database():
+    # Databases created by db.create_all() have the baseline tables but no
+    # alembic_version table; adopt them at the baseline before upgrading.
+    tables = inspect(db.engine).get_table_names()
+    if 'shows' in tables and 'alembic_version' not in tables:
+        stamp(directory=MIGRATIONS_DIR, revision=BASELINE_REVISION)
+    upgrade(directory=MIGRATIONS_DIR)
+    # Connections opened here must not be inherited by forked workers.
+    db.engine.dispose()
+
 
-with app.app_context():
-    try:
-        db.create_all()
-        print("Database initialized successfully")
-    except Exception as e:
-        print(f"Database initialization error: {e}")
+@click.command('upgrade-schema')
+@with_appcontext
+def upgrade_schema_command():
+    """Apply pending migrations (gunicorn does this once at startup)."""
+    upgrade_database()
+    click.echo('Database schema is up to date.')
+
+
+# Importing the app does not touch the database, so gunicorn can import it
+# once in the master (preload_app) and fork workers that share its memory.
+# Migrations run once per deploy instead: in the gunicorn master (see
+# gunicorn.conf.py), under `python app.py`, or with `flask upgrade-schema`.
+app = create_app()
 
 if __name__ == '__main__':
-    import os
+    with app.app_context():
+        upgrade_database()
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,379 @@
+# backend/batch.py
+
+import json
+from collections import defaultdict
+from datetime import datetime
+from itertools import islice
+
+from flask import jsonify, request
+from sqlalchemy import UniqueConstraint, delete, func, insert, select, tuple_, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+import changes
+import documents
+import jobs
+import ratings
+import recommendations
+import search
+from cache import defer_invalidation
+from config import db
+from models import Show, Review, User, Band, Venue, Musician, ShowBand
+from serializers import MODELS, chunks, embedding_parent_ids
+from validation import CREATE_VALUES, UPDATE_VALUES
+from versioning import touch
+
+CHUNK_SIZE = 500
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/jsonl')
+READ_ONLY_COLUMNS = {'id', 'created_at', 'updated_at', *ratings.AGGREGATE_COLUMNS}
+
+# The rows ON DELETE CASCADE removes along with a row of each model, as
+# (child model, foreign key column).
+CASCADES = {
+    Venue: [(Show, Show.venue_id)],
+    Show: [(Review, Review.show_id), (ShowBand, ShowBand.show_id)],
+    Band: [(Musician, Musician.band_id), (ShowBand, ShowBand.band_id)],
+    User: [(Review, Review.user_id)],
+}
+
+
+def read_items():
+    """Return an iterator of (index, item) over a JSON array or NDJSON body.
+
+    NDJSON is parsed line by line as the request streams in, so arbitrarily
+    large feeds are processed one chunk at a time.
+    """
+    if request.mimetype in NDJSON_MIMETYPES:
+        def ndjson():
+            lines = (line for line in request.stream if line.strip())
+            for index, line in enumerate(lines):
+                try:
+                    yield index, json.loads(line)
+                except ValueError:
+                    yield index, None
+        return ndjson()
+
+    items = request.get_json(silent=True)
+    if not isinstance(items, list):
+        raise ValueError('Expected a JSON array or an NDJSON body')
+    return enumerate(items)
+
+
+def chunked(iterable, size=CHUNK_SIZE):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def record_bulk_write(model, rows, op):
+    """Cache invalidation, parent version bumps, search reindexing, show
+    document rebuilds, recommendation refreshes and change log entries for
+    rows written with Core statements, which bypass the ORM flush hooks. op
+    is 'create', 'update' or 'delete'; deletes are recorded after the DELETE,
+    so reindexing finds the rows gone."""
+    membership_changed = op != 'update'
+    table = model.__tablename__
+    tags = {table} if membership_changed else set()
+    touched = defaultdict(set)
+    for row in rows:
+        tags.add(f'{table}:{row["id"]}')
+        for parent, parent_id in embedding_parent_ids(model, row):
+            touched[parent].add(parent_id)
+            tags.add(f'{parent.__tablename__}:{parent_id}')
+    defer_invalidation(db.session, tags)
+    touch(db.session, touched)
+    search.reindex(db.session, model, {row['id'] for row in rows})
+    documents.record_rows(db.session, model, rows)
+    recommendations.record_rows(db.session, model, rows, op)
+    changes.record_rows(db.session, model, rows, op)
+
+
+def cascaded_rows(model, ids):
+    """{model: {id: row}} for the rows in ids and every row deleting them
+    cascades to, parents before children. Rows hold only the id and foreign
+    keys, which is all record_bulk_write needs."""
+    found = {}
+    pending = [(model, model.id, ids)]
+    while pending:
+        current, column, parent_ids = pending.pop(0)
+        rows = found.setdefault(current, {})
+        table = current.__table__
+        columns = [table.c.id, *(c for c in table.c if c.foreign_keys)]
+        new_ids = []
+        for chunk in chunks(sorted(parent_ids)):
+            for row in db.session.execute(select(*columns).where(column.in_(chunk))).mappings():
+                if row['id'] not in rows:
+                    rows[row['id']] = dict(row)
+                    new_ids.append(row['id'])
+        if new_ids:
+            pending += [(child, foreign_key, new_ids) for child, foreign_key in CASCADES.get(current, ())]
+    return found
+
+
+def delete_rows(model, ids):
+    """Delete the rows in ids, in the session's transaction, and return the
+    ids that existed.
+
+    Each chunk is one DELETE; the database removes the children through ON
+    DELETE CASCADE. Only their ids and foreign keys are read beforehand, for
+    the rating refreshes and the side effects that the ORM hooks apply to
+    rows they delete.
+    """
+    removed = cascaded_rows(model, ids)
+    # Removed reviews and bill entries both change rating aggregates. Schedule
+    # before the DELETE, while the bills that lead to the bands still exist.
+    ratings.schedule(row['show_id'] for rows in (removed.get(Review, {}), removed.get(ShowBand, {}))
+                     for row in rows.values())
+    for chunk in chunks(sorted(removed[model])):
+        db.session.execute(delete(model).where(model.id.in_(chunk)), execution_options={'synchronize_session': False})
+    # Children first, so each deleted parent's latest change log entry is its delete.
+    for removed_model, rows in reversed(removed.items()):
+        if rows:
+            record_bulk_write(removed_model, list(rows.values()), 'delete')
+    return set(removed[model])
+
+
+def purge(model, ids):
+    """delete_rows for subtrees too large for one transaction: the
+    descendants go first, bottom up, one chunk per transaction, so the write
+    lock is never held for long. Readers may see the subtree partly deleted
+    until the purge finishes."""
+    removed = cascaded_rows(model, ids)
+    db.session.rollback()
+    for removed_model, rows in reversed(removed.items()):
+        for chunk in chunks(sorted(rows)):
+            # Outside a request, ask for the write lock up front (see config.configure_sqlite).
+            db.session.connection(execution_options={'write_lock': True})
+            delete_rows(removed_model, chunk)
+            db.session.commit()
+
+
+@jobs.handler('purge')
+def purge_job(payloads):
+    ids = defaultdict(set)
+    for payload in payloads:
+        ids[payload['resource']].add(payload['id'])
+    for resource, resource_ids in ids.items():
+        purge(MODELS[resource], resource_ids)
+
+
+def missing_references(model, rows):
+    """{index: error} for the (index, values) in rows whose foreign keys name
+    rows that do not exist, so one such item fails alone instead of failing
+    its chunk's transaction."""
+    errors = {}
+    for column in model.__table__.c:
+        for foreign_key in column.foreign_keys:
+            wanted = {values[column.key] for _, values in rows if isinstance(values.get(column.key), int)}
+            existing = set()
+            for chunk in chunks(sorted(wanted)):
+                existing.update(db.session.execute(
+                    select(foreign_key.column).where(foreign_key.column.in_(chunk))
+                ).scalars())
+            for index, values in rows:
+                value = values.get(column.key)
+                if value is not None and value not in existing:
+                    errors.setdefault(index, f'{column.key} {value} does not exist')
+    return errors
+
+
+def unique_keys(model):
+    """The column tuples of model's unique columns, constraints and indexes."""
+    table = model.__table__
+    keys = [(column,) for column in table.c if column.unique]
+    keys += [tuple(constraint.columns) for constraint in table.constraints if isinstance(constraint, UniqueConstraint)]
+    keys += [tuple(index.columns) for index in table.indexes if index.unique]
+    return keys
+
+
+def conflicting_rows(model, rows):
+    """{index: error} for the (index, id, values) in rows whose unique keys
+    are taken by another existing row or an earlier item of the batch, so
+    they fail alone with a 409 instead of failing their chunk's transaction.
+    values is the whole row as it would be written; id is None for creates."""
+    errors = {}
+    for columns in unique_keys(model):
+        names = ', '.join(column.key for column in columns)
+        owners = {}
+        for index, id, values in rows:
+            key = tuple(values.get(column.key) for column in columns)
+            if None in key or index in errors:
+                continue
+            if key in owners:
+                errors[index] = f'{names} {key if len(key) > 1 else key[0]!r} repeats item {owners[key][0]}'
+            else:
+                owners[key] = (index, id)
+        match = columns[0] if len(columns) == 1 else tuple_(*columns)
+        for chunk in chunks(list(owners)):
+            wanted = [key[0] for key in chunk] if len(columns) == 1 else chunk
+            for existing_id, *key in db.session.execute(select(model.id, *columns).where(match.in_(wanted))):
+                key = tuple(key)
+                index, id = owners[key]
+                if existing_id != id:
+                    errors[index] = f'{names} {key if len(key) > 1 else key[0]!r} already exists'
+    return errors
+
+
+def write_chunk(results, rows, action, write):
+    """Run write(rows), which returns the rows' results, in one transaction.
+    If it fails, each row is retried in its own transaction, so only the
+    items that fail again are reported."""
+    try:
+        done = write(rows)
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        if len(rows) > 1:
+            for row in rows:
+                write_chunk(results, [row], action, write)
+            return
+        print(f'Batch {action} error: {e}')
+        if isinstance(e, IntegrityError):
+            results.append({'index': rows[0][0], 'status': 400,
+                            'error': f'Failed to {action} this item: it breaks a database constraint'})
+        else:
+            results.append({'index': rows[0][0], 'status': 500,
+                            'error': f'Failed to {action} this item. Please try again.'})
+        return
+    results.extend(done)
+
+
+def insert_returning_ids(model, values):
+    """Insert values with one multi-row INSERT and return their ids, in order."""
+    if db.session.connection().dialect.name != 'sqlite':
+        return db.session.execute(
+            insert(model).returning(model.id, sort_by_parameter_order=True), values
+        ).scalars().all()
+    # SQLite cannot say which RETURNING row belongs to which parameter set, so
+    # SQLAlchemy would keep them in order with one INSERT per row. Batch
+    # requests hold the write lock from their first statement (BEGIN
+    # IMMEDIATE), so the ids after the largest one are free to hand out.
+    first = db.session.execute(select(func.coalesce(func.max(model.id), 0))).scalar() + 1
+    ids = list(range(first, first + len(values)))
+    db.session.execute(insert(model), [dict(row, id=id) for row, id in zip(values, ids)])
+    return ids
+
+
+def create_batch(model, build, items):
+    def write(rows):
+        values = [row for _, row in rows]
+        ids = insert_returning_ids(model, values)
+        if model is Review:
+            ratings.schedule(v['show_id'] for v in values)
+        record_bulk_write(model, [dict(row, id=id) for row, id in zip(values, ids)], 'create')
+        return [{'index': index, 'status': 201, 'id': id} for (index, _), id in zip(rows, ids)]
+
+    results = []
+    for chunk in chunked(items):
+        rows = []
+        for index, item in chunk:
+            try:
+                if not isinstance(item, dict):
+                    raise ValueError('Item must be a JSON object')
+                rows.append((index, build(item)))
+            except ValueError as e:
+                results.append({'index': index, 'status': 400, 'error': str(e)})
+        missing = missing_references(model, rows)
+        results.extend({'index': index, 'status': 400, 'error': error} for index, error in missing.items())
+        rows = [(index, row) for index, row in rows if index not in missing]
+        conflicts = conflicting_rows(model, [(index, None, row) for index, row in rows])
+        results.extend({'index': index, 'status': 409, 'error': error} for index, error in conflicts.items())
+        rows = [(index, row) for index, row in rows if index not in conflicts]
+        if rows:
+            write_chunk(results, rows, 'create', write)
+    return results
+
+
+def update_batch(model, build, items):
+    def write(rows):
+        now = datetime.utcnow()
+        db.session.execute(update(model), [dict(values, id=id, updated_at=now) for _, id, values in rows])
+        if model is Review:
+            show_ids = []
+            for _, id, values in rows:
+                old, new = existing[id], {**existing[id], **values}
+                if (old['show_id'], old['rating']) != (new['show_id'], new['rating']):
+                    show_ids += [old['show_id'], new['show_id']]
+            ratings.schedule(show_ids)
+        written = [existing[id] for _, id, _ in rows] + [{**existing[id], **values} for _, id, values in rows]
+        record_bulk_write(model, written, 'update')
+        return [{'index': index, 'status': 200, 'id': id} for index, id, _ in rows]
+
+    columns = {column.key for column in model.__table__.columns} - READ_ONLY_COLUMNS
+    results = []
+    for chunk in chunked(items):
+        changes = []
+        for index, item in chunk:
+            try:
+                if not isinstance(item, dict) or not isinstance(item.get('id'), int):
+                    raise ValueError('Item must be a JSON object with an integer id')
+                values = build({key: value for key, value in item.items() if key in columns})
+                changes.append((index, item['id'], values))
+            except ValueError as e:
+                results.append({'index': index, 'status': 400, 'error': str(e)})
+        if not changes:
+            continue
+
+        existing = {
+            row.id: row._asdict()
+            for row in db.session.execute(
+                select(model.__table__).where(model.id.in_([id for _, id, _ in changes]))
+            )
+        }
+        found = [(index, id, values) for index, id, values in changes if id in existing]
+        results.extend({'index': index, 'status': 404, 'error': f'{model.__tablename__} {id} not found'}
+                       for index, id, _ in changes if id not in existing)
+        missing = missing_references(model, [(index, values) for index, _, values in found])
+        results.extend({'index': index, 'status': 400, 'error': error} for index, error in missing.items())
+        found = [(index, id, values) for index, id, values in found if index not in missing]
+        conflicts = conflicting_rows(model, [(index, id, {**existing[id], **values}) for index, id, values in found])
+        results.extend({'index': index, 'status': 409, 'error': error} for index, error in conflicts.items())
+        found = [(index, id, values) for index, id, values in found if index not in conflicts]
+        if found:
+            write_chunk(results, found, 'update', write)
+    return results
+
+
+def delete_batch(model, items):
+    def write(targets):
+        found = delete_rows(model, {id for _, id in targets})
+        return [{'index': index, 'status': 200, 'id': id} if id in found else
+                {'index': index, 'status': 404, 'error': f'{model.__tablename__} {id} not found'}
+                for index, id in targets]
+
+    results = []
+    for chunk in chunked(items):
+        targets = []
+        for index, item in chunk:
+            id = item.get('id') if isinstance(item, dict) else item
+            if isinstance(id, int) and not isinstance(id, bool):
+                targets.append((index, id))
+            else:
+                results.append({'index': index, 'status': 400, 'error': 'Item must be an id or {"id": <id>}'})
+        if targets:
+            write_chunk(results, targets, 'delete', write)
+    return results
+
+
+def batch_response(resource):
+    """POST creates, PATCH updates and DELETE deletes a JSON array or NDJSON
+    stream of items, in chunked transactions, reporting a result per item."""
+    model = MODELS[resource]
+    try:
+        items = read_items()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if request.method == 'POST':
+        results = create_batch(model, CREATE_VALUES[resource], items)
+    elif request.method == 'PATCH':
+        results = update_batch(model, UPDATE_VALUES.get(resource, dict), items)
+    else:
+        results = delete_batch(model, items)
+
+    results.sort(key=lambda result: result['index'])
+    succeeded = sum(1 for result in results if result['status'] < 400)
+    return jsonify({
+        'results': results,
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded
+    }), 200
@@ -0,0 +1,304 @@
+# backend/cache.py
+
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import Response, current_app, g, has_app_context, has_request_context, make_response, request
+from sqlalchemy import event, inspect
+
+import jobs
+from compress import CODECS, compressible, mark_encoded, timed_compress
+from config import db
+from serializers import embedding_parents
+
+DEFAULT_TTL = 60
+DEFAULT_MAXSIZE = 2048
+# Resources whose detail page is re-rendered into the cache after a write.
+WARM_RESOURCES = ('shows',)
+
+
+class LRUCache:
+    """In-process LRU response cache with per-entry TTL and tag invalidation.
+
+    Each worker process has its own copy, so writes handled by another worker
+    only become visible here once the TTL expires. Use RedisCache when that
+    staleness window matters.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._tags = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, tags, expires = entry
+            if expires < time.monotonic():
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, tags):
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (value, tags, time.monotonic() + self.ttl)
+            for tag in tags:
+                self._tags[tag].add(key)
+            while len(self._entries) > self.maxsize:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate(self, tags):
+        with self._lock:
+            for tag in tags:
+                for key in self._tags.pop(tag, ()):
+                    self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[1]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class RedisCache:
+    """Shared response cache stored in Redis, keyed and tagged like LRUCache.
+
+    Requires the optional ``redis`` package. LRUCache is a drop-in local
+    stand-in with the same interface.
+    """
+
+    def __init__(self, url, ttl=DEFAULT_TTL, prefix='music-band:cache:'):
+        import redis
+
+        self.ttl = ttl
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self._client.get(self.prefix + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value, tags):
+        pipe = self._client.pipeline()
+        pipe.set(self.prefix + key, pickle.dumps(value), ex=self.ttl)
+        for tag in tags:
+            tag_key = self.prefix + 'tag:' + tag
+            pipe.sadd(tag_key, self.prefix + key)
+            pipe.expire(tag_key, self.ttl)
+        pipe.execute()
+
+    def invalidate(self, tags):
+        tag_keys = [self.prefix + 'tag:' + tag for tag in tags]
+        if not tag_keys:
+            return
+        keys = self._client.sunion(tag_keys)
+        self._client.delete(*keys, *tag_keys)
+
+    def clear(self):
+        keys = list(self._client.scan_iter(self.prefix + '*'))
+        if keys:
+            self._client.delete(*keys)
+
+
+def create_cache(url=None, ttl=DEFAULT_TTL, maxsize=DEFAULT_MAXSIZE):
+    if url is None or url == 'memory://':
+        return LRUCache(maxsize=maxsize, ttl=ttl)
+    if url.startswith(('redis://', 'rediss://')):
+        return RedisCache(url, ttl=ttl)
+    raise ValueError(f'Unsupported CACHE_URL: {url}')
+
+
+def init_cache(app):
+    app.config.setdefault('CACHE_URL', os.environ.get('CACHE_URL'))
+    app.config.setdefault('CACHE_TTL', int(os.environ.get('CACHE_TTL', DEFAULT_TTL)))
+    app.config.setdefault('CACHE_ENABLED', os.environ.get('CACHE_ENABLED', '1') != '0')
+    # Warming only pays off when every worker reads the entries it writes.
+    shared = (app.config['CACHE_URL'] or '').startswith(('redis://', 'rediss://'))
+    app.config.setdefault('CACHE_WARM', os.environ.get('CACHE_WARM', '1' if shared else '0') != '0')
+    if app.config['CACHE_ENABLED']:
+        app.extensions['response_cache'] = create_cache(app.config['CACHE_URL'], app.config['CACHE_TTL'])
+
+
+def get_cache():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('response_cache')
+
+
+def entity_tag(obj):
+    return f'{obj.__tablename__}:{inspect(obj).identity[0]}'
+
+
+def cache_key():
+    args = sorted(request.args.items(multi=True))
+    return f'{request.path}?{urlencode(args)}'
+
+
+def cached(resource):
+    """Cache a GET view's 200 response, tagged with every row it loaded.
+
+    Detail and list responses are tagged "<table>:<id>" for each entity the
+    view loaded; list responses are also tagged with the resource's table so
+    inserts and deletes drop them.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = get_cache()
+            if cache is None or 'stream' in request.args:
+                return view(*args, **kwargs)
+
+            key = cache_key()
+            compression = current_app.extensions.get('compression')
+            codec = compression.negotiate() if compression is not None else None
+            hit = cache.get(key)
+            if hit is not None:
+                encoded = hit.get('encoded', {})
+                if codec is not None and codec.name in encoded:
+                    response = Response(encoded[codec.name], status=hit['status'], mimetype=hit['mimetype'])
+                    mark_encoded(response, codec.name)
+                else:
+                    response = Response(hit['body'], status=hit['status'], mimetype=hit['mimetype'])
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            g.cache_tags = set() if kwargs else {resource}
+            response = make_response(view(*args, **kwargs))
+            tags = g.pop('cache_tags')
+            if response.status_code == 200 and not response.is_streamed:
+                body = response.get_data()
+                encoded = {}
+                if compression is not None and compressible(response, compression.min_size):
+                    encoded = precompress(body, codec, compression)
+                cache.set(key, {
+                    'body': body,
+                    'encoded': encoded,
+                    'status': response.status_code,
+                    'mimetype': response.mimetype,
+                }, tags)
+                if codec is not None and codec.name in encoded:
+                    response.set_data(encoded[codec.name])
+                    mark_encoded(response, codec.name)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+def precompress(body, codec, compression):
+    """{encoding: body} to store with a cached response: the encoding this
+    request negotiated, plus gzip, which nearly every client accepts. A hit
+    asking for anything else is compressed per request."""
+    codecs = {codec.name: codec} if codec is not None else {}
+    if 'gzip' in CODECS and CODECS['gzip'] in compression.codecs:
+        codecs.setdefault('gzip', CODECS['gzip'])
+    return {name: timed_compress(each, body, compression.stats) for name, each in codecs.items()}
+
+
+@event.listens_for(db.Model, 'load', propagate=True)
+def record_loaded_entity(target, context):
+    if has_request_context() and 'cache_tags' in g:
+        g.cache_tags.add(entity_tag(target))
+
+
+def invalidation_tags(obj, membership_changed):
+    """Tags made stale by a write to obj: the row itself, the parents (old and
+    new) whose payload embeds it and, for inserts/deletes, its table's list."""
+    tags = set()
+    if inspect(obj).identity is not None:
+        tags.add(entity_tag(obj))
+    if membership_changed:
+        tags.add(obj.__tablename__)
+    for parent, parent_id in embedding_parents(obj):
+        tags.add(f'{parent.__tablename__}:{parent_id}')
+    return tags
+
+
+def defer_invalidation(session, tags):
+    """Invalidate tags when session's transaction commits (dropped on rollback)."""
+    session.info.setdefault('cache_invalidations', set()).update(tags)
+
+
+@event.listens_for(db.session, 'after_flush')
+def collect_invalidations(session, flush_context):
+    tags = set()
+    for obj in session.new:
+        tags |= invalidation_tags(obj, membership_changed=True)
+    for obj in session.dirty:
+        tags |= invalidation_tags(obj, membership_changed=False)
+    for obj in session.deleted:
+        tags |= invalidation_tags(obj, membership_changed=True)
+    defer_invalidation(session, tags)
+
+
+def warm_targets(session):
+    """(table, id) of the WARM_RESOURCES rows written in this flush, or whose
+    payload embeds a row that was (e.g. a show when one of its reviews was)."""
+    targets = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if obj.__tablename__ in WARM_RESOURCES:
+            targets.add((obj.__tablename__, obj.id))
+        for parent, parent_id in embedding_parents(obj):
+            if parent.__tablename__ in WARM_RESOURCES:
+                targets.add((parent.__tablename__, parent_id))
+    return targets - {(obj.__tablename__, obj.id) for obj in session.deleted}
+
+
+@event.listens_for(db.session, 'after_flush')
+def queue_warming(session, flush_context):
+    if get_cache() is None or not current_app.config['CACHE_WARM']:
+        return
+    targets = warm_targets(session)
+    if targets:
+        jobs.enqueue(session, 'cache.warm', [{'resource': table, 'id': id} for table, id in sorted(targets)])
+
+
+@jobs.handler('cache.warm')
+def warm_job(payloads):
+    """Render the queued detail pages so the next reader finds them cached.
+
+    The old entries are dropped first: the job may run before the writing
+    request has applied its own invalidations.
+    """
+    cache = get_cache()
+    if cache is None:
+        return
+    targets = sorted({(payload['resource'], payload['id']) for payload in payloads})
+    cache.invalidate({f'{table}:{id}' for table, id in targets})
+    client = current_app.test_client()
+    for table, id in targets:
+        client.get(f'/api/{table}/{id}')
+
+
+@event.listens_for(db.session, 'after_commit')
+def apply_invalidations(session):
+    tags = session.info.pop('cache_invalidations', None)
+    cache = get_cache()
+    if tags and cache is not None:
+        cache.invalidate(tags)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_invalidations(session):
+    session.info.pop('cache_invalidations', None)
@@ -0,0 +1,166 @@
+# backend/changes.py
+
+import os
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import case, delete, event, func, insert, select
+
+from config import db
+from models import Show, Band, Venue, Review, Musician, Change
+from serializers import DEFAULT_SERIALIZERS, MODELS, chunks, embedding_parent_ids, embedding_parents
+
+DEFAULT_RETENTION_DAYS = 30
+
+# Resources in the feed. A row is logged when it is written and when a child
+# its payload embeds is (a review or bill entry logs its show, a musician its
+# band); changes to a show's venue or bands are logged under those types only.
+CHANGE_RESOURCES = {Show: 'shows', Band: 'bands', Venue: 'venues', Review: 'reviews', Musician: 'musicians'}
+
+# When one flush logs an entity twice (e.g. a show created along with its
+# reviews), the stronger op wins.
+OP_PRIORITY = {'update': 0, 'create': 1, 'delete': 2}
+
+changes_cli = AppGroup('changes', help='Maintain the change log behind /api/changes.')
+
+
+class TokenExpired(Exception):
+    """The since token predates the oldest retained change; the client must resync."""
+
+
+def log_changes(session, changes):
+    """Append {(model, id): op} to the change log inside the session's transaction."""
+    now = datetime.utcnow()
+    rows = [
+        {'resource': CHANGE_RESOURCES[model], 'entity_id': entity_id, 'op': op, 'changed_at': now}
+        for (model, entity_id), op in sorted(changes.items(), key=lambda item: (item[0][0].__tablename__, item[0][1]))
+        if model in CHANGE_RESOURCES
+    ]
+    if rows:
+        session.connection().execute(insert(Change.__table__), rows)
+
+
+def merge(changes, model, entity_id, op):
+    key = (model, entity_id)
+    if key not in changes or OP_PRIORITY[op] > OP_PRIORITY[changes[key]]:
+        changes[key] = op
+
+
+def record_rows(session, model, rows, op):
+    """log_changes for rows written with Core statements (see batch.record_bulk_write)."""
+    changes = {}
+    for row in rows:
+        merge(changes, model, row['id'], op)
+        for parent, parent_id in embedding_parent_ids(model, row):
+            merge(changes, parent, parent_id, 'update')
+    log_changes(session, changes)
+
+
+@event.listens_for(db.session, 'after_flush')
+def log_flushed_objects(session, flush_context):
+    changes = {}
+    flushed = [(obj, 'create') for obj in session.new]
+    flushed += [(obj, 'update') for obj in session.dirty if session.is_modified(obj, include_collections=False)]
+    flushed += [(obj, 'delete') for obj in session.deleted]
+    for obj, op in flushed:
+        merge(changes, type(obj), obj.id, op)
+        for parent, parent_id in embedding_parents(obj):
+            merge(changes, parent, parent_id, 'update')
+    log_changes(session, changes)
+
+
+def current_token():
+    return db.session.execute(select(func.max(Change.id))).scalar() or 0
+
+
+def changes_since(since, resources, limit, settle_seconds=0):
+    """Up to limit entities changed after token since, oldest change first.
+
+    Returns (changes, next token, whether more remain). Each entity appears
+    once, at its latest change: "delete" if that was a delete, otherwise
+    "create" if it was created after since, else "update". settle_seconds
+    holds back changes logged that recently, so a transaction that took a
+    lower id but commits later is not skipped (see docs/design.md).
+    """
+    oldest = db.session.execute(select(func.min(Change.id))).scalar()
+    if oldest is not None and since < oldest - 1:
+        raise TokenExpired()
+
+    window = [Change.id > since, Change.resource.in_(resources)]
+    if settle_seconds:
+        cutoff = datetime.utcnow() - timedelta(seconds=settle_seconds)
+        unsettled = db.session.execute(
+            select(func.min(Change.id)).where(Change.id > since, Change.changed_at > cutoff)
+        ).scalar()
+        if unsettled is not None:
+            window.append(Change.id < unsettled)
+
+    latest = db.session.execute(
+        select(
+            Change.resource, Change.entity_id, func.max(Change.id).label('token'),
+            func.max(case((Change.op == 'create', 1), else_=0)).label('created'),
+        )
+        .where(*window)
+        .group_by(Change.resource, Change.entity_id)
+        .order_by(func.max(Change.id))
+        .limit(limit + 1)
+    ).all()
+    has_more = len(latest) > limit
+    latest = latest[:limit]
+
+    ops = {}
+    for chunk in chunks([row.token for row in latest]):
+        ops.update(db.session.execute(select(Change.id, Change.op).where(Change.id.in_(chunk))).all())
+
+    upserts = {}
+    for row in latest:
+        if ops[row.token] != 'delete':
+            upserts.setdefault(row.resource, set()).add(row.entity_id)
+    data = {}
+    for resource, ids in upserts.items():
+        model = MODELS[resource]
+        for chunk in chunks(sorted(ids)):
+            items = DEFAULT_SERIALIZERS[resource].rows(model.query.filter(model.id.in_(chunk)))
+            data.update(((resource, item['id']), item) for item in items)
+
+    changes = []
+    for row in latest:
+        item = data.get((row.resource, row.entity_id))
+        if ops[row.token] == 'delete' or item is None:
+            # Deleted, or deleted by a write that bypassed the log.
+            op = 'delete'
+        else:
+            op = 'create' if row.created else 'update'
+        changes.append({'type': row.resource, 'id': row.entity_id, 'op': op,
+                        'data': item if op != 'delete' else None})
+
+    if latest:
+        token = latest[-1].token
+    elif settle_seconds:
+        token = since
+    else:
+        token = max(since, current_token())
+    return changes, token, has_more
+
+
+def init_changes(app):
+    """CHANGES_SETTLE_SECONDS: how old a change must be before the feed
+    returns it; 0 on SQLite, whose single writer commits in id order."""
+    sqlite = app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite')
+    app.config.setdefault('CHANGES_SETTLE_SECONDS', float(os.environ.get('CHANGES_SETTLE_SECONDS', 0 if sqlite else 5)))
+
+
+@changes_cli.command('prune')
+@click.option('--days', type=int, default=DEFAULT_RETENTION_DAYS, show_default=True,
+              help='Keep changes logged within this many days.')
+def prune_command(days):
+    """Delete old changes; clients holding older tokens get 410 and resync."""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    # Always keep the newest change, so the oldest id still marks how far back tokens reach.
+    newest = current_token()
+    deleted = db.session.execute(
+        delete(Change).where(Change.changed_at < cutoff, Change.id < newest)
+    ).rowcount
+    db.session.commit()
+    click.echo(f'Deleted {deleted} changes older than {days} days.')
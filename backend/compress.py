@@ -0,0 +1,272 @@
+# backend/compress.py
+
+import gzip
+import os
+import threading
+import time
+import zlib
+from collections import Counter
+
+from flask import g, has_request_context, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_MIN_SIZE = 1024
+DEFAULT_ENCODINGS = 'br,zstd,gzip'
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/csv', 'text/plain', 'text/html')
+# A streamed body is flushed to the client after about this much input.
+STREAM_FLUSH_BYTES = 64 * 1024
+
+
+class StreamCompressor:
+    """Incremental compression: compress() buffers, flush() emits everything
+    so far, finish() ends the stream."""
+
+    def __init__(self, compress, flush, finish):
+        self.compress = compress
+        self.flush = flush
+        self.finish = finish
+
+
+class Gzip:
+    name = 'gzip'
+    level = 5
+
+    def compress(self, data):
+        # mtime=0 keeps the output identical for identical bodies.
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
+
+    def decompress(self, data):
+        return gzip.decompress(data)
+
+    def compressor(self):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        return StreamCompressor(compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush)
+
+
+class Brotli:
+    """Requires the optional ``brotli`` package."""
+
+    name = 'br'
+    # Brotli's default quality, 11, costs far more CPU than it saves bytes on JSON.
+    quality = 5
+
+    def compress(self, data):
+        return brotli.compress(data, quality=self.quality)
+
+    def decompress(self, data):
+        return brotli.decompress(data)
+
+    def compressor(self):
+        compressor = brotli.Compressor(quality=self.quality)
+        return StreamCompressor(compressor.process, compressor.flush, compressor.finish)
+
+
+class Zstd:
+    """Requires the optional ``zstandard`` package."""
+
+    name = 'zstd'
+    level = 3
+
+    def compress(self, data):
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def decompress(self, data):
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+    def compressor(self):
+        compressor = zstandard.ZstdCompressor(level=self.level).compressobj()
+        return StreamCompressor(compressor.compress, lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+                                compressor.flush)
+
+
+# Content-Encoding token -> codec, for the codecs whose library is installed.
+CODECS = {codec.name: codec for codec, available in (
+    (Brotli(), brotli is not None),
+    (Zstd(), zstandard is not None),
+    (Gzip(), True),
+) if available}
+
+
+def decompress(data, encoding):
+    """Decode a body sent with Content-Encoding encoding (None for identity)."""
+    return CODECS[encoding].decompress(data) if encoding else data
+
+
+def parse_encodings(value):
+    """"br,zstd,gzip" -> the installed codecs in that order of preference."""
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in (Gzip.name, Brotli.name, Zstd.name)]
+    if unknown:
+        raise ValueError(f'Unsupported COMPRESSION_ENCODINGS: {", ".join(unknown)}')
+    return [CODECS[name] for name in names if name in CODECS]
+
+
+def negotiate(codecs):
+    """The codec to use for the current request's Accept-Encoding, or None.
+
+    The client's highest q-value wins; ties go to the order of codecs.
+    """
+    accepted = request.accept_encodings
+    best, best_quality = None, 0
+    for codec in codecs:
+        quality = accepted.quality(codec.name)
+        if quality > best_quality:
+            best, best_quality = codec, quality
+    return best
+
+
+def compressible(response, min_size):
+    return 200 <= response.status_code < 300 and response.status_code != 204 \
+        and response.mimetype in COMPRESSIBLE_MIMETYPES \
+        and 'Content-Encoding' not in response.headers \
+        and not response.direct_passthrough \
+        and (response.is_streamed or (response.content_length or 0) >= min_size)
+
+
+class CompressionStats:
+    def __init__(self):
+        self.responses = Counter()
+        self.bytes_in = Counter()
+        self.bytes_out = Counter()
+        self.seconds = Counter()
+        self._lock = threading.Lock()
+
+    def observe(self, encoding, bytes_in, bytes_out, seconds):
+        with self._lock:
+            self.responses[encoding] += 1
+            self.bytes_in[encoding] += bytes_in
+            self.bytes_out[encoding] += bytes_out
+            self.seconds[encoding] += seconds
+
+    def metrics(self):
+        lines = []
+        for name, counter, help_text in (
+            ('compression_responses_total', self.responses, 'Responses compressed, by encoding.'),
+            ('compression_input_bytes_total', self.bytes_in, 'Bytes before compression, by encoding.'),
+            ('compression_output_bytes_total', self.bytes_out, 'Bytes after compression, by encoding.'),
+            ('compression_seconds_total', self.seconds, 'Time spent compressing, by encoding.'),
+        ):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            with self._lock:
+                lines += [f'{name}{{encoding="{encoding}"}} {value:.6f}' if isinstance(value, float)
+                          else f'{name}{{encoding="{encoding}"}} {value}'
+                          for encoding, value in sorted(counter.items())]
+        return lines
+
+
+def timed_compress(codec, data, stats=None):
+    """codec.compress(data), counted toward the request's compression time."""
+    started = time.perf_counter()
+    body = codec.compress(data)
+    elapsed = time.perf_counter() - started
+    if has_request_context() and 'request_metrics' in g:
+        g.request_metrics['compress'] += elapsed
+    if stats is not None:
+        stats.observe(codec.name, len(data), len(body), elapsed)
+    return body
+
+
+def compressed_stream(codec, chunks, stats=None):
+    """Compress a streamed body, flushing to the client every
+    STREAM_FLUSH_BYTES of input so rows keep arriving as they are read."""
+    compressor = codec.compressor()
+    bytes_in = bytes_out = pending = 0
+    seconds = 0.0
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        started = time.perf_counter()
+        output = compressor.compress(chunk)
+        pending += len(chunk)
+        if pending >= STREAM_FLUSH_BYTES:
+            output += compressor.flush()
+            bytes_in += pending
+            pending = 0
+        seconds += time.perf_counter() - started
+        if output:
+            bytes_out += len(output)
+            yield output
+    output = compressor.finish()
+    if stats is not None:
+        stats.observe(codec.name, bytes_in + pending, bytes_out + len(output), seconds)
+    yield output
+
+
+def mark_encoded(response, encoding):
+    """Set the headers of a response whose body is now encoded with encoding.
+
+    A strong ETag names the identity bytes, so it is weakened; conditional
+    requests compare weakly, so a client's cached copy still validates.
+    """
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+class Compression:
+    """The configured codecs and threshold, for code that compresses ahead of
+    the response (see cache.cached)."""
+
+    def __init__(self, codecs, min_size, stats):
+        self.codecs = codecs
+        self.min_size = min_size
+        self.stats = stats
+
+    def negotiate(self):
+        return negotiate(self.codecs)
+
+
+def init_compression(app):
+    """Compress responses for clients that send Accept-Encoding.
+
+    COMPRESSION_ENCODINGS lists the encodings in order of preference
+    (default "br,zstd,gzip"; br and zstd need the brotli and zstandard
+    packages and are skipped without them). Bodies smaller than
+    COMPRESSION_MIN_SIZE bytes are sent as they are, and
+    COMPRESSION_ENABLED=0 turns compression off.
+    """
+    app.config.setdefault('COMPRESSION_ENABLED', os.environ.get('COMPRESSION_ENABLED', '1') != '0')
+    app.config.setdefault('COMPRESSION_ENCODINGS', os.environ.get('COMPRESSION_ENCODINGS', DEFAULT_ENCODINGS))
+    app.config.setdefault('COMPRESSION_MIN_SIZE', int(os.environ.get('COMPRESSION_MIN_SIZE', DEFAULT_MIN_SIZE)))
+    if not app.config['COMPRESSION_ENABLED']:
+        return
+
+    codecs = parse_encodings(app.config['COMPRESSION_ENCODINGS'])
+    min_size = app.config['COMPRESSION_MIN_SIZE']
+    stats = CompressionStats()
+    app.extensions['compression'] = Compression(codecs, min_size, stats)
+
+    @app.after_request
+    def compress_response(response):
+        if response.mimetype in COMPRESSIBLE_MIMETYPES:
+            response.vary.add('Accept-Encoding')
+        if 'Content-Encoding' in response.headers:
+            # Encoded ahead of time (cache.cached); a view decorator may
+            # have set a strong ETag since.
+            mark_encoded(response, response.headers['Content-Encoding'])
+            return response
+        if not compressible(response, min_size):
+            return response
+        codec = negotiate(codecs)
+        if codec is None:
+            return response
+        if response.is_streamed:
+            response.response = compressed_stream(codec, response.response, stats)
+        else:
+            response.set_data(timed_compress(codec, response.get_data(), stats))
+        mark_encoded(response, codec.name)
+        return response
+
+    registry = app.extensions.get('metrics')
+    if registry is not None:
+        registry.collectors.append(stats.metrics)
@@ -1,7 +1,12 @@
 # backend/config.py
 
+import os
+
+from flask import g, has_app_context, has_request_context, jsonify, request
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import MetaData
+from flask_sqlalchemy.session import Session
+from sqlalchemy import MetaData, event
+from sqlalchemy.exc import IntegrityError
 
 convention = {
     "ix": "ix_%(column_0_label)s",
@@ -12,6 +17,128 @@ convention = {
 }
 
 metadata = MetaData(naming_convention=convention)
-#
 
-db = SQLAlchemy(metadata=metadata)
+DEFAULT_DATABASE_URL = 'sqlite:///app.db'
+REPLICA_BIND = 'replica'
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Applied to every new SQLite connection. WAL lets readers run alongside the
+# single writer; busy_timeout makes a blocked writer wait instead of failing
+# with "database is locked".
+SQLITE_PRAGMAS = {
+    'journal_mode': ('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': ('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': ('SQLITE_BUSY_TIMEOUT', '5000'),
+    'mmap_size': ('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)),
+    'cache_size': ('SQLITE_CACHE_SIZE', '-65536'),
+    # SQLite ignores foreign keys, and so ON DELETE CASCADE, unless this is on.
+    'foreign_keys': ('SQLITE_FOREIGN_KEYS', 'ON'),
+}
+
+
+class RoutingSession(Session):
+    """Session that sends reads to the replica bind while g.use_replica is set.
+
+    Flushes always go to the primary, so a request that writes after all
+    keeps working; it just reads from the primary too.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context() and g.get('use_replica'):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(metadata=metadata, session_options={'class_': RoutingSession})
+
+
+def database_url(url):
+    # Render and Heroku hand out postgres://, which SQLAlchemy no longer accepts.
+    if url.startswith('postgres://'):
+        return 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def engine_options(url):
+    if url.startswith('sqlite'):
+        return {}
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') != '0',
+    }
+
+
+def sqlite_pragmas():
+    return {pragma: os.environ.get(env, default) for pragma, (env, default) in SQLITE_PRAGMAS.items()}
+
+
+def configure_sqlite(engine, pragmas):
+    @event.listens_for(engine, 'connect')
+    def apply_pragmas(dbapi_connection, connection_record):
+        # Let SQLAlchemy emit BEGIN itself (below) instead of pysqlite's
+        # implicit, deferred one.
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for pragma, value in pragmas.items():
+            cursor.execute(f'PRAGMA {pragma}={value}')
+        cursor.close()
+
+    @event.listens_for(engine, 'begin')
+    def begin(connection):
+        # Write requests take the write lock up front. A deferred transaction
+        # that reads first and writes later fails with "database is locked"
+        # when another writer got in between, regardless of busy_timeout.
+        # Background work asks for the same with the write_lock execution
+        # option, e.g. db.session.connection(execution_options={'write_lock': True}).
+        if (has_request_context() and request.method not in READ_METHODS) or \
+                connection.get_execution_options().get('write_lock'):
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+        else:
+            connection.exec_driver_sql('BEGIN')
+
+
+def foreign_key_violation(error):
+    # A write naming a row that does not exist (or no longer does) is the
+    # client's mistake; any other constraint failure stays a server error.
+    if 'foreign key' not in str(error.orig).lower():
+        raise error
+    db.session.rollback()
+    return jsonify({'error': 'A referenced row does not exist'}), 400
+
+
+def use_replica_for_reads():
+    if request.method in READ_METHODS:
+        g.use_replica = True
+
+
+def init_database(app):
+    """Configure the engines from the environment and bind db to app.
+
+    DATABASE_URL selects the primary database (SQLite by default), and
+    DATABASE_REPLICA_URL an optional read replica for GET requests. Postgres
+    pools are sized with DB_POOL_*; SQLite connections get SQLITE_PRAGMAS.
+    """
+    url = database_url(os.environ.get('DATABASE_URL', DEFAULT_DATABASE_URL))
+    app.config.setdefault('SQLALCHEMY_DATABASE_URI', url)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(url))
+
+    replica_url = os.environ.get('DATABASE_REPLICA_URL')
+    if replica_url:
+        replica_url = database_url(replica_url)
+        binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+        binds.setdefault(REPLICA_BIND, {'url': replica_url, **engine_options(replica_url)})
+        app.before_request(use_replica_for_reads)
+
+    db.init_app(app)
+    app.register_error_handler(IntegrityError, foreign_key_violation)
+
+    pragmas = sqlite_pragmas()
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                configure_sqlite(engine, pragmas)
@@ -0,0 +1,300 @@
+# backend/documents.py
+
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+import click
+from flask import Response, current_app, g, has_app_context, has_request_context
+from flask.cli import AppGroup
+from sqlalchemy import delete, event, insert, select, union
+from sqlalchemy.exc import SQLAlchemyError
+
+from cache import entity_tag
+from config import db
+from models import Show, Review, User, Band, Venue, Musician, ShowBand, ShowDocument
+from serializers import chunks, embedding_parent_ids, embedding_parents, planned_query
+from versioning import last_modified
+
+DEFAULT_RECONCILE_SECONDS = 60
+DEFAULT_RECONCILE_BATCH = 1000
+
+documents_cli = AppGroup('documents', help='Maintain the materialized show detail documents.')
+
+# Rows of these models appear in show documents; changes to any other model
+# reach a show through embedding_parents (a musician through its band, a
+# review or bill entry through its show).
+SHOW_LOOKUPS = {
+    Venue: (Show.venue_id, Show.id),
+    Band: (ShowBand.band_id, ShowBand.show_id),
+    User: (Review.user_id, Review.show_id),
+}
+
+
+def affected_show_ids(session, changed):
+    """Ids of the shows whose document embeds a row in changed ({model: ids})."""
+    show_ids = set(changed.get(Show, ()))
+    for model, (column, show_column) in SHOW_LOOKUPS.items():
+        for chunk in chunks(changed.get(model, ())):
+            show_ids.update(session.execute(select(show_column).where(column.in_(chunk))).scalars())
+    show_ids.discard(None)
+    return show_ids
+
+
+def build_document(show):
+    """(body, entity tags, source version) for a show loaded with the 'shows' load plan.
+
+    The source version is the newest updated_at among the rows the document
+    embeds, the same value versioning.show_version computes for the ETag.
+    """
+    bands = [show_band.band for show_band in show.show_bands if show_band.band is not None]
+    musicians = [musician for band in bands for musician in band.musicians]
+    users = [review.user for review in show.reviews if review.user is not None]
+    rows = [show, *bands, *musicians, *show.reviews, *users]
+    if show.venue is not None:
+        rows.append(show.venue)
+    versions = [row.updated_at for row in rows if row.updated_at is not None]
+    tags = {entity_tag(row) for row in [*rows, *show.show_bands]}
+    # Encoded exactly as jsonify() would encode the live payload.
+    body = current_app.json.response(show.to_dict()).get_data(as_text=True)
+    return body, ' '.join(sorted(tags)), max(versions, default=None)
+
+
+def rebuild(show_ids):
+    """Rebuild the documents of show_ids, and drop those of deleted shows.
+
+    The shows are read in one transaction and the documents written in
+    another, so the write transaction starts with a write and never has to
+    upgrade a SQLite read lock. A write committed in between leaves a
+    document older than its source version; reads check the version and the
+    next rebuild catches up.
+    """
+    built = 0
+    for chunk in chunks(sorted(show_ids)):
+        now = datetime.utcnow()
+        documents = []
+        for show in planned_query('shows').filter(Show.id.in_(chunk)):
+            body, tags, version = build_document(show)
+            documents.append({'show_id': show.id, 'body': body, 'entity_tags': tags, 'source_version': version,
+                              'built_at': now})
+        db.session.rollback()
+
+        try:
+            db.session.execute(delete(ShowDocument).where(ShowDocument.show_id.in_(chunk)))
+            if documents:
+                db.session.execute(insert(ShowDocument), documents)
+            db.session.commit()
+        except SQLAlchemyError as e:
+            # Most likely another worker wrote the same documents first.
+            db.session.rollback()
+            print(f'Show document rebuild error: {e}')
+            continue
+        built += len(documents)
+    return built
+
+
+def out_of_date_show_ids(limit, since=None):
+    """Up to limit shows whose document is missing, orphaned or older than a
+    row it embeds; with since, only rows updated after since are compared."""
+    document = ShowDocument
+    newer = [
+        (Show, select(document.show_id).join(Show, Show.id == document.show_id)),
+        (Venue, select(document.show_id).join(Show, Show.id == document.show_id)
+         .join(Venue, Venue.id == Show.venue_id)),
+        (Band, select(document.show_id).join(ShowBand, ShowBand.show_id == document.show_id)
+         .join(Band, Band.id == ShowBand.band_id)),
+        (Musician, select(document.show_id).join(ShowBand, ShowBand.show_id == document.show_id)
+         .join(Musician, Musician.band_id == ShowBand.band_id)),
+        (Review, select(document.show_id).join(Review, Review.show_id == document.show_id)),
+        (User, select(document.show_id).join(Review, Review.show_id == document.show_id)
+         .join(User, User.id == Review.user_id)),
+    ]
+    checks = []
+    for model, query in newer:
+        query = query.where(model.updated_at > document.source_version)
+        if since is not None:
+            query = query.where(model.updated_at > since)
+        checks.append(query)
+    missing = select(Show.id).outerjoin(document, document.show_id == Show.id).where(document.show_id.is_(None))
+    orphaned = select(document.show_id).outerjoin(Show, Show.id == document.show_id).where(Show.id.is_(None))
+    return set(db.session.execute(union(*checks, missing, orphaned).limit(limit)).scalars())
+
+
+def reconcile(limit=DEFAULT_RECONCILE_BATCH, since=None):
+    """Repair up to limit documents that incremental rebuilds missed (e.g.
+    writes handled by a worker that exited, or Core writes such as seeding).
+
+    Returns (documents rebuilt, whether every out-of-date document was found).
+    """
+    show_ids = out_of_date_show_ids(limit, since)
+    db.session.rollback()
+    return (rebuild(show_ids) if show_ids else 0), len(show_ids) < limit
+
+
+class DocumentBuilder:
+    """Rebuilds show documents on a daemon thread.
+
+    Shows queued by writes and stale reads are rebuilt as soon as the thread
+    wakes up; every interval seconds (0 disables it) it also reconciles up to
+    batch_size out-of-date documents. Each worker process runs its own thread.
+    """
+
+    def __init__(self, app, interval, batch_size):
+        self.app = app
+        self.interval = interval
+        self.batch_size = batch_size
+        self._pending = defaultdict(set)
+        self._condition = threading.Condition()
+        self._thread = None
+        self._pid = None
+
+    def start(self):
+        with self._condition:
+            # A thread started before gunicorn forked does not exist in the worker.
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pending = defaultdict(set)
+            self._thread = threading.Thread(target=self._run, name='show-documents', daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def enqueue(self, changed):
+        """Queue {model: ids} of changed rows; the thread resolves them to shows."""
+        self.start()
+        with self._condition:
+            for model, ids in changed.items():
+                self._pending[model].update(ids)
+            self._condition.notify()
+
+    def _run(self):
+        next_reconcile = time.monotonic() + self.interval
+        # The first sweep compares every row; later ones only rows updated
+        # since the previous complete sweep began, less one interval of slack
+        # for transactions that were still open.
+        since = None
+        while True:
+            with self._condition:
+                timeout = max(next_reconcile - time.monotonic(), 0) if self.interval else None
+                self._condition.wait_for(lambda: self._pending, timeout)
+                changed, self._pending = self._pending, defaultdict(set)
+            try:
+                with self.app.app_context():
+                    if changed:
+                        rebuild(affected_show_ids(db.session, changed))
+                    if self.interval and time.monotonic() >= next_reconcile:
+                        started = datetime.utcnow()
+                        _, complete = reconcile(self.batch_size, since)
+                        if complete:
+                            since = started - timedelta(seconds=self.interval)
+                        next_reconcile = time.monotonic() + self.interval
+            except Exception as e:
+                print(f'Show document builder error: {e}')
+
+
+def init_documents(app):
+    """Serve GET /api/shows/<id> from materialized documents.
+
+    SHOW_DOCUMENTS=0 turns them off; DOCUMENTS_RECONCILE_SECONDS and
+    DOCUMENTS_RECONCILE_BATCH pace the background reconciler.
+    """
+    app.config.setdefault('SHOW_DOCUMENTS', os.environ.get('SHOW_DOCUMENTS', '1') != '0')
+    app.config.setdefault('DOCUMENTS_RECONCILE_SECONDS', int(os.environ.get(
+        'DOCUMENTS_RECONCILE_SECONDS', DEFAULT_RECONCILE_SECONDS)))
+    app.config.setdefault('DOCUMENTS_RECONCILE_BATCH', int(os.environ.get(
+        'DOCUMENTS_RECONCILE_BATCH', DEFAULT_RECONCILE_BATCH)))
+    if not app.config['SHOW_DOCUMENTS']:
+        return
+    builder = DocumentBuilder(app, app.config['DOCUMENTS_RECONCILE_SECONDS'], app.config['DOCUMENTS_RECONCILE_BATCH'])
+    app.extensions['show_documents'] = builder
+    app.before_request(builder.start)
+
+
+def get_builder():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('show_documents')
+
+
+def stored_response(show_id):
+    """The show's stored document as a response, or None when it is missing
+    or older than the rows it embeds (the show is then queued for a rebuild)."""
+    builder = get_builder()
+    if builder is None:
+        return None
+    modified = g.get('last_modified') or last_modified('shows', show_id)
+    if modified is None:
+        return None
+
+    row = db.session.execute(
+        select(ShowDocument.body, ShowDocument.entity_tags, ShowDocument.source_version)
+        .where(ShowDocument.show_id == show_id)
+    ).first()
+    if row is None or row.source_version is None or row.source_version.replace(tzinfo=timezone.utc) != modified:
+        builder.enqueue({Show: {show_id}})
+        return None
+
+    if has_request_context() and 'cache_tags' in g:
+        g.cache_tags.update(row.entity_tags.split())
+    return Response(row.body, mimetype=current_app.json.mimetype)
+
+
+def record_changes(session, changed):
+    if get_builder() is not None:
+        pending = session.info.setdefault('document_changes', defaultdict(set))
+        for model, ids in changed.items():
+            pending[model].update(ids)
+
+
+def record_rows(session, model, rows):
+    """record_changes for rows written with Core statements (see batch.record_bulk_write)."""
+    changed = defaultdict(set)
+    for row in rows:
+        changed[model].add(row['id'])
+        for parent, parent_id in embedding_parent_ids(model, row):
+            changed[parent].add(parent_id)
+    record_changes(session, changed)
+
+
+@event.listens_for(db.session, 'after_flush')
+def collect_document_changes(session, flush_context):
+    changed = defaultdict(set)
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, ShowDocument):
+            continue
+        changed[type(obj)].add(obj.id)
+        for parent, parent_id in embedding_parents(obj):
+            changed[parent].add(parent_id)
+    if changed:
+        record_changes(session, changed)
+
+
+@event.listens_for(db.session, 'after_commit')
+def queue_document_rebuilds(session):
+    changed = session.info.pop('document_changes', None)
+    builder = get_builder()
+    if changed and builder is not None:
+        builder.enqueue(changed)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_document_changes(session):
+    session.info.pop('document_changes', None)
+
+
+@documents_cli.command('rebuild')
+def rebuild_command():
+    """Rebuild every show document."""
+    show_ids = set(db.session.execute(select(Show.id)).scalars())
+    show_ids |= set(db.session.execute(select(ShowDocument.show_id)).scalars())
+    db.session.rollback()
+    click.echo(f'Rebuilt {rebuild(show_ids)} show documents.')
+
+
+@documents_cli.command('reconcile')
+@click.option('--limit', type=int, default=DEFAULT_RECONCILE_BATCH, show_default=True)
+def reconcile_command(limit):
+    """Rebuild missing and stale show documents and drop orphaned ones."""
+    rebuilt, complete = reconcile(limit)
+    click.echo(f'Rebuilt {rebuilt} show documents.' + ('' if complete else ' More remain; run again.'))
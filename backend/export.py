@@ -0,0 +1,210 @@
+# backend/export.py
+
+import csv
+import io
+import sys
+from datetime import datetime
+
+import click
+from flask import current_app
+from sqlalchemy import Date, DateTime, Float, Integer, String, Text, Time, select
+
+from compress import CODECS, compressed_stream
+from config import db
+from models import ShowBand
+from serializers import COLUMN_FORMATTERS, MODELS
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_BATCH_SIZE = 10000
+
+# Every resource, plus the show/band bill entries that the nested list
+# payloads embed, one row per database row.
+EXPORT_MODELS = {**MODELS, 'show_bands': ShowBand}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def export_query(entity, since=None):
+    """SELECT of entity's table in id order, optionally only the rows updated
+    at or after since."""
+    table = EXPORT_MODELS[entity].__table__
+    query = select(table).order_by(table.c.id)
+    if since is not None:
+        if 'updated_at' not in table.c:
+            raise ValueError(f'{entity} cannot be filtered by since')
+        query = query.where(table.c.updated_at >= since)
+    return query
+
+
+def parse_since(value):
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except ValueError:
+        raise ValueError('since must be an ISO 8601 date or datetime')
+
+
+def parse_batch_size(value):
+    try:
+        batch_size = int(value)
+    except (TypeError, ValueError):
+        batch_size = 0
+    if not 0 < batch_size <= MAX_BATCH_SIZE:
+        raise ValueError(f'batch_size must be an integer from 1 to {MAX_BATCH_SIZE}')
+    return batch_size
+
+
+def batches(session, query, batch_size):
+    """Lists of up to batch_size rows, read from a server-side cursor
+    (Postgres) or SQLite's incremental stepping, so only one batch is in
+    memory at a time."""
+    result = session.execute(query, execution_options={'yield_per': batch_size})
+    yield from result.partitions()
+
+
+def write_csv(columns, row_batches):
+    formatters = [COLUMN_FORMATTERS.get(type(column.type)) for column in columns]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.key for column in columns])
+    for rows in row_batches:
+        writer.writerows(
+            [value if value is None or formatter is None else formatter(value)
+             for value, formatter in zip(row, formatters)]
+            for row in rows
+        )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def write_ndjson(columns, row_batches):
+    dumps = current_app.json.dumps
+    keys = [column.key for column in columns]
+    formatters = [(index, COLUMN_FORMATTERS[type(column.type)]) for index, column in enumerate(columns)
+                  if type(column.type) in COLUMN_FORMATTERS]
+    for rows in row_batches:
+        lines = []
+        for row in rows:
+            values = list(row)
+            for index, formatter in formatters:
+                if values[index] is not None:
+                    values[index] = formatter(values[index])
+            lines.append(dumps(dict(zip(keys, values))))
+        yield '\n'.join(lines) + '\n' if lines else ''
+
+
+class ChunkSink:
+    """Write-only file for pyarrow that hands back what was written since the
+    last take(), so a Parquet file can be streamed as it is written."""
+
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def arrow_schema(columns):
+    types = {
+        Integer: pyarrow.int64(),
+        Float: pyarrow.float64(),
+        String: pyarrow.string(),
+        Text: pyarrow.string(),
+        Date: pyarrow.date32(),
+        DateTime: pyarrow.timestamp('us'),
+        Time: pyarrow.time64('us'),
+    }
+    return pyarrow.schema([(column.key, types[type(column.type)]) for column in columns])
+
+
+def write_parquet(columns, row_batches, compression='zstd'):
+    """One Parquet row group per batch, each sent as soon as it is written."""
+    schema = arrow_schema(columns)
+    sink = ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression=compression)
+    for rows in row_batches:
+        writer.write_table(pyarrow.Table.from_pydict(
+            {column.key: [row[index] for row in rows] for index, column in enumerate(columns)}, schema=schema
+        ))
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+def check_format(export_format):
+    if export_format not in FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(FORMATS)}")
+    if export_format == 'parquet' and pyarrow is None:
+        raise ValueError('parquet export needs the pyarrow package')
+
+
+def export_chunks(session, entity, export_format, since=None, batch_size=DEFAULT_BATCH_SIZE):
+    """The export of entity as an iterator of str (csv, ndjson) or bytes
+    (parquet) chunks, one per batch of rows."""
+    query = export_query(entity, since)
+    columns = list(EXPORT_MODELS[entity].__table__.c)
+    row_batches = batches(session, query, batch_size)
+    if export_format == 'csv':
+        return write_csv(columns, row_batches)
+    if export_format == 'parquet':
+        return write_parquet(columns, row_batches)
+    return write_ndjson(columns, row_batches)
+
+
+@click.command('export')
+@click.argument('entity', type=click.Choice(list(EXPORT_MODELS)))
+@click.option('--format', 'export_format', type=click.Choice(list(FORMATS)), default='ndjson', show_default=True)
+@click.option('--output', '-o', type=click.Path(dir_okay=False, writable=True),
+              help='File to write (default: standard output).')
+@click.option('--since', help='Only rows updated at or after this ISO 8601 date or datetime.')
+@click.option('--compress', 'encoding', type=click.Choice(sorted(CODECS)),
+              help='Compress CSV or NDJSON output (Parquet compresses its columns itself).')
+@click.option('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, show_default=True, help='Rows read per batch.')
+def export_command(entity, export_format, output, since, encoding, batch_size):
+    """Stream a table to a file as CSV, NDJSON or Parquet."""
+    try:
+        check_format(export_format)
+        batch_size = parse_batch_size(batch_size)
+        since = parse_since(since)
+        export_query(entity, since)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    if encoding and export_format == 'parquet':
+        raise click.UsageError('--compress applies to CSV and NDJSON; Parquet compresses its columns itself.')
+
+    chunks = export_chunks(db.session, entity, export_format, since, batch_size)
+    chunks = (chunk.encode() if isinstance(chunk, str) else chunk for chunk in chunks)
+    if encoding:
+        chunks = compressed_stream(CODECS[encoding], chunks)
+    target = open(output, 'wb') if output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            target.write(chunk)
+    finally:
+        if output:
+            target.close()
@@ -1,29 +1,93 @@
 # Gunicorn configuration for production
+import gc
+import multiprocessing
 import os
+import subprocess
+import sys
 
 # Server socket
 bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
 backlog = 2048
 
 # Worker processes
-workers = 2
-worker_class = "sync"
-worker_connections = 1000
-timeout = 30
+# gthread workers serve `threads` requests at once each, so one slow request
+# no longer ties up a whole worker. Flask-SQLAlchemy scopes the session to
+# the app context, which is per thread, and each thread checks out its own
+# pooled connection (keep DB_POOL_SIZE >= GUNICORN_THREADS).
+# GUNICORN_WORKER_CLASS=gevent also works when gevent is installed (plus
+# psycogreen for Postgres); worker_connections only applies to that mode.
+cpu_count = multiprocessing.cpu_count()
+workers = int(os.environ.get('WEB_CONCURRENCY', cpu_count * 2 + 1))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
 keepalive = 2
 
 # Restart workers after this many requests
 max_requests = 1000
 max_requests_jitter = 50
 
+# Import the app once in the master and fork ready workers from it: boots and
+# max_requests recycles skip the imports, and workers share the app's memory
+# copy-on-write. Code changes then need a full restart rather than a HUP.
+# gevent has to patch the standard library before the app is imported, so it
+# does not preload by default.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '0' if worker_class == 'gevent' else '1') != '0'
+# Apply pending migrations once, in the master, before any worker starts.
+migrate_on_start = os.environ.get('MIGRATE_ON_START', '1') != '0'
+
 # Logging
 accesslog = "-"
 errorlog = "-"
 loglevel = "info"
+# The default format plus the request duration in milliseconds.
+access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s" %(M)sms'
 
 # Process naming
 proc_name = "music-band-api"
 
+def on_starting(server):
+    if not migrate_on_start:
+        return
+    if not preload_app:
+        # Importing the app here would preload it after all.
+        subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'upgrade-schema'],
+                       cwd=os.path.dirname(os.path.abspath(__file__)), check=False)
+        return
+    from app import app, upgrade_database
+    with app.app_context():
+        try:
+            upgrade_database()
+            print("Database initialized successfully")
+        except Exception as e:
+            print(f"Database initialization error: {e}")
+
+
+def when_ready(server):
+    if preload_app:
+        # Keep the collector from touching (and so copying) the preloaded
+        # objects in every worker.
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    if 'app' in sys.modules:
+        # Pooled connections must not be shared with the master or other
+        # workers; drop any without closing them under the master.
+        from app import app
+        from config import db
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+    if worker_class == 'gevent':
+        try:
+            from psycogreen.gevent import patch_psycopg
+        except ImportError:
+            return
+        # Make psycopg2 yield to other greenlets while waiting on Postgres.
+        patch_psycopg()
+
 # Server mechanics
 daemon = False
 pidfile = None
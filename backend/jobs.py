@@ -0,0 +1,297 @@
+# backend/jobs.py
+
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app, has_app_context
+from flask.cli import AppGroup
+from sqlalchemy import event, func, insert, select, update
+
+from config import db
+from models import Job
+from serializers import chunks
+
+DEFAULT_WORKERS = 1
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_SECONDS = 2
+DEFAULT_POLL_SECONDS = 0.5
+DEFAULT_LEASE_SECONDS = 300
+
+jobs_cli = AppGroup('jobs', help='Run and inspect background jobs.')
+
+# name -> handler(payloads). Handlers receive every claimed payload of their
+# job at once, run in an app context, and commit their own work. A job runs
+# at least once, so handlers recompute from the database rather than apply
+# deltas.
+HANDLERS = {}
+
+
+def handler(name):
+    def register(function):
+        HANDLERS[name] = function
+        return function
+    return register
+
+
+def job_key(name, payload):
+    return f'{name}:{json.dumps(payload, sort_keys=True, separators=(",", ":"))}'
+
+
+def enqueue(session, name, payloads):
+    """Queue a job per payload in session's transaction.
+
+    The jobs commit or roll back together with the write that queued them. A
+    payload already waiting under the same name is not queued twice; the
+    waiting job has not started, so it will see this write too.
+    """
+    if get_queue() is None:
+        return
+    seen = session.info.setdefault('job_keys', set())
+    keys = {}
+    for payload in payloads:
+        key = job_key(name, payload)
+        if key not in seen:
+            seen.add(key)
+            keys[key] = payload
+    if not keys:
+        return
+
+    connection = session.connection()
+    for chunk in chunks(list(keys)):
+        # Locking the waiting row keeps a worker from claiming it (SKIP
+        # LOCKED) until this transaction commits; SQLite's single writer
+        # gives the same guarantee without the lock.
+        waiting = connection.execute(
+            select(Job.key).where(Job.key.in_(chunk), Job.status == 'queued').with_for_update(read=True)
+        ).scalars()
+        for key in waiting:
+            keys.pop(key, None)
+    if not keys:
+        return
+
+    now = datetime.utcnow()
+    connection.execute(insert(Job.__table__), [
+        {'name': name, 'key': key, 'payload': json.dumps(payload), 'status': 'queued', 'attempts': 0,
+         'run_at': now, 'created_at': now}
+        for key, payload in keys.items()
+    ])
+
+
+class JobQueue:
+    """Jobs stored in the jobs table, claimed by worker threads in every
+    process (or by `flask jobs work`).
+
+    Claimed jobs are leased for lease_seconds, so the jobs of a worker that
+    died become due again. A failed job is retried after retry_seconds,
+    doubling each time; after max_attempts it is kept with status 'dead'.
+    """
+
+    def __init__(self, workers, batch_size, max_attempts, retry_seconds, poll_seconds, lease_seconds):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+
+    def start(self, app):
+        with self._lock:
+            # Threads started before gunicorn forked do not exist in the worker.
+            if self._pid == os.getpid() or not self.workers:
+                return
+            self._pid = os.getpid()
+            self._threads = [
+                threading.Thread(target=self.work, args=(app,), name=f'jobs-{index}', daemon=True)
+                for index in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def work(self, app, stop=None):
+        """Run due jobs until stop() is true.
+
+        Between batches that were not full the worker sleeps poll_seconds,
+        so jobs queued by a burst of writes are claimed, and their handlers
+        run, together rather than one transaction each.
+        """
+        while stop is None or not stop():
+            try:
+                with app.app_context():
+                    claimed = self.run_due()
+            except Exception as e:
+                print(f'Job worker error: {e}')
+                claimed = 0
+            if claimed < self.batch_size:
+                time.sleep(self.poll_seconds)
+
+    def claim(self):
+        now = datetime.utcnow()
+        due = (select(Job.id)
+               .where(Job.status.in_(('queued', 'running')), Job.run_at <= now)
+               .order_by(Job.run_at, Job.id)
+               .limit(self.batch_size))
+        # Check with a read first: the UPDATE takes SQLite's write lock even
+        # when nothing is due.
+        found = db.session.execute(due.limit(1)).first()
+        db.session.rollback()
+        if found is None:
+            return []
+        connection = db.session.connection(execution_options={'write_lock': True})
+        rows = connection.execute(
+            update(Job.__table__)
+            .where(Job.id.in_(due.with_for_update(skip_locked=True).scalar_subquery()))
+            .values(status='running', attempts=Job.attempts + 1, run_at=now + timedelta(seconds=self.lease_seconds))
+            .returning(Job.id, Job.name, Job.payload, Job.attempts)
+        ).all()
+        db.session.commit()
+        return rows
+
+    def run_due(self):
+        """Claim and run one batch of due jobs; return how many were claimed."""
+        rows = self.claim()
+        by_name = defaultdict(list)
+        for row in rows:
+            by_name[row.name].append(row)
+        for name, jobs in by_name.items():
+            try:
+                run = HANDLERS.get(name)
+                if run is None:
+                    raise LookupError(f'No handler for job {name!r}')
+                run([json.loads(job.payload) for job in jobs])
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                self.failed(name, jobs, e)
+            else:
+                self.finished(name, jobs)
+        return len(rows)
+
+    def finished(self, name, jobs):
+        for chunk in chunks([job.id for job in jobs]):
+            db.session.execute(Job.__table__.delete().where(Job.id.in_(chunk)))
+        db.session.commit()
+        with self._lock:
+            self.counts[(name, 'succeeded')] += len(jobs)
+
+    def failed(self, name, jobs, error):
+        print(f'Job {name} failed: {error}')
+        now = datetime.utcnow()
+        dead = 0
+        for job in jobs:
+            values = {'status': 'queued', 'last_error': repr(error),
+                      'run_at': now + timedelta(seconds=self.retry_seconds * 2 ** (job.attempts - 1))}
+            if job.attempts >= self.max_attempts:
+                values['status'] = 'dead'
+                dead += 1
+            db.session.execute(update(Job.__table__).where(Job.id == job.id).values(**values))
+        db.session.commit()
+        with self._lock:
+            self.counts[(name, 'retried')] += len(jobs) - dead
+            self.counts[(name, 'dead')] += dead
+
+    def metrics(self):
+        statuses = dict(db.session.execute(select(Job.status, func.count()).group_by(Job.status)).all())
+        db.session.rollback()
+        lines = ['# HELP jobs_total Background jobs handled by this process, by name and outcome.',
+                 '# TYPE jobs_total counter']
+        with self._lock:
+            lines += [f'jobs_total{{name="{name}",outcome="{outcome}"}} {count}'
+                      for (name, outcome), count in sorted(self.counts.items())]
+        lines += ['# HELP jobs_waiting Jobs in the jobs table, by status.', '# TYPE jobs_waiting gauge']
+        lines += [f'jobs_waiting{{status="{status}"}} {statuses.get(status, 0)}'
+                  for status in ('queued', 'running', 'dead')]
+        return lines
+
+
+def init_jobs(app):
+    """Background jobs for the derived work of writes.
+
+    JOB_WORKERS threads per process (0 leaves the work to `flask jobs work`)
+    claim up to JOB_BATCH_SIZE due jobs at a time, polling every
+    JOB_POLL_SECONDS. JOB_MAX_ATTEMPTS, JOB_RETRY_SECONDS and
+    JOB_LEASE_SECONDS control retries.
+    """
+    app.config.setdefault('JOB_WORKERS', int(os.environ.get('JOB_WORKERS', DEFAULT_WORKERS)))
+    app.config.setdefault('JOB_BATCH_SIZE', int(os.environ.get('JOB_BATCH_SIZE', DEFAULT_BATCH_SIZE)))
+    app.config.setdefault('JOB_MAX_ATTEMPTS', int(os.environ.get('JOB_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)))
+    app.config.setdefault('JOB_RETRY_SECONDS', float(os.environ.get('JOB_RETRY_SECONDS', DEFAULT_RETRY_SECONDS)))
+    app.config.setdefault('JOB_POLL_SECONDS', float(os.environ.get('JOB_POLL_SECONDS', DEFAULT_POLL_SECONDS)))
+    app.config.setdefault('JOB_LEASE_SECONDS', float(os.environ.get('JOB_LEASE_SECONDS', DEFAULT_LEASE_SECONDS)))
+    queue = JobQueue(app.config['JOB_WORKERS'], app.config['JOB_BATCH_SIZE'], app.config['JOB_MAX_ATTEMPTS'],
+                     app.config['JOB_RETRY_SECONDS'], app.config['JOB_POLL_SECONDS'],
+                     app.config['JOB_LEASE_SECONDS'])
+    app.extensions['job_queue'] = queue
+    app.before_request(lambda: queue.start(app))
+
+    registry = app.extensions.get('metrics')
+    if registry is not None:
+        registry.collectors.append(queue.metrics)
+
+
+def get_queue():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('job_queue')
+
+
+def run_pending():
+    """Run jobs until none are due; for scripts and the CLI."""
+    queue = get_queue()
+    total = 0
+    while claimed := queue.run_due():
+        total += claimed
+    return total
+
+
+@event.listens_for(db.session, 'after_commit')
+@event.listens_for(db.session, 'after_rollback')
+def reset_job_keys(session):
+    session.info.pop('job_keys', None)
+
+
+@jobs_cli.command('work')
+def work_command():
+    """Run jobs in the foreground until interrupted."""
+    click.echo('Running jobs; press Ctrl+C to stop.')
+    get_queue().work(current_app._get_current_object())
+
+
+@jobs_cli.command('run')
+def run_command():
+    """Run every due job once and exit."""
+    click.echo(f'Ran {run_pending()} jobs.')
+
+
+@jobs_cli.command('dead')
+@click.option('--limit', type=int, default=50, show_default=True)
+def dead_command(limit):
+    """List jobs that failed JOB_MAX_ATTEMPTS times."""
+    for job in db.session.execute(select(Job).where(Job.status == 'dead').order_by(Job.id).limit(limit)).scalars():
+        click.echo(f'{job.id} {job.name} {job.payload} attempts={job.attempts} error={job.last_error}')
+
+
+@jobs_cli.command('retry')
+@click.argument('ids', nargs=-1, type=int)
+@click.option('--all', 'retry_all', is_flag=True, help='Retry every dead job.')
+def retry_command(ids, retry_all):
+    """Queue dead jobs again."""
+    if not ids and not retry_all:
+        raise click.UsageError('Pass job ids or --all.')
+    statement = update(Job).where(Job.status == 'dead')
+    if not retry_all:
+        statement = statement.where(Job.id.in_(ids))
+    retried = db.session.execute(
+        statement.values(status='queued', attempts=0, run_at=datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    click.echo(f'Queued {retried} dead jobs again.')
@@ -0,0 +1,53 @@
+# backend/json_provider.py
+
+import os
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson.
+
+    Output matches DefaultJSONProvider: keys sorted, dates and other
+    non-native types go through the same default(), and responses are
+    indented only in debug mode.
+    """
+
+    base_options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def _options(self, indent=False):
+        options = self.base_options
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self._options(bool(kwargs.get('indent')))).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=self.default, option=self._options(indent))
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
+
+
+def init_json(app):
+    """Install the JSON provider named by JSON_PROVIDER: "orjson" (the default
+    when it is installed) or "json" for the standard library."""
+    name = os.environ.get('JSON_PROVIDER', 'orjson' if orjson else 'json')
+    if name == 'orjson':
+        if orjson is None:
+            raise RuntimeError('JSON_PROVIDER=orjson requires the orjson package')
+        app.json = OrjsonProvider(app)
+    elif name != 'json':
+        raise ValueError(f'Unsupported JSON_PROVIDER: {name}')
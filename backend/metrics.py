@@ -0,0 +1,286 @@
+# backend/metrics.py
+
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+
+from config import db
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RouteStats:
+    def __init__(self):
+        self.statuses = Counter()
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.duration = 0.0
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.response_bytes = 0
+
+
+class MetricsRegistry:
+    """Per-route request statistics, rendered in the Prometheus text format.
+
+    Every worker process keeps its own registry, so a scrape sees the worker
+    that answered it; run one worker per scrape target, or aggregate across
+    scrapes, when exact totals matter.
+    """
+
+    def __init__(self):
+        self._routes = defaultdict(RouteStats)
+        self._lock = threading.Lock()
+        # Callables returning extra exposition lines, e.g. ratelimit's counters.
+        self.collectors = []
+
+    def observe(self, method, route, status, duration, sql_statements, sql_seconds, serialize_seconds,
+                response_bytes):
+        with self._lock:
+            stats = self._routes[(method, route)]
+            stats.statuses[status] += 1
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    stats.buckets[index] += 1
+            stats.duration += duration
+            stats.sql_statements += sql_statements
+            stats.sql_seconds += sql_seconds
+            stats.serialize_seconds += serialize_seconds
+            stats.response_bytes += response_bytes
+
+    def render(self):
+        with self._lock:
+            routes = sorted(self._routes.items())
+            lines = [
+                '# HELP http_requests_total Requests handled, by method, route and status.',
+                '# TYPE http_requests_total counter',
+            ]
+            for (method, route), stats in routes:
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append(f'http_requests_total{{{labels(method, route)},status="{status}"}} {count}')
+
+            lines += [
+                '# HELP http_request_duration_seconds Wall time spent handling requests.',
+                '# TYPE http_request_duration_seconds histogram',
+            ]
+            for (method, route), stats in routes:
+                route_labels = labels(method, route)
+                for bound, count in zip(DURATION_BUCKETS, stats.buckets):
+                    lines.append(f'http_request_duration_seconds_bucket{{{route_labels},le="{bound}"}} {count}')
+                total = sum(stats.statuses.values())
+                lines.append(f'http_request_duration_seconds_bucket{{{route_labels},le="+Inf"}} {total}')
+                lines.append(f'http_request_duration_seconds_sum{{{route_labels}}} {stats.duration:.6f}')
+                lines.append(f'http_request_duration_seconds_count{{{route_labels}}} {total}')
+
+            for name, attr, kind, help_text in COUNTERS:
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+                for (method, route), stats in routes:
+                    value = getattr(stats, attr)
+                    value = f'{value:.6f}' if isinstance(value, float) else value
+                    lines.append(f'{name}{{{labels(method, route)}}} {value}')
+        for collect in self.collectors:
+            lines += collect()
+        return '\n'.join(lines) + '\n'
+
+
+COUNTERS = [
+    ('db_statements_total', 'sql_statements', 'counter', 'SQL statements executed while handling requests.'),
+    ('db_seconds_total', 'sql_seconds', 'counter', 'Time spent executing SQL statements.'),
+    ('serialization_seconds_total', 'serialize_seconds', 'counter', 'Time spent building and encoding response payloads, less their SQL.'),
+    ('http_response_bytes_total', 'response_bytes', 'counter', 'Bytes sent in non-streamed response bodies.'),
+]
+
+
+def labels(method, route):
+    route = route.replace('\\', '\\\\').replace('"', '\\"')
+    return f'method="{method}",route="{route}"'
+
+
+class SamplingProfiler:
+    """Samples the stacks of in-flight request threads every interval seconds.
+
+    Requests that run longer than threshold seconds have their samples
+    written to directory in the collapsed-stack format ("frame;frame;frame
+    count" per line) read by flamegraph.pl and speedscope. Samples come from
+    sys._current_frames(), so greenlet-based workers are not covered.
+    """
+
+    def __init__(self, threshold, interval, directory):
+        self.threshold = threshold
+        self.interval = interval
+        self.directory = directory
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, ident):
+        with self._lock:
+            self._active[ident] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample, name='request-profiler', daemon=True)
+                self._thread.start()
+
+    def stop(self, ident):
+        with self._lock:
+            return self._active.pop(ident, Counter())
+
+    def _sample(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, samples in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        samples[collapse(frame)] += 1
+
+    def dump(self, samples, method, route, duration):
+        os.makedirs(self.directory, exist_ok=True)
+        name = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+        path = os.path.join(
+            self.directory,
+            f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{method}-{name}-{duration * 1000:.0f}ms.folded"
+        )
+        with open(path, 'w') as output:
+            for stack, count in samples.most_common():
+                output.write(f'{stack} {count}\n')
+        return path
+
+
+def collapse(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def route_name():
+    return request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+
+
+@contextmanager
+def timed_serialization():
+    """Count the time spent building payload dicts in the block toward the
+    request's serialization time. The SQL the block runs (relation fetches,
+    lazy loads) is already counted as db time and is left out."""
+    metrics = g.get('request_metrics') if has_request_context() else None
+    if metrics is None:
+        yield
+        return
+    started, sql = time.perf_counter(), metrics['sql']
+    try:
+        yield
+    finally:
+        metrics['serialize'] += time.perf_counter() - started - (metrics['sql'] - sql)
+
+
+def timed_json(provider):
+    """Count the time app.json spends encoding toward the request's serialization time."""
+    def wrap(method):
+        def timed(*args, **kwargs):
+            if not has_request_context() or 'request_metrics' not in g:
+                return method(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                g.request_metrics['serialize'] += time.perf_counter() - started
+        return timed
+    provider.response = wrap(provider.response)
+    provider.dumps = wrap(provider.dumps)
+
+
+def instrument_engine(engine):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_statement(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('statement_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def end_statement(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['statement_started'].pop()
+        if has_request_context() and 'request_metrics' in g:
+            g.request_metrics['sql_statements'] += 1
+            g.request_metrics['sql'] += time.perf_counter() - started
+
+
+def init_metrics(app):
+    """Per-request timing: Server-Timing headers, /metrics and the slow-request profiler.
+
+    METRICS_ENABLED=0 turns it all off and SERVER_TIMING=0 drops the header.
+    PROFILE_SLOW_MS enables the profiler for requests slower than that many
+    milliseconds (sampled every PROFILE_INTERVAL_MS, written to PROFILE_DIR).
+    """
+    app.config.setdefault('METRICS_ENABLED', os.environ.get('METRICS_ENABLED', '1') != '0')
+    app.config.setdefault('SERVER_TIMING', os.environ.get('SERVER_TIMING', '1') != '0')
+    app.config.setdefault('PROFILE_SLOW_MS', os.environ.get('PROFILE_SLOW_MS'))
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    registry = MetricsRegistry()
+    app.extensions['metrics'] = registry
+    profiler = None
+    if app.config['PROFILE_SLOW_MS']:
+        profiler = SamplingProfiler(
+            threshold=float(app.config['PROFILE_SLOW_MS']) / 1000,
+            interval=float(os.environ.get('PROFILE_INTERVAL_MS', 5)) / 1000,
+            directory=os.environ.get('PROFILE_DIR', os.path.join(app.instance_path, 'profiles')),
+        )
+        app.extensions['profiler'] = profiler
+
+    with app.app_context():
+        for engine in db.engines.values():
+            instrument_engine(engine)
+    timed_json(app.json)
+
+    @app.before_request
+    def start_request_metrics():
+        g.request_metrics = {'started': time.perf_counter(), 'sql_statements': 0, 'sql': 0.0, 'serialize': 0.0,
+                             'compress': 0.0}
+        if profiler is not None:
+            profiler.start(threading.get_ident())
+
+    @app.after_request
+    def record_request_metrics(response):
+        metrics = g.pop('request_metrics', None)
+        if metrics is None:
+            return response
+        duration = time.perf_counter() - metrics['started']
+        size = 0 if response.is_streamed else (response.content_length or 0)
+        registry.observe(request.method, route_name(), response.status_code, duration, metrics['sql_statements'],
+                         metrics['sql'], metrics['serialize'], size)
+
+        if app.config['SERVER_TIMING']:
+            response.headers['Server-Timing'] = ', '.join([
+                f"db;dur={metrics['sql'] * 1000:.2f};desc=\"{metrics['sql_statements']} queries\"",
+                f"serialize;dur={metrics['serialize'] * 1000:.2f}",
+                f"compress;dur={metrics['compress'] * 1000:.2f}",
+                f'app;dur={duration * 1000:.2f}',
+            ])
+
+        if profiler is not None:
+            samples = profiler.stop(threading.get_ident())
+            if duration >= profiler.threshold and samples:
+                path = profiler.dump(samples, request.method, route_name(), duration)
+                app.logger.warning('Slow request %s %s took %.0fms; profile written to %s',
+                                   request.method, request.path, duration * 1000, path)
+        return response
+
+    @app.teardown_request
+    def stop_profiling(exc):
+        # after_request is skipped when an exception propagates.
+        if profiler is not None:
+            profiler.stop(threading.get_ident())
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
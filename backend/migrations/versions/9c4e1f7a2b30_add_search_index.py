@@ -0,0 +1,46 @@
+"""add search index
+
+Revision ID: 9c4e1f7a2b30
+Revises: 2eefe0d08803
+Create Date: 2026-10-18 16:20:11.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c4e1f7a2b30'
+down_revision = '2eefe0d08803'
+branch_labels = None
+depends_on = None
+
+# Mirrors search.SEARCH_FIELDS: rowid = id * 8 + type code.
+DOCUMENTS = [
+    (1, 'bands', 'name', ['genre', 'description']),
+    (2, 'shows', 'title', ['description']),
+    (3, 'venues', 'name', ['city']),
+    (4, 'musicians', 'name', ['instrument', 'bio']),
+]
+
+
+def upgrade():
+    # FTS5 is SQLite-only; other databases use search.InvertedIndex instead.
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute(
+        "CREATE VIRTUAL TABLE search_index USING fts5("
+        "name, body, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    for code, table, name, body in DOCUMENTS:
+        body_sql = " || ' ' || ".join(f"coalesce({column}, '')" for column in body)
+        op.execute(
+            f"INSERT INTO search_index (rowid, name, body) "
+            f"SELECT id * 8 + {code}, coalesce({name}, ''), trim({body_sql}) FROM {table}"
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute('DROP TABLE search_index')
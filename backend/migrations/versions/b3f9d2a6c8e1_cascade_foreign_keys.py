@@ -0,0 +1,42 @@
+"""cascade foreign keys
+
+Revision ID: b3f9d2a6c8e1
+Revises: e5b18c3f6a92
+Create Date: 2026-10-18 20:12:47.530219
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3f9d2a6c8e1'
+down_revision = 'e5b18c3f6a92'
+branch_labels = None
+depends_on = None
+
+# table -> (constraint, column, referred table)
+FOREIGN_KEYS = {
+    'shows': [('fk_shows_venue_id_venues', 'venue_id', 'venues')],
+    'reviews': [('fk_reviews_user_id_users', 'user_id', 'users'),
+                ('fk_reviews_show_id_shows', 'show_id', 'shows')],
+    'show_bands': [('fk_show_bands_band_id_bands', 'band_id', 'bands'),
+                   ('fk_show_bands_show_id_shows', 'show_id', 'shows')],
+    'musicians': [('fk_musicians_band_id_bands', 'band_id', 'bands')],
+}
+
+
+def recreate_foreign_keys(ondelete):
+    for table, foreign_keys in FOREIGN_KEYS.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for name, column, referred in foreign_keys:
+                batch_op.drop_constraint(name, type_='foreignkey')
+                batch_op.create_foreign_key(name, referred, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    recreate_foreign_keys('CASCADE')
+
+
+def downgrade():
+    recreate_foreign_keys(None)
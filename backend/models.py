@@ -4,13 +4,37 @@ from config import db
 from sqlalchemy.ext.associationproxy import association_proxy
 from datetime import datetime
 
+class RatingAggregateMixin:
+    # Denormalized review statistics, maintained by ratings.py.
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_avg = db.Column(db.Float)
+    rating_1 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_2 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_3 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_4 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_5 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    def rating_summary(self):
+        return {
+            'count': self.rating_count,
+            'average': self.rating_avg,
+            'histogram': {str(r): getattr(self, f'rating_{r}') for r in range(1, 6)}
+        }
+
 class ShowBand(db.Model):
     __tablename__ = 'show_bands'
     id = db.Column(db.Integer, primary_key=True)
-    show_id = db.Column(db.Integer, db.ForeignKey('shows.id'))
-    band_id = db.Column(db.Integer, db.ForeignKey('bands.id'))
+    show_id = db.Column(db.Integer, db.ForeignKey('shows.id', ondelete='CASCADE'))
+    band_id = db.Column(db.Integer, db.ForeignKey('bands.id', ondelete='CASCADE'))
     set_order = db.Column(db.Integer)
 
+    __table_args__ = (
+        db.UniqueConstraint('show_id', 'set_order', name='uq_show_bands_show_id_set_order'),
+        db.Index('ix_show_bands_show_id_band_id', 'show_id', 'band_id'),
+        db.Index('ix_show_bands_band_id_show_id', 'band_id', 'show_id'),
+    )
+
     show = db.relationship('Show', back_populates='show_bands')
     band = db.relationship('Band', back_populates='show_bands')
 
@@ -22,7 +46,7 @@ class ShowBand(db.Model):
             'set_order': self.set_order
         }
 
-class Band(db.Model):
+class Band(RatingAggregateMixin, db.Model):
     __tablename__ = 'bands'
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
@@ -30,11 +54,18 @@ class Band(db.Model):
     description = db.Column(db.Text)
     formed_year = db.Column(db.Integer)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    musicians = db.relationship('Musician', backref='band', cascade='all, delete-orphan')
-    show_bands = db.relationship('ShowBand', back_populates='band', cascade='all, delete-orphan')
+    musicians = db.relationship('Musician', backref='band', cascade='all, delete-orphan',
+                                passive_deletes=True)
+    show_bands = db.relationship('ShowBand', back_populates='band', cascade='all, delete-orphan',
+                                 passive_deletes=True)
     shows = association_proxy('show_bands', 'show')
 
+    __table_args__ = (
+        db.Index('ix_bands_rating_avg_rating_count', 'rating_avg', 'rating_count'),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -50,13 +81,15 @@ class Venue(db.Model):
     __tablename__ = 'venues'
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
-    city = db.Column(db.String)
+    city = db.Column(db.String, index=True)
     address = db.Column(db.String)
     capacity = db.Column(db.Integer)
     phone = db.Column(db.String)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    shows = db.relationship('Show', backref='venue', cascade='all, delete-orphan')
+    shows = db.relationship('Show', backref='venue', cascade='all, delete-orphan',
+                            passive_deletes=True)
 
     def to_dict(self):
         return {
@@ -69,27 +102,35 @@ class Venue(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
-class Show(db.Model):
+class Show(RatingAggregateMixin, db.Model):
     __tablename__ = 'shows'
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String)
-    date = db.Column(db.String)
-    time = db.Column(db.String)
+    date = db.Column(db.Date, index=True)
+    time = db.Column(db.Time)
     ticket_price = db.Column(db.Float)
     description = db.Column(db.Text)
-    venue_id = db.Column(db.Integer, db.ForeignKey('venues.id'))
+    venue_id = db.Column(db.Integer, db.ForeignKey('venues.id', ondelete='CASCADE'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    reviews = db.relationship('Review', backref='show', cascade='all, delete-orphan')
-    show_bands = db.relationship('ShowBand', back_populates='show', cascade='all, delete-orphan')
+    reviews = db.relationship('Review', backref='show', cascade='all, delete-orphan',
+                              passive_deletes=True)
+    show_bands = db.relationship('ShowBand', back_populates='show', cascade='all, delete-orphan',
+                                 passive_deletes=True, order_by='(ShowBand.set_order, ShowBand.id)')
     bands = association_proxy('show_bands', 'band')
 
+    __table_args__ = (
+        db.Index('ix_shows_rating_avg_rating_count', 'rating_avg', 'rating_count'),
+        db.Index('ix_shows_venue_id_date', 'venue_id', 'date'),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
             'title': self.title,
-            'date': self.date,
-            'time': self.time,
+            'date': self.date.isoformat() if self.date else None,
+            'time': self.time.strftime('%H:%M') if self.time else None,
             'ticket_price': self.ticket_price,
             'description': self.description,
             'venue': self.venue.to_dict() if self.venue else None,
@@ -106,8 +147,10 @@ class User(db.Model):
     first_name = db.Column(db.String)
     last_name = db.Column(db.String)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    reviews = db.relationship('Review', backref='user', cascade='all, delete-orphan')
+    reviews = db.relationship('Review', backref='user', cascade='all, delete-orphan',
+                              passive_deletes=True)
 
     def to_dict(self):
         return {
@@ -124,9 +167,10 @@ class Review(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     rating = db.Column(db.Integer, nullable=False)
     comment = db.Column(db.Text)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
-    show_id = db.Column(db.Integer, db.ForeignKey('shows.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), index=True)
+    show_id = db.Column(db.Integer, db.ForeignKey('shows.id', ondelete='CASCADE'), index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def to_dict(self):
         return {
@@ -144,8 +188,9 @@ class Musician(db.Model):
     name = db.Column(db.String, nullable=False)
     instrument = db.Column(db.String)
     bio = db.Column(db.Text)
-    band_id = db.Column(db.Integer, db.ForeignKey('bands.id'))
+    band_id = db.Column(db.Integer, db.ForeignKey('bands.id', ondelete='CASCADE'), index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def to_dict(self):
         return {
@@ -155,4 +200,62 @@ class Musician(db.Model):
             'bio': self.bio,
             'band_id': self.band_id,
             'created_at': self.created_at.isoformat() if self.created_at else None
-        }
\ No newline at end of file
+        }
+class ShowDocument(db.Model):
+    # The materialized GET /api/shows/<id> payload, maintained by documents.py.
+    # No foreign key: documents are rebuilt and removed after the fact.
+    __tablename__ = 'show_documents'
+    show_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    body = db.Column(db.Text, nullable=False)
+    entity_tags = db.Column(db.Text, nullable=False, default='')
+    source_version = db.Column(db.DateTime)
+    built_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class Change(db.Model):
+    # Append-only log behind GET /api/changes, written by changes.py in the
+    # same transaction as the write it records. AUTOINCREMENT keeps SQLite
+    # from reusing ids after pruning, so ids only ever grow.
+    __tablename__ = 'changes'
+    id = db.Column(db.Integer, primary_key=True)
+    resource = db.Column(db.String, nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String, nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    __table_args__ = {'sqlite_autoincrement': True}
+
+class Job(db.Model):
+    # Queued side effects of writes, run by jobs.py workers. Rows are deleted
+    # once their job succeeds; a job that keeps failing stays with status 'dead'.
+    __tablename__ = 'jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, nullable=False)
+    key = db.Column(db.String, nullable=False, index=True)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String, nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (db.Index('ix_jobs_status_run_at', 'status', 'run_at'),)
+
+class BandNeighbor(db.Model):
+    # The bands most often on the bill with band_id, best first, maintained by
+    # recommendations.py. No foreign keys, as for show documents: the lists
+    # are rebuilt after the fact, and deleted neighbors are skipped when served.
+    __tablename__ = 'band_neighbors'
+    band_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    rank = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    neighbor_id = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    shared = db.Column(db.Integer, nullable=False)
+
+class ShowNeighbor(db.Model):
+    # The shows most liked by the fans of show_id, best first; see BandNeighbor.
+    __tablename__ = 'show_neighbors'
+    show_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    rank = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    neighbor_id = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    shared = db.Column(db.Integer, nullable=False)
@@ -0,0 +1,102 @@
+# backend/pagination.py
+
+import base64
+import binascii
+import json
+
+from flask import Response, current_app, jsonify, request, stream_with_context
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+STREAM_BATCH_SIZE = 500
+
+STREAM_MIMETYPES = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def encode_cursor(last_id):
+    raw = json.dumps({'id': last_id}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        last_id = json.loads(base64.urlsafe_b64decode(padded))['id']
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(last_id, int):
+        raise ValueError('Invalid cursor')
+    return last_id
+
+
+def parse_limit(value):
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('limit must be an integer')
+    if limit < 1:
+        raise ValueError('limit must be at least 1')
+    return min(limit, MAX_LIMIT)
+
+
+def list_response(query, model, serializer):
+    """Respond with a list endpoint's rows, honouring ?limit, ?cursor and ?stream.
+
+    Without any of those parameters the full JSON array is returned, as before.
+    With ?limit or ?cursor the rows are keyset-paginated on the primary key and
+    wrapped as {"items": [...], "next_cursor": ...}. With ?stream=json or
+    ?stream=ndjson the rows are streamed from a server-side cursor instead.
+    Rows are serialized by serializer (see serializers.Serializer) from Core
+    rows rather than ORM objects.
+    """
+    stream_format = request.args.get('stream')
+    if stream_format:
+        if stream_format not in STREAM_MIMETYPES:
+            return jsonify({'error': 'stream must be one of: json, ndjson'}), 400
+        return stream_response(query.order_by(model.id), stream_format, serializer)
+
+    if 'limit' not in request.args and 'cursor' not in request.args:
+        return jsonify(serializer.rows(query)), 200
+
+    try:
+        limit = parse_limit(request.args.get('limit', DEFAULT_LIMIT))
+        cursor = request.args.get('cursor')
+        if cursor:
+            query = query.filter(model.id > decode_cursor(cursor))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    rows = serializer.rows(query.order_by(model.id).limit(limit + 1))
+    items = rows[:limit]
+    next_cursor = encode_cursor(items[-1]['id']) if len(rows) > limit else None
+
+    return jsonify({
+        'items': items,
+        'next_cursor': next_cursor
+    }), 200
+
+
+def stream_response(query, stream_format, serializer):
+    dumps = current_app.json.dumps
+
+    def items():
+        for batch in serializer.batches(query, STREAM_BATCH_SIZE):
+            yield from batch
+
+    def generate_ndjson():
+        for item in items():
+            yield dumps(item) + '\n'
+
+    def generate_json():
+        yield '['
+        first = True
+        for item in items():
+            yield ('' if first else ',') + dumps(item)
+            first = False
+        yield ']'
+
+    generate = generate_ndjson if stream_format == 'ndjson' else generate_json
+    return Response(stream_with_context(generate()), mimetype=STREAM_MIMETYPES[stream_format])
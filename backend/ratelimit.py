@@ -0,0 +1,264 @@
+# backend/ratelimit.py
+
+import math
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from flask import current_app, g, jsonify, request
+
+from config import READ_METHODS
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600}
+DEFAULT_WRITE_LIMIT = '60/minute'
+DEFAULT_MAX_KEYS = 10_000
+
+
+def parse_limit(value):
+    """"20/minute" -> (capacity 20, refill rate 20/60 tokens per second); "off" -> None."""
+    if value.strip().lower() in ('off', '0', 'none', ''):
+        return None
+    count, _, period = value.strip().partition('/')
+    if period not in PERIODS or not count.isdigit() or int(count) < 1:
+        raise ValueError(f'Invalid rate limit {value!r}; expected e.g. "20/minute"')
+    return int(count), int(count) / PERIODS[period]
+
+
+def parse_limits(value):
+    """"reviews=10/minute,bands=off" -> {'reviews': (10, 0.1667), 'bands': None}."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        blueprint, _, limit = item.partition('=')
+        limits[blueprint.strip()] = parse_limit(limit)
+    return limits
+
+
+class MemoryBuckets:
+    """In-process token buckets keyed by (blueprint, client).
+
+    Each worker process limits on its own, so with N workers a client can get
+    up to N times the limit; use RedisBuckets to share the buckets. Idle
+    buckets are evicted least-recently-used first once there are max_keys of
+    them; a bucket idle long enough to be evicted would have refilled anyway.
+    """
+
+    def __init__(self, max_keys=DEFAULT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate):
+        """Take one token; return (allowed, tokens left, seconds until the next token)."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, int(tokens), 0.0 if allowed else (1 - tokens) / rate
+
+
+class RedisBuckets:
+    """Token buckets shared by every worker through Redis, with the same
+    interface as MemoryBuckets. Requires the optional ``redis`` package."""
+
+    # KEYS[1] = bucket; ARGV = capacity, rate, now. Returns {allowed, tokens * 1000}.
+    SCRIPT = """
+    local capacity, rate, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(now - updated, 0) * rate)
+    local allowed = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return {allowed, math.floor(tokens * 1000)}
+    """
+
+    def __init__(self, url, prefix='music-band:ratelimit:'):
+        import redis
+
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(self.SCRIPT)
+
+    def take(self, key, capacity, rate):
+        allowed, tokens = self._take(keys=[self.prefix + key], args=[capacity, rate, time.time()])
+        tokens /= 1000
+        return bool(allowed), int(tokens), 0.0 if allowed else (1 - tokens) / rate
+
+
+def create_buckets(url=None):
+    if url is None or url == 'memory://':
+        return MemoryBuckets()
+    if url.startswith(('redis://', 'rediss://')):
+        return RedisBuckets(url)
+    raise ValueError(f'Unsupported RATE_LIMIT_URL: {url}')
+
+
+class AdmissionGate:
+    """Bounds the write requests a worker process handles at once.
+
+    Up to max_active run; up to max_waiting more wait at most timeout
+    seconds for a slot. Anything beyond that is turned away immediately, so
+    a burst of writes queued on the database lock cannot tie up every worker
+    thread and starve the reads.
+    """
+
+    def __init__(self, max_active, max_waiting, timeout):
+        self.max_active = max_active
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self.counts = Counter()
+        self._condition = threading.Condition()
+
+    def enter(self):
+        """Return 'admitted', 'queue_full' or 'timeout'."""
+        with self._condition:
+            if self.active >= self.max_active:
+                if self.waiting >= self.max_waiting:
+                    self.counts['queue_full'] += 1
+                    return 'queue_full'
+                self.waiting += 1
+                try:
+                    admitted = self._condition.wait_for(lambda: self.active < self.max_active, self.timeout)
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    self.counts['timeout'] += 1
+                    return 'timeout'
+            self.active += 1
+            self.counts['admitted'] += 1
+            return 'admitted'
+
+    def leave(self):
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+
+def client_key():
+    """The client's address; behind RATE_LIMIT_PROXIES trusted proxies, the
+    X-Forwarded-For entry the outermost of them appended."""
+    proxies = current_app.config['RATE_LIMIT_PROXIES']
+    route = request.access_route
+    if proxies and len(route) >= proxies:
+        return route[-proxies]
+    return request.remote_addr or 'unknown'
+
+
+def too_many_requests(message, retry_after, status):
+    response = jsonify({'error': message})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(math.ceil(retry_after), 1))
+    return response
+
+
+def init_ratelimit(app):
+    """Token-bucket rate limits and admission control for write requests.
+
+    RATE_LIMIT_DEFAULT (default 60/minute) applies per client to the write
+    methods of every blueprint; RATE_LIMITS overrides it per blueprint, e.g.
+    "reviews=10/minute,bands=20/minute" ("off" disables one). RATE_LIMIT_URL
+    selects the bucket store (memory:// or redis://). ADMISSION_MAX_WRITES,
+    ADMISSION_QUEUE and ADMISSION_TIMEOUT size the per-process admission gate;
+    RATE_LIMIT_ENABLED=0 / ADMISSION_ENABLED=0 turn either part off.
+    """
+    sqlite = app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite')
+    app.config.setdefault('RATE_LIMIT_ENABLED', os.environ.get('RATE_LIMIT_ENABLED', '1') != '0')
+    app.config.setdefault('RATE_LIMIT_DEFAULT', os.environ.get('RATE_LIMIT_DEFAULT', DEFAULT_WRITE_LIMIT))
+    app.config.setdefault('RATE_LIMITS', os.environ.get('RATE_LIMITS', ''))
+    app.config.setdefault('RATE_LIMIT_URL', os.environ.get('RATE_LIMIT_URL'))
+    app.config.setdefault('RATE_LIMIT_PROXIES', int(os.environ.get('RATE_LIMIT_PROXIES', 0)))
+    app.config.setdefault('ADMISSION_ENABLED', os.environ.get('ADMISSION_ENABLED', '1') != '0')
+    # SQLite has a single writer, so more concurrent writes only wait on its lock.
+    app.config.setdefault('ADMISSION_MAX_WRITES', int(os.environ.get('ADMISSION_MAX_WRITES', 1 if sqlite else 4)))
+    app.config.setdefault('ADMISSION_QUEUE', int(os.environ.get('ADMISSION_QUEUE', 16)))
+    app.config.setdefault('ADMISSION_TIMEOUT', float(os.environ.get('ADMISSION_TIMEOUT', 5)))
+
+    rejected = Counter()
+    collectors = []
+
+    if app.config['RATE_LIMIT_ENABLED']:
+        default = parse_limit(app.config['RATE_LIMIT_DEFAULT'])
+        limits = parse_limits(app.config['RATE_LIMITS'])
+        buckets = create_buckets(app.config['RATE_LIMIT_URL'])
+        app.extensions['rate_limit_buckets'] = buckets
+
+        @app.before_request
+        def apply_rate_limit():
+            if request.method in READ_METHODS or request.blueprint is None:
+                return None
+            limit = limits.get(request.blueprint, default)
+            if limit is None:
+                return None
+            capacity, rate = limit
+            allowed, remaining, retry_after = buckets.take(f'{request.blueprint}:{client_key()}', capacity, rate)
+            g.rate_limit = (capacity, remaining)
+            if allowed:
+                return None
+            rejected[request.blueprint] += 1
+            return too_many_requests('Rate limit exceeded. Please slow down.', retry_after, 429)
+
+        @app.after_request
+        def rate_limit_headers(response):
+            if 'rate_limit' in g:
+                capacity, remaining = g.pop('rate_limit')
+                response.headers['X-RateLimit-Limit'] = str(capacity)
+                response.headers['X-RateLimit-Remaining'] = str(remaining)
+            return response
+
+        def rate_limit_metrics():
+            lines = ['# HELP rate_limit_rejected_total Write requests refused with 429, by blueprint.',
+                     '# TYPE rate_limit_rejected_total counter']
+            lines += [f'rate_limit_rejected_total{{blueprint="{name}"}} {count}'
+                      for name, count in sorted(rejected.items())]
+            return lines
+        collectors.append(rate_limit_metrics)
+
+    if app.config['ADMISSION_ENABLED']:
+        gate = AdmissionGate(app.config['ADMISSION_MAX_WRITES'], app.config['ADMISSION_QUEUE'],
+                             app.config['ADMISSION_TIMEOUT'])
+        app.extensions['admission_gate'] = gate
+
+        @app.before_request
+        def admit_write():
+            if request.method in READ_METHODS or request.blueprint is None:
+                return None
+            outcome = gate.enter()
+            if outcome == 'admitted':
+                g.admitted = True
+                return None
+            return too_many_requests('Server is busy. Please try again shortly.', 1, 503)
+
+        @app.teardown_request
+        def release_write(exc):
+            if g.pop('admitted', False):
+                gate.leave()
+
+        def admission_metrics():
+            lines = ['# HELP admission_requests_total Write requests by admission outcome.',
+                     '# TYPE admission_requests_total counter']
+            lines += [f'admission_requests_total{{outcome="{outcome}"}} {gate.counts[outcome]}'
+                      for outcome in ('admitted', 'queue_full', 'timeout')]
+            lines += ['# HELP admission_active Write requests being handled.', '# TYPE admission_active gauge',
+                      f'admission_active {gate.active}',
+                      '# HELP admission_waiting Write requests waiting for a slot.', '# TYPE admission_waiting gauge',
+                      f'admission_waiting {gate.waiting}']
+            return lines
+        collectors.append(admission_metrics)
+
+    registry = app.extensions.get('metrics')
+    if registry is not None:
+        registry.collectors.extend(collectors)
@@ -0,0 +1,107 @@
+# backend/ratings.py
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import case, func, select, update
+
+import jobs
+from cache import defer_invalidation
+from config import db
+from models import Show, Review, Band, ShowBand
+from serializers import chunks
+from versioning import touch
+
+RATINGS = range(1, 6)
+AGGREGATE_COLUMNS = ['rating_count', 'rating_sum', 'rating_avg'] + [f'rating_{r}' for r in RATINGS]
+
+ratings_cli = AppGroup('ratings', help='Maintain the denormalized show/band rating aggregates.')
+
+
+def schedule(show_ids):
+    """Queue a refresh of the shows' aggregates and those of every band on their bills.
+
+    Runs inside the caller's transaction, before any delete it makes cascades
+    away the bills, so the bands of a deleted show are still found.
+    """
+    show_ids = sorted({show_id for show_id in show_ids if show_id is not None})
+    band_ids = set()
+    for chunk in chunks(show_ids):
+        band_ids.update(db.session.execute(select(ShowBand.band_id).where(ShowBand.show_id.in_(chunk))).scalars())
+    jobs.enqueue(db.session, 'ratings.refresh',
+                 [{'show_id': show_id} for show_id in show_ids] + [{'band_id': band_id} for band_id in sorted(band_ids)])
+
+
+def review_added(review):
+    schedule([review.show_id])
+
+
+def review_removed(review):
+    schedule([review.show_id])
+
+
+def _totals(key, source, *criteria):
+    """Per-key review counts: one grouped pass over reviews instead of a subquery per row."""
+    columns = [func.count().label('rating_count'), func.sum(Review.rating).label('rating_sum')]
+    columns += [func.sum(case((Review.rating == rating, 1), else_=0)).label(f'rating_{rating}') for rating in RATINGS]
+    return select(key.label('id'), *columns).select_from(source).where(*criteria).group_by(key).subquery()
+
+
+def _recompute(model, totals, ids=None):
+    """Zero the aggregates of model (only the rows in ids, if given), then fill in totals."""
+    counters = [column for column in AGGREGATE_COLUMNS if column != 'rating_avg']
+    reset = update(model)
+    if ids is not None:
+        reset = reset.where(model.id.in_(ids))
+    db.session.execute(reset.values(**{column: 0 for column in counters}, rating_avg=None),
+                       execution_options={'synchronize_session': False})
+    db.session.execute(
+        update(model)
+        .where(model.id == totals.c.id)
+        .values(
+            **{column: totals.c[column] for column in counters},
+            rating_avg=totals.c.rating_sum * 1.0 / totals.c.rating_count,
+        ),
+        execution_options={'synchronize_session': False},
+    )
+
+
+def _band_totals(*criteria):
+    bills = select(ShowBand.show_id, ShowBand.band_id).where(*criteria).distinct().subquery()
+    return _totals(bills.c.band_id, bills.join(Review, Review.show_id == bills.c.show_id))
+
+
+def rebuild():
+    """Recompute every aggregate from the reviews table."""
+    _recompute(Show, _totals(Review.show_id, Review))
+    _recompute(Band, _band_totals())
+
+
+def refresh(show_ids=(), band_ids=()):
+    """Recompute the aggregates of the given shows and bands from the reviews table.
+
+    The UPDATEs bypass the ORM flush hooks, so the rows' cached responses are
+    invalidated on commit and their updated_at bumped here, as
+    batch.record_bulk_write does for other Core writes.
+    """
+    for chunk in chunks(sorted(show_ids)):
+        _recompute(Show, _totals(Review.show_id, Review, Review.show_id.in_(chunk)), chunk)
+        touch(db.session, {Show: chunk})
+    for chunk in chunks(sorted(band_ids)):
+        _recompute(Band, _band_totals(ShowBand.band_id.in_(chunk)), chunk)
+        touch(db.session, {Band: chunk})
+    defer_invalidation(db.session, {f'shows:{show_id}' for show_id in show_ids}
+                       | {f'bands:{band_id}' for band_id in band_ids})
+
+
+@jobs.handler('ratings.refresh')
+def refresh_job(payloads):
+    refresh({payload['show_id'] for payload in payloads if 'show_id' in payload},
+            {payload['band_id'] for payload in payloads if 'band_id' in payload})
+
+
+@ratings_cli.command('rebuild')
+def rebuild_command():
+    """Recompute show and band rating aggregates from scratch."""
+    rebuild()
+    db.session.commit()
+    click.echo('Rating aggregates rebuilt.')
@@ -0,0 +1,284 @@
+# backend/recommendations.py
+
+import math
+import os
+import time
+from collections import Counter, defaultdict
+from operator import mul, neg
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import delete, event, func, insert, inspect, select
+
+import jobs
+from config import db
+from models import Band, BandNeighbor, Review, Show, ShowBand, ShowNeighbor
+from serializers import chunks
+
+DEFAULT_NEIGHBORS = 20
+DEFAULT_LIMIT = 10
+# A review of at least this rating makes its user a fan of the show.
+LIKE_RATING = 4
+# Damps the score of pairs that share only one or two shows or fans, which
+# would otherwise outrank well-supported pairs whenever both sides are small.
+SHRINKAGE = 2
+# A refresh that reaches more than this share of a graph's lists rebuilds
+# the whole graph instead.
+REBUILD_SHARE = 0.05
+
+recommendations_cli = AppGroup('recommendations', help='Build the similar-band and recommended-show lists.')
+
+
+class Graph:
+    """Items that share contexts, read as (item, context) edges: bands share
+    the shows they played, shows share the users who liked them. Each item's
+    top neighbors are stored as rows of neighbors, keyed by key."""
+
+    def __init__(self, model, item, context, neighbors, key, shared, *criteria):
+        self.model = model
+        self.item = item
+        self.context = context
+        self.neighbors = neighbors
+        self.key = key
+        self.shared = shared
+        self.criteria = (item.isnot(None), context.isnot(None), *criteria)
+
+    def edges(self, *criteria):
+        return select(self.item, self.context).where(*self.criteria, *criteria).distinct()
+
+
+GRAPHS = {
+    'bands': Graph(Band, ShowBand.band_id, ShowBand.show_id, BandNeighbor, BandNeighbor.band_id, 'shared_shows'),
+    'shows': Graph(Show, Review.show_id, Review.user_id, ShowNeighbor, ShowNeighbor.show_id, 'shared_fans',
+                   Review.rating >= LIKE_RATING),
+}
+
+
+def top_neighbors(members, contexts, norms, item_ids, k):
+    """{item: [(score, shared, neighbor), ...]} for item_ids, best first.
+
+    members (item -> contexts) and contexts (context -> items) are the sparse
+    item-context matrix A by row and by column. Counting the items of an
+    item's contexts gives its row of the co-occurrence matrix A^T A, without
+    ever building the whole matrix. The score is the cosine of the two items'
+    context sets, damped by SHRINKAGE; norms holds one over the square root of
+    each candidate's number of contexts.
+    """
+    # An item shares at most all of its contexts with another.
+    most = max((len(members.get(item, ())) for item in item_ids), default=0)
+    damping = [count * count / (count + SHRINKAGE) for count in range(most + 1)]
+    lists = {}
+    for item in item_ids:
+        shared = Counter()
+        for context in members.get(item, ()):
+            shared.update(contexts[context])
+        shared.pop(item, None)
+        if not shared:
+            lists[item] = []
+            continue
+        # Scored pair by pair in C (map, zip, sorted); ties go to the more
+        # shared contexts, then to the lower id.
+        others, counts = list(shared), list(shared.values())
+        scores = map(mul, map(damping.__getitem__, counts), map(norms.__getitem__, others))
+        best = sorted(zip(scores, counts, map(neg, others)), reverse=True)[:k]
+        norm = norms[item]
+        lists[item] = [(round(score * norm, 6), count, -other) for score, count, other in best]
+    return lists
+
+
+def load(graph, item_ids=None):
+    """(members, contexts, norms) for the whole graph, or for item_ids only:
+    their edges, every edge of the contexts they share, and the norms of all
+    the candidates found there."""
+    members, contexts = defaultdict(list), defaultdict(list)
+    if item_ids is None:
+        result = db.session.connection().execution_options(yield_per=10000).execute(graph.edges())
+        for item, context in result:
+            members[item].append(context)
+            contexts[context].append(item)
+        return members, contexts, {item: 1 / math.sqrt(len(item_contexts)) for item, item_contexts in members.items()}
+
+    for chunk in chunks(sorted(item_ids)):
+        for item, context in db.session.execute(graph.edges(graph.item.in_(chunk))):
+            members[item].append(context)
+    for chunk in chunks(sorted({context for item_contexts in members.values() for context in item_contexts})):
+        for item, context in db.session.execute(graph.edges(graph.context.in_(chunk))):
+            contexts[context].append(item)
+    norms = {}
+    for chunk in chunks(sorted({item for items in contexts.values() for item in items})):
+        norms.update(
+            (item, 1 / math.sqrt(size)) for item, size in db.session.execute(
+                select(graph.item, func.count(graph.context.distinct()))
+                .where(*graph.criteria, graph.item.in_(chunk))
+                .group_by(graph.item)
+            )
+        )
+    return members, contexts, norms
+
+
+def store(graph, item_ids, lists):
+    """Replace the stored lists of item_ids in one transaction that holds the
+    write lock; an item missing from lists ends up with none."""
+    table = graph.neighbors.__table__
+    connection = db.session.connection(execution_options={'write_lock': True})
+    connection.execute(delete(table).where(graph.key.in_(item_ids)))
+    rows = [
+        {graph.key.key: item, 'rank': rank, 'neighbor_id': neighbor, 'score': score, 'shared': shared}
+        for item in item_ids
+        for rank, (score, shared, neighbor) in enumerate(lists.get(item, ()), 1)
+    ]
+    if rows:
+        connection.execute(insert(table), rows)
+    db.session.commit()
+
+
+def refresh(resource, item_ids):
+    """Recompute the lists of item_ids of resource ('bands' or 'shows') from
+    the current bills and reviews, a chunk of items at a time."""
+    graph = GRAPHS[resource]
+    k = current_app.config['RECOMMENDATION_NEIGHBORS']
+    for chunk in chunks(sorted(item_ids)):
+        members, contexts, norms = load(graph, chunk)
+        db.session.rollback()
+        store(graph, chunk, top_neighbors(members, contexts, norms, chunk, k))
+
+
+def rebuild(resource):
+    """Recompute every list of resource ('bands' or 'shows') from one read of
+    its edges. Each chunk of lists is replaced in its own short transaction,
+    so readers see every list either old or new and writers are never held up
+    for long."""
+    graph = GRAPHS[resource]
+    k = current_app.config['RECOMMENDATION_NEIGHBORS']
+    members, contexts, norms = load(graph)
+    item_ids = db.session.execute(select(graph.model.id).order_by(graph.model.id)).scalars().all()
+    db.session.rollback()
+    for chunk in chunks(item_ids):
+        store(graph, chunk, top_neighbors(members, contexts, norms, chunk, k))
+    # Lists of items deleted since they were built.
+    connection = db.session.connection(execution_options={'write_lock': True})
+    connection.execute(delete(graph.neighbors).where(graph.key.not_in(select(graph.model.id))))
+    db.session.commit()
+    return len(item_ids)
+
+
+def edge_payloads(model, row):
+    """Refresh payloads for a written review or bill entry that is an edge:
+    the item (show_id, band_id) and the context (fan, bill) it joins.
+
+    Writes go through here both as the row before and as the row after, so
+    an edge that is added, removed or moved is always seen. Rows from a
+    cascaded delete carry no rating (see batch.cascaded_rows); those count
+    as likes, which at worst refreshes lists that did not change.
+    """
+    if model is Review:
+        item, context = row.get('show_id'), row.get('user_id')
+        if item is None or context is None or (row.get('rating', LIKE_RATING) or 0) < LIKE_RATING:
+            return []
+        return [{'show_id': item, 'fan': context}]
+    if model is ShowBand:
+        item, context = row.get('band_id'), row.get('show_id')
+        if item is None or context is None:
+            return []
+        return [{'band_id': item, 'bill': context}]
+    return []
+
+
+def record_rows(session, model, rows, op):
+    """Queue refreshes for rows written with Core statements (see
+    batch.record_bulk_write). Updates pass the rows both before and after,
+    so op itself makes no difference."""
+    payloads = [payload for row in rows for payload in edge_payloads(model, row)]
+    if payloads:
+        jobs.enqueue(session, 'recommendations.refresh', payloads)
+
+
+@event.listens_for(db.session, 'after_flush')
+def collect_flushed_edges(session, flush_context):
+    payloads = []
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        model = type(obj)
+        if model not in (Review, ShowBand):
+            continue
+        columns = ('show_id', 'user_id', 'rating') if model is Review else ('show_id', 'band_id')
+        attrs = inspect(obj).attrs
+        if obj in session.dirty and not any(attrs[column].history.has_changes() for column in columns):
+            continue
+        row = {column: getattr(obj, column) for column in columns}
+        payloads += edge_payloads(model, row)
+        # The edge as it was before the flush, if it moved or stopped being a like.
+        old = {column: attrs[column].history.deleted[0] for column in columns if attrs[column].history.deleted}
+        if old:
+            payloads += edge_payloads(model, {**row, **old})
+    if payloads:
+        jobs.enqueue(session, 'recommendations.refresh', payloads)
+
+
+def affected(graph, item_ids, context_ids):
+    """The items whose lists an added or removed edge between item_ids and
+    context_ids can change.
+
+    An edge changes its item's number of contexts, and so its norm, and its
+    shared counts with the other items of the context. Both enter the score
+    of the item in the list of every item it shares a context with, so all
+    of those are recomputed, along with the items of context_ids, which an
+    edge removed by now no longer links to the item.
+    """
+    contexts = set(context_ids)
+    for chunk in chunks(sorted(item_ids)):
+        contexts.update(context for _, context in db.session.execute(graph.edges(graph.item.in_(chunk))))
+    items = set(item_ids)
+    for chunk in chunks(sorted(contexts)):
+        items.update(item for item, _ in db.session.execute(graph.edges(graph.context.in_(chunk))))
+    return items
+
+
+@jobs.handler('recommendations.refresh')
+def refresh_job(payloads):
+    changed = {
+        'bands': affected(GRAPHS['bands'], {payload['band_id'] for payload in payloads if 'band_id' in payload},
+                          {payload['bill'] for payload in payloads if 'bill' in payload}),
+        'shows': affected(GRAPHS['shows'], {payload['show_id'] for payload in payloads if 'show_id' in payload},
+                          {payload['fan'] for payload in payloads if 'fan' in payload}),
+    }
+    sizes = {resource: db.session.execute(select(func.count()).select_from(GRAPHS[resource].model)).scalar()
+             for resource, item_ids in changed.items() if item_ids}
+    db.session.rollback()
+    for resource, size in sizes.items():
+        # Past this share, one read of the whole graph is cheaper than
+        # reading the contexts of every chunk of changed items.
+        if len(changed[resource]) > REBUILD_SHARE * size:
+            rebuild(resource)
+        else:
+            refresh(resource, changed[resource])
+
+
+@jobs.handler('recommendations.rebuild')
+def rebuild_job(payloads):
+    for resource in sorted({payload['resource'] for payload in payloads}):
+        rebuild(resource)
+
+
+def init_recommendations(app):
+    """RECOMMENDATION_NEIGHBORS: how many similar bands and recommended shows
+    are stored per band and show (default 20)."""
+    app.config.setdefault('RECOMMENDATION_NEIGHBORS',
+                          int(os.environ.get('RECOMMENDATION_NEIGHBORS', DEFAULT_NEIGHBORS)))
+
+
+@recommendations_cli.command('rebuild')
+@click.option('--only', type=click.Choice(list(GRAPHS)), help='Rebuild only the band or the show lists.')
+@click.option('--queue', is_flag=True, help='Queue the rebuild for the job workers instead of running it here.')
+def rebuild_command(only, queue):
+    """Recompute every similar-band and recommended-show list."""
+    resources = [only] if only else list(GRAPHS)
+    if queue:
+        jobs.enqueue(db.session, 'recommendations.rebuild', [{'resource': resource} for resource in resources])
+        db.session.commit()
+        click.echo('Rebuild queued.')
+        return
+    for resource in resources:
+        started = time.perf_counter()
+        count = rebuild(resource)
+        click.echo(f'{resource}: {count} lists rebuilt in {time.perf_counter() - started:.1f}s')
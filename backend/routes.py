@@ -1,8 +1,27 @@
 # backend/routes.py
 
-from flask import Blueprint, jsonify, request
+from datetime import date
+
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from sqlalchemy import select
+from sqlalchemy.orm import undefer
 from config import db
 from models import Show, Review, User, Band, Venue, Musician, ShowBand
+from cache import cache_key, cached
+import analytics
+import ratings
+import recommendations
+from batch import READ_ONLY_COLUMNS, batch_response, delete_rows
+from pagination import DEFAULT_LIMIT, decode_cursor, encode_cursor, list_response, parse_limit
+from versioning import conditional
+from metrics import timed_serialization
+from serializers import resource_query, row_dict
+import changes
+import documents
+import export
+import jobs
+import search
+from validation import band_values, parse_show_schedule, review_update_values, review_values
 
 # Blueprint definitions
 shows_bp = Blueprint('shows', __name__, url_prefix='/api/shows')
@@ -11,21 +30,145 @@ venues_bp = Blueprint('venues', __name__, url_prefix='/api/venues')
 users_bp = Blueprint('users', __name__, url_prefix='/api/users')
 reviews_bp = Blueprint('reviews', __name__, url_prefix='/api/reviews')
 musicians_bp = Blueprint('musicians', __name__, url_prefix='/api/musicians')
+search_bp = Blueprint('search', __name__, url_prefix='/api/search')
+changes_bp = Blueprint('changes', __name__, url_prefix='/api/changes')
+analytics_bp = Blueprint('analytics', __name__, url_prefix='/api/analytics')
+export_bp = Blueprint('export', __name__, url_prefix='/api/export')
+
+def write_response(obj, status):
+    """The written row as to_dict() returns it or, with "Prefer: return=minimal"
+    (RFC 7240), only its own columns, which skips loading the rows to_dict() embeds."""
+    if 'return=minimal' in request.headers.get('Prefer', ''):
+        response = jsonify(row_dict(obj))
+        response.status_code = status
+        response.headers['Preference-Applied'] = 'return=minimal'
+        return response
+    with timed_serialization():
+        data = obj.to_dict()
+    return jsonify(data), status
+
+def id_arg(name):
+    """An optional integer query argument, or None when it is absent."""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an integer')
+
+def delete_response(model, obj_id, name):
+    """Delete a row, and through ON DELETE CASCADE everything under it, in one
+    transaction. With "Prefer: respond-async" (RFC 7240) a purge job deletes
+    it in chunks instead, for subtrees too large to delete within a request."""
+    model.query.get_or_404(obj_id)
+    if 'respond-async' in request.headers.get('Prefer', ''):
+        jobs.enqueue(db.session, 'purge', [{'resource': model.__tablename__, 'id': obj_id}])
+        db.session.commit()
+        response = jsonify({'message': f'{name} deletion queued'})
+        response.status_code = 202
+        response.headers['Preference-Applied'] = 'respond-async'
+        return response
+    delete_rows(model, [obj_id])
+    db.session.commit()
+    return jsonify({'message': f'{name} deleted successfully'}), 200
+
+def top_rated_response(resource, model):
+    try:
+        limit = min(parse_limit(request.args.get('limit', 10)), 100)
+        min_reviews = int(request.args.get('min_reviews', 1))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    query, serialize = resource_query(resource)
+    rows = (query
+            .options(*[undefer(getattr(model, column)) for column in ratings.AGGREGATE_COLUMNS])
+            .filter(model.rating_count >= max(min_reviews, 1))
+            .order_by(model.rating_avg.desc(), model.rating_count.desc())
+            .limit(limit)
+            .all())
+    return jsonify([{**serialize(obj), 'rating': obj.rating_summary()} for obj in rows]), 200
+
+def neighbors_response(resource, obj_id):
+    """The stored neighbor list of a band or show, best first: one primary
+    key range read, whatever the size of the graph."""
+    graph = recommendations.GRAPHS[resource]
+    try:
+        limit = min(parse_limit(request.args.get('limit', recommendations.DEFAULT_LIMIT)),
+                    current_app.config['RECOMMENDATION_NEIGHBORS'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    graph.model.query.get_or_404(obj_id)
+    query, serialize = resource_query(resource)
+    neighbors = graph.neighbors
+    rows = (query
+            .join(neighbors, neighbors.neighbor_id == graph.model.id)
+            .filter(graph.key == obj_id)
+            .order_by(neighbors.rank)
+            .limit(limit)
+            .add_columns(neighbors.score, neighbors.shared)
+            .all())
+    return jsonify([{**serialize(obj), 'score': score, graph.shared: shared} for obj, score, shared in rows]), 200
 
 # SHOWS ENDPOINTS
 @shows_bp.route('/', methods=['GET'])
+@cached('shows')
 def get_shows():
-    shows = Show.query.all()
-    return jsonify([show.to_dict() for show in shows]), 200
+    query, serialize = resource_query('shows')
+    return list_response(query, Show, serialize)
+
+@shows_bp.route('/upcoming', methods=['GET'])
+def get_upcoming_shows():
+    try:
+        start = date.fromisoformat(request.args['from']) if request.args.get('from') else date.today()
+        end = date.fromisoformat(request.args['to']) if request.args.get('to') else None
+        limit = parse_limit(request.args.get('limit', DEFAULT_LIMIT))
+        venue_id = id_arg('venue_id')
+        band_id = id_arg('band_id')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    query, serialize = resource_query('shows')
+    query = query.filter(Show.date >= start)
+    if end:
+        query = query.filter(Show.date <= end)
+    if request.args.get('city'):
+        query = query.filter(Show.venue_id.in_(select(Venue.id).where(Venue.city == request.args['city'])))
+    if venue_id is not None:
+        query = query.filter(Show.venue_id == venue_id)
+    if band_id is not None:
+        query = query.filter(Show.id.in_(select(ShowBand.show_id).where(ShowBand.band_id == band_id)))
+
+    return jsonify(serialize.rows(query.order_by(Show.date, Show.time, Show.id).limit(limit))), 200
+
+@shows_bp.route('/top', methods=['GET'])
+def get_top_shows():
+    return top_rated_response('shows', Show)
 
 @shows_bp.route('/<int:show_id>', methods=['GET'])
+@conditional('shows')
+@cached('shows')
 def get_show(show_id):
-    show = Show.query.get_or_404(show_id)
-    return jsonify(show.to_dict()), 200
+    if 'fields' not in request.args and 'expand' not in request.args:
+        stored = documents.stored_response(show_id)
+        if stored is not None:
+            return stored
+    query, serialize = resource_query('shows')
+    show = query.get_or_404(show_id)
+    return jsonify(serialize(show)), 200
+
+@shows_bp.route('/<int:show_id>/recommended', methods=['GET'])
+def get_recommended_shows(show_id):
+    """Shows most liked by the fans of this one."""
+    return neighbors_response('shows', show_id)
 
 @shows_bp.route('/', methods=['POST'])
 def create_show():
-    data = request.get_json()
+    try:
+        data = parse_show_schedule(request.get_json())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     show = Show(
         title=data.get('title'),
         date=data.get('date'),
@@ -36,106 +179,108 @@ def create_show():
     )
     db.session.add(show)
     db.session.commit()
-    return jsonify(show.to_dict()), 201
+    return write_response(show, 201)
+
+@shows_bp.route('/batch', methods=['POST', 'PATCH', 'DELETE'])
+def batch_shows():
+    return batch_response('shows')
 
 @shows_bp.route('/<int:show_id>', methods=['PATCH'])
 def update_show(show_id):
     show = Show.query.get_or_404(show_id)
-    data = request.get_json()
+    try:
+        data = parse_show_schedule(request.get_json())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     for key, value in data.items():
-        if hasattr(show, key):
+        if key not in READ_ONLY_COLUMNS and hasattr(show, key):
             setattr(show, key, value)
     
     db.session.commit()
-    return jsonify(show.to_dict()), 200
+    return write_response(show, 200)
 
 @shows_bp.route('/<int:show_id>', methods=['DELETE'])
 def delete_show(show_id):
-    show = Show.query.get_or_404(show_id)
-    db.session.delete(show)
-    db.session.commit()
-    return jsonify({'message': 'Show deleted successfully'}), 200
+    return delete_response(Show, show_id, 'Show')
 
 # BANDS ENDPOINTS
 @bands_bp.route('/', methods=['GET'])
+@cached('bands')
 def get_bands():
-    bands = Band.query.all()
-    return jsonify([band.to_dict() for band in bands]), 200
+    query, serialize = resource_query('bands')
+    return list_response(query, Band, serialize)
+
+@bands_bp.route('/top', methods=['GET'])
+def get_top_bands():
+    return top_rated_response('bands', Band)
 
 @bands_bp.route('/<int:band_id>', methods=['GET'])
+@conditional('bands')
+@cached('bands')
 def get_band(band_id):
-    band = Band.query.get_or_404(band_id)
-    return jsonify(band.to_dict()), 200
+    query, serialize = resource_query('bands')
+    band = query.get_or_404(band_id)
+    return jsonify(serialize(band)), 200
+
+@bands_bp.route('/<int:band_id>/similar', methods=['GET'])
+def get_similar_bands(band_id):
+    """Bands most often on the bill with this one."""
+    return neighbors_response('bands', band_id)
 
 @bands_bp.route('/', methods=['POST'])
 def create_band():
     try:
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
-        
         # Validation
-        if not data.get('name') or len(str(data.get('name')).strip()) < 2:
-            return jsonify({'error': 'Band name must be at least 2 characters'}), 400
-        
-        if not data.get('genre'):
-            return jsonify({'error': 'Genre is required'}), 400
-        
-        if not data.get('description') or len(str(data.get('description')).strip()) < 10:
-            return jsonify({'error': 'Description must be at least 10 characters'}), 400
-        
-        formed_year = data.get('formed_year')
-        if not formed_year or int(formed_year) < 1900:
-            return jsonify({'error': 'Formation year must be a valid year after 1900'}), 400
-        
-        band = Band(
-            name=str(data.get('name')).strip(),
-            genre=str(data.get('genre')).strip(),
-            description=str(data.get('description')).strip(),
-            formed_year=int(formed_year)
-        )
+        try:
+            band = Band(**band_values(request.get_json()))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         db.session.add(band)
         db.session.commit()
         
-        return jsonify(band.to_dict()), 201
+        return write_response(band, 201)
         
     except Exception as e:
         db.session.rollback()
         print(f'Band creation error: {str(e)}')
         return jsonify({'error': 'Failed to create band. Please try again.'}), 500
 
+@bands_bp.route('/batch', methods=['POST', 'PATCH', 'DELETE'])
+def batch_bands():
+    return batch_response('bands')
+
 @bands_bp.route('/<int:band_id>', methods=['PATCH'])
 def update_band(band_id):
     band = Band.query.get_or_404(band_id)
     data = request.get_json()
     
     for key, value in data.items():
-        if hasattr(band, key):
+        if key not in READ_ONLY_COLUMNS and hasattr(band, key):
             setattr(band, key, value)
     
     db.session.commit()
-    return jsonify(band.to_dict()), 200
+    return write_response(band, 200)
 
 @bands_bp.route('/<int:band_id>', methods=['DELETE'])
 def delete_band(band_id):
-    band = Band.query.get_or_404(band_id)
-    db.session.delete(band)
-    db.session.commit()
-    return jsonify({'message': 'Band deleted successfully'}), 200
+    return delete_response(Band, band_id, 'Band')
 
 # VENUES ENDPOINTS
 @venues_bp.route('/', methods=['GET'])
+@cached('venues')
 def get_venues():
-    venues = Venue.query.all()
-    return jsonify([venue.to_dict() for venue in venues]), 200
+    query, serialize = resource_query('venues')
+    return list_response(query, Venue, serialize)
 
 @venues_bp.route('/<int:venue_id>', methods=['GET'])
+@conditional('venues')
+@cached('venues')
 def get_venue(venue_id):
-    venue = Venue.query.get_or_404(venue_id)
-    return jsonify(venue.to_dict()), 200
+    query, serialize = resource_query('venues')
+    venue = query.get_or_404(venue_id)
+    return jsonify(serialize(venue)), 200
 
 @venues_bp.route('/', methods=['POST'])
 def create_venue():
@@ -149,7 +294,11 @@ def create_venue():
     )
     db.session.add(venue)
     db.session.commit()
-    return jsonify(venue.to_dict()), 201
+    return write_response(venue, 201)
+
+@venues_bp.route('/batch', methods=['POST', 'PATCH', 'DELETE'])
+def batch_venues():
+    return batch_response('venues')
 
 @venues_bp.route('/<int:venue_id>', methods=['PATCH'])
 def update_venue(venue_id):
@@ -157,29 +306,30 @@ def update_venue(venue_id):
     data = request.get_json()
     
     for key, value in data.items():
-        if hasattr(venue, key):
+        if key not in READ_ONLY_COLUMNS and hasattr(venue, key):
             setattr(venue, key, value)
     
     db.session.commit()
-    return jsonify(venue.to_dict()), 200
+    return write_response(venue, 200)
 
 @venues_bp.route('/<int:venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
-    venue = Venue.query.get_or_404(venue_id)
-    db.session.delete(venue)
-    db.session.commit()
-    return jsonify({'message': 'Venue deleted successfully'}), 200
+    return delete_response(Venue, venue_id, 'Venue')
 
 # USERS ENDPOINTS
 @users_bp.route('/', methods=['GET'])
+@cached('users')
 def get_users():
-    users = User.query.all()
-    return jsonify([user.to_dict() for user in users]), 200
+    query, serialize = resource_query('users')
+    return list_response(query, User, serialize)
 
 @users_bp.route('/<int:user_id>', methods=['GET'])
+@conditional('users')
+@cached('users')
 def get_user(user_id):
-    user = User.query.get_or_404(user_id)
-    return jsonify(user.to_dict()), 200
+    query, serialize = resource_query('users')
+    user = query.get_or_404(user_id)
+    return jsonify(serialize(user)), 200
 
 @users_bp.route('/', methods=['POST'])
 def create_user():
@@ -192,7 +342,11 @@ def create_user():
     )
     db.session.add(user)
     db.session.commit()
-    return jsonify(user.to_dict()), 201
+    return write_response(user, 201)
+
+@users_bp.route('/batch', methods=['POST', 'PATCH', 'DELETE'])
+def batch_users():
+    return batch_response('users')
 
 @users_bp.route('/<int:user_id>', methods=['PATCH'])
 def update_user(user_id):
@@ -200,93 +354,89 @@ def update_user(user_id):
     data = request.get_json()
     
     for key, value in data.items():
-        if hasattr(user, key):
+        if key not in READ_ONLY_COLUMNS and hasattr(user, key):
             setattr(user, key, value)
     
     db.session.commit()
-    return jsonify(user.to_dict()), 200
+    return write_response(user, 200)
 
 @users_bp.route('/<int:user_id>', methods=['DELETE'])
 def delete_user(user_id):
-    user = User.query.get_or_404(user_id)
-    db.session.delete(user)
-    db.session.commit()
-    return jsonify({'message': 'User deleted successfully'}), 200
+    return delete_response(User, user_id, 'User')
 
 # REVIEWS ENDPOINTS
 @reviews_bp.route('/', methods=['GET'])
+@cached('reviews')
 def get_reviews():
-    reviews = Review.query.all()
-    return jsonify([review.to_dict() for review in reviews]), 200
+    query, serialize = resource_query('reviews')
+    return list_response(query, Review, serialize)
 
 @reviews_bp.route('/<int:review_id>', methods=['GET'])
+@conditional('reviews')
+@cached('reviews')
 def get_review(review_id):
-    review = Review.query.get_or_404(review_id)
-    return jsonify(review.to_dict()), 200
+    query, serialize = resource_query('reviews')
+    review = query.get_or_404(review_id)
+    return jsonify(serialize(review)), 200
 
 @reviews_bp.route('/', methods=['POST'])
 def create_review():
-    data = request.get_json()
-    
     # Validation
-    if not data.get('rating') or not isinstance(data.get('rating'), int) or data.get('rating') < 1 or data.get('rating') > 5:
-        return jsonify({'error': 'Rating must be an integer between 1 and 5'}), 400
-    
-    if not data.get('comment') or len(data.get('comment').strip()) < 10:
-        return jsonify({'error': 'Comment must be at least 10 characters'}), 400
-    
-    if not data.get('user_id') or not isinstance(data.get('user_id'), int):
-        return jsonify({'error': 'Valid user_id is required'}), 400
-    
-    if not data.get('show_id') or not isinstance(data.get('show_id'), int):
-        return jsonify({'error': 'Valid show_id is required'}), 400
+    try:
+        review = Review(**review_values(request.get_json()))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    review = Review(
-        rating=data.get('rating'),
-        comment=data.get('comment'),
-        user_id=data.get('user_id'),
-        show_id=data.get('show_id')
-    )
     db.session.add(review)
+    ratings.review_added(review)
     db.session.commit()
-    return jsonify(review.to_dict()), 201
+    return write_response(review, 201)
+
+@reviews_bp.route('/batch', methods=['POST', 'PATCH', 'DELETE'])
+def batch_reviews():
+    return batch_response('reviews')
 
 @reviews_bp.route('/<int:review_id>', methods=['PATCH', 'PUT'])
 def update_review(review_id):
     review = Review.query.get_or_404(review_id)
-    data = request.get_json()
-    
     # Validation for PUT/PATCH
-    if 'rating' in data and (not isinstance(data['rating'], int) or data['rating'] < 1 or data['rating'] > 5):
-        return jsonify({'error': 'Rating must be an integer between 1 and 5'}), 400
-    
-    if 'comment' in data and len(data['comment'].strip()) < 10:
-        return jsonify({'error': 'Comment must be at least 10 characters'}), 400
+    try:
+        data = review_update_values(request.get_json())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
+    old_show_id, old_rating = review.show_id, review.rating
     for key, value in data.items():
-        if hasattr(review, key):
+        if key not in READ_ONLY_COLUMNS and hasattr(review, key):
             setattr(review, key, value)
-    
+
+    if (review.show_id, review.rating) != (old_show_id, old_rating):
+        ratings.schedule([old_show_id, review.show_id])
     db.session.commit()
-    return jsonify(review.to_dict()), 200
+    return write_response(review, 200)
 
 @reviews_bp.route('/<int:review_id>', methods=['DELETE'])
 def delete_review(review_id):
     review = Review.query.get_or_404(review_id)
+    ratings.review_removed(review)
     db.session.delete(review)
     db.session.commit()
     return jsonify({'message': 'Review deleted successfully'}), 200
 
 # MUSICIANS ENDPOINTS
 @musicians_bp.route('/', methods=['GET'])
+@cached('musicians')
 def get_musicians():
-    musicians = Musician.query.all()
-    return jsonify([musician.to_dict() for musician in musicians]), 200
+    query, serialize = resource_query('musicians')
+    return list_response(query, Musician, serialize)
 
 @musicians_bp.route('/<int:musician_id>', methods=['GET'])
+@conditional('musicians')
+@cached('musicians')
 def get_musician(musician_id):
-    musician = Musician.query.get_or_404(musician_id)
-    return jsonify(musician.to_dict()), 200
+    query, serialize = resource_query('musicians')
+    musician = query.get_or_404(musician_id)
+    return jsonify(serialize(musician)), 200
 
 @musicians_bp.route('/', methods=['POST'])
 def create_musician():
@@ -299,7 +449,11 @@ def create_musician():
     )
     db.session.add(musician)
     db.session.commit()
-    return jsonify(musician.to_dict()), 201
+    return write_response(musician, 201)
+
+@musicians_bp.route('/batch', methods=['POST', 'PATCH', 'DELETE'])
+def batch_musicians():
+    return batch_response('musicians')
 
 @musicians_bp.route('/<int:musician_id>', methods=['PATCH'])
 def update_musician(musician_id):
@@ -307,15 +461,151 @@ def update_musician(musician_id):
     data = request.get_json()
     
     for key, value in data.items():
-        if hasattr(musician, key):
+        if key not in READ_ONLY_COLUMNS and hasattr(musician, key):
             setattr(musician, key, value)
     
     db.session.commit()
-    return jsonify(musician.to_dict()), 200
+    return write_response(musician, 200)
 
 @musicians_bp.route('/<int:musician_id>', methods=['DELETE'])
 def delete_musician(musician_id):
     musician = Musician.query.get_or_404(musician_id)
     db.session.delete(musician)
     db.session.commit()
-    return jsonify({'message': 'Musician deleted successfully'}), 200
\ No newline at end of file
+    return jsonify({'message': 'Musician deleted successfully'}), 200
+# SEARCH ENDPOINT
+@search_bp.route('/', methods=['GET'])
+def search_all():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'q is required'}), 400
+
+    resources = [value for value in request.args.get('type', '').split(',') if value]
+    unknown = [value for value in resources if value not in search.SEARCH_FIELDS]
+    if unknown:
+        return jsonify({'error': f"Unknown type: {', '.join(unknown)}. Use {', '.join(search.SEARCH_FIELDS)}."}), 400
+
+    try:
+        limit = min(parse_limit(request.args.get('limit', search.DEFAULT_LIMIT)), search.MAX_LIMIT)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(search.search(query, resources, limit)), 200
+
+# CHANGES FEED
+@changes_bp.route('/', methods=['GET'])
+def list_changes():
+    """Entities changed since ?since=<token>; without it, just the current token."""
+    resources = [value for value in request.args.get('type', '').split(',') if value]
+    resource_names = list(changes.CHANGE_RESOURCES.values())
+    unknown = [value for value in resources if value not in resource_names]
+    if unknown:
+        return jsonify({'error': f"Unknown type: {', '.join(unknown)}. Use {', '.join(resource_names)}."}), 400
+
+    if 'since' not in request.args:
+        return jsonify({'changes': [], 'next': encode_cursor(changes.current_token()), 'has_more': False}), 200
+
+    try:
+        since = decode_cursor(request.args['since'])
+        limit = parse_limit(request.args.get('limit', DEFAULT_LIMIT))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        items, token, has_more = changes.changes_since(
+            since, resources or resource_names, limit, current_app.config['CHANGES_SETTLE_SECONDS']
+        )
+    except changes.TokenExpired:
+        return jsonify({'error': 'This change token has expired. Refetch the data and start again without since.'}), 410
+
+    return jsonify({'changes': items, 'next': encode_cursor(token), 'has_more': has_more}), 200
+
+# ANALYTICS
+def analytics_range():
+    try:
+        start = date.fromisoformat(request.args['from']) if request.args.get('from') else None
+        end = date.fromisoformat(request.args['to']) if request.args.get('to') else None
+    except ValueError:
+        raise ValueError('from and to must be YYYY-MM-DD')
+    return start, end
+
+def analytics_response(compute):
+    """compute()'s report, reused until the end of the cache time bucket."""
+    report, hit, remaining = analytics.cached_report(cache_key(), compute)
+    response = jsonify(report)
+    if remaining:
+        response.cache_control.max_age = remaining
+        response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response
+
+@analytics_bp.route('/shows-per-city', methods=['GET'])
+def get_shows_per_city():
+    try:
+        start, end = analytics_range()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return analytics_response(lambda: analytics.shows_per_city(start, end, request.args.get('city')))
+
+@analytics_bp.route('/ticket-prices', methods=['GET'])
+def get_ticket_prices():
+    try:
+        start, end = analytics_range()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        width = float(request.args.get('bucket', analytics.DEFAULT_PRICE_BUCKET))
+    except ValueError:
+        width = 0
+    if not width > 0:
+        return jsonify({'error': 'bucket must be a positive number'}), 400
+    return analytics_response(lambda: analytics.ticket_prices(start, end, width))
+
+@analytics_bp.route('/band-ratings', methods=['GET'])
+def get_band_ratings():
+    try:
+        start, end = analytics_range()
+        limit = min(parse_limit(request.args.get('limit', analytics.DEFAULT_BANDS)), analytics.MAX_BANDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    band_ids = None
+    if request.args.get('band_id'):
+        try:
+            band_ids = [int(value) for value in request.args['band_id'].split(',') if value.strip()]
+        except ValueError:
+            return jsonify({'error': 'band_id must be a comma-separated list of integers'}), 400
+        if len(band_ids) > analytics.MAX_BANDS:
+            return jsonify({'error': f'At most {analytics.MAX_BANDS} band_id values are allowed'}), 400
+    return analytics_response(lambda: analytics.band_rating_trends(band_ids, start, end, limit))
+
+@analytics_bp.route('/gross', methods=['GET'])
+def get_gross():
+    by = request.args.get('by', 'city')
+    if by not in analytics.GROSS_GROUPS:
+        return jsonify({'error': f"by must be one of {', '.join(analytics.GROSS_GROUPS)}"}), 400
+    try:
+        start, end = analytics_range()
+        limit = parse_limit(request.args.get('limit', DEFAULT_LIMIT))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return analytics_response(lambda: analytics.gross(by, start, end, limit))
+
+# EXPORT
+@export_bp.route('/<entity>', methods=['GET'])
+def export_entity(entity):
+    """Stream a whole table as ?format=csv|ndjson|parquet, optionally only the
+    rows updated since ?since=<ISO date or datetime>."""
+    if entity not in export.EXPORT_MODELS:
+        return jsonify({'error': f"Unknown entity. Use {', '.join(export.EXPORT_MODELS)}."}), 404
+    export_format = request.args.get('format', 'ndjson')
+    try:
+        export.check_format(export_format)
+        batch_size = export.parse_batch_size(request.args.get('batch_size', export.DEFAULT_BATCH_SIZE))
+        since = export.parse_since(request.args.get('since'))
+        export.export_query(entity, since)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    chunks = export.export_chunks(db.session, entity, export_format, since, batch_size)
+    response = Response(stream_with_context(chunks), mimetype=export.FORMATS[export_format])
+    response.headers['Content-Disposition'] = f'attachment; filename={entity}.{export_format}'
+    return response
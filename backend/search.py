@@ -0,0 +1,370 @@
+# backend/search.py
+
+import heapq
+import math
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+
+import click
+from flask import current_app, has_app_context
+from flask.cli import AppGroup
+from sqlalchemy import bindparam, event, inspect, select, text
+
+import jobs
+from config import db
+from models import Band, Show, Venue, Musician
+from serializers import chunks
+
+SEARCH_TABLE = 'search_index'
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+NAME_WEIGHT = 10.0
+SNIPPET_TOKENS = 12
+
+# Searchable resources: (type code, model, name column, body columns). The
+# name column is ranked NAME_WEIGHT times higher than the body. Each document
+# is keyed by entity id * 8 + type code, which is its FTS5 rowid, so updates
+# and deletes are rowid lookups rather than scans.
+SEARCH_FIELDS = {
+    'bands': (1, Band, 'name', ['genre', 'description']),
+    'shows': (2, Show, 'title', ['description']),
+    'venues': (3, Venue, 'name', ['city']),
+    'musicians': (4, Musician, 'name', ['instrument', 'bio']),
+}
+RESOURCES_BY_CODE = {code: resource for resource, (code, *_) in SEARCH_FIELDS.items()}
+RESOURCES_BY_MODEL = {fields[1]: resource for resource, fields in SEARCH_FIELDS.items()}
+
+search_cli = AppGroup('search', help='Maintain the full-text search index.')
+
+
+def doc_key(resource, entity_id):
+    return entity_id * 8 + SEARCH_FIELDS[resource][0]
+
+
+def split_key(key):
+    return RESOURCES_BY_CODE[key % 8], key // 8
+
+
+def document(resource, values):
+    """(name, body) text indexed for a row, given its column values."""
+    _, _, name, body = SEARCH_FIELDS[resource]
+    return values.get(name) or '', ' '.join(str(values[column]) for column in body if values.get(column))
+
+
+def tokenize(value):
+    # Same folding as FTS5's unicode61 tokenizer with remove_diacritics: case-
+    # and accent-insensitive, splitting on anything that is not a letter or digit.
+    value = unicodedata.normalize('NFKD', value.lower())
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    return re.findall(r'[^\W_]+', value)
+
+
+def match_expression(terms):
+    """FTS5 MATCH query requiring every term, each as a prefix."""
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+class FTS5Index:
+    """Search backed by the search_index FTS5 table in the same SQLite database.
+
+    Writes queue search.reindex jobs in the session's transaction, so the
+    index catches up just after the rows it describes commit, and never sees
+    a write that rolled back.
+    """
+
+    deferred = False
+
+    def search(self, terms, resources, limit):
+        codes = [SEARCH_FIELDS[resource][0] for resource in resources]
+        statement = text(
+            f'SELECT rowid, name, bm25({SEARCH_TABLE}, :name_weight, 1.0) AS rank, '
+            f"snippet({SEARCH_TABLE}, 1, '', '', '…', {SNIPPET_TOKENS}) "
+            f'FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :query AND rowid % 8 IN :codes '
+            'ORDER BY rank LIMIT :limit'
+        ).bindparams(bindparam('codes', expanding=True))
+        rows = db.session.execute(statement, {
+            'name_weight': NAME_WEIGHT,
+            'query': match_expression(terms),
+            'codes': codes,
+            'limit': limit,
+        })
+        return [(key, name, -rank, snippet) for key, name, rank, snippet in rows]
+
+    def apply(self, connection, changes):
+        if not changes:
+            return
+        connection.execute(
+            text(f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN :keys').bindparams(bindparam('keys', expanding=True)),
+            {'keys': list(changes)}
+        )
+        documents = [{'key': key, 'name': doc[0], 'body': doc[1]} for key, doc in changes.items() if doc is not None]
+        if documents:
+            connection.execute(text(f'INSERT INTO {SEARCH_TABLE} (rowid, name, body) VALUES (:key, :name, :body)'),
+                               documents)
+
+    def rebuild(self, connection):
+        connection.execute(text(f'DELETE FROM {SEARCH_TABLE}'))
+        for resource, (code, model, name, body) in SEARCH_FIELDS.items():
+            body_sql = " || ' ' || ".join(f"coalesce({column}, '')" for column in body)
+            connection.execute(text(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, name, body) '
+                f"SELECT id * 8 + {code}, coalesce({name}, ''), trim({body_sql}) FROM {model.__tablename__}"
+            ))
+        connection.execute(text(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')"))
+
+
+class InvertedIndex:
+    """In-process inverted index for databases without FTS5 (e.g. Postgres).
+
+    Built from the database on the first search and updated as transactions
+    commit. Like LRUCache, each worker process holds its own copy and only
+    sees writes made through it; run one worker, or use SQLite/FTS5, when that
+    matters.
+    """
+
+    deferred = True
+
+    def __init__(self):
+        self._docs = {}
+        self._postings = defaultdict(dict)
+        self._vocabulary = []
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def search(self, terms, resources, limit):
+        if not self.loaded:
+            self.rebuild(db.session.connection())
+        codes = {SEARCH_FIELDS[resource][0] for resource in resources}
+        with self._lock:
+            total = max(len(self._docs), 1)
+            scores = None
+            for term in terms:
+                matches = defaultdict(float)
+                position = bisect_left(self._vocabulary, term)
+                while position < len(self._vocabulary) and self._vocabulary[position].startswith(term):
+                    postings = self._postings[self._vocabulary[position]]
+                    position += 1
+                    idf = math.log(1 + total / len(postings))
+                    for key, weight in postings.items():
+                        matches[key] += weight * idf
+                if scores is None:
+                    scores = {key: score for key, score in matches.items() if key % 8 in codes}
+                else:
+                    scores = {key: score + matches[key] for key, score in scores.items() if key in matches}
+                if not scores:
+                    return []
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+            return [(key, self._docs[key][0], score, self._snippet(self._docs[key][1], terms)) for key, score in best]
+
+    def apply(self, connection, changes):
+        if not self.loaded:
+            return
+        with self._lock:
+            for key, doc in changes.items():
+                self._remove(key)
+                if doc is not None:
+                    self._add(key, doc)
+
+    def rebuild(self, connection):
+        with self._lock:
+            self._docs.clear()
+            self._postings.clear()
+            for changes in iter_documents(connection):
+                for key, doc in changes.items():
+                    self._add(key, doc, sort=False)
+            self._vocabulary = sorted(self._postings)
+            self.loaded = True
+
+    def _add(self, key, doc, sort=True):
+        self._docs[key] = doc
+        weights = defaultdict(float)
+        for weight, value in ((NAME_WEIGHT, doc[0]), (1.0, doc[1])):
+            for term in tokenize(value):
+                weights[term] += weight
+        for term, weight in weights.items():
+            if sort and term not in self._postings:
+                self._vocabulary.insert(bisect_left(self._vocabulary, term), term)
+            self._postings[term][key] = weight
+
+    def _remove(self, key):
+        doc = self._docs.pop(key, None)
+        if doc is None:
+            return
+        for term in set(tokenize(doc[0]) + tokenize(doc[1])):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(key, None)
+            if not postings:
+                del self._postings[term]
+                self._vocabulary.pop(bisect_left(self._vocabulary, term))
+
+    @staticmethod
+    def _snippet(body, terms):
+        words = body.split()
+        for position, word in enumerate(words):
+            if any(token.startswith(term) for token in tokenize(word) for term in terms):
+                start = max(position - SNIPPET_TOKENS // 2, 0)
+                window = words[start:start + SNIPPET_TOKENS]
+                return ('…' if start else '') + ' '.join(window) + ('…' if start + SNIPPET_TOKENS < len(words) else '')
+        return ' '.join(words[:SNIPPET_TOKENS]) + ('…' if len(words) > SNIPPET_TOKENS else '')
+
+
+def iter_documents(connection, batch_size=1000):
+    """Yield {key: (name, body)} batches covering every searchable row."""
+    for resource, (_, model, name, body) in SEARCH_FIELDS.items():
+        columns = [model.__table__.c[column] for column in ('id', name, *body)]
+        result = connection.execute(select(*columns), execution_options={'yield_per': batch_size})
+        for rows in result.partitions():
+            yield {doc_key(resource, row.id): document(resource, row._mapping) for row in rows}
+
+
+def fts5_available():
+    try:
+        sqlite3.connect(':memory:').execute('CREATE VIRTUAL TABLE fts5_probe USING fts5(body)')
+    except sqlite3.Error:
+        return False
+    return True
+
+
+def init_search(app):
+    default = 'fts5' if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite') and fts5_available() else 'memory'
+    app.config.setdefault('SEARCH_BACKEND', os.environ.get('SEARCH_BACKEND', default))
+    if app.config['SEARCH_BACKEND'] == 'fts5':
+        app.extensions['search_index'] = FTS5Index()
+    elif app.config['SEARCH_BACKEND'] == 'memory':
+        app.extensions['search_index'] = InvertedIndex()
+    else:
+        raise ValueError(f"Unsupported SEARCH_BACKEND: {app.config['SEARCH_BACKEND']}")
+
+
+def get_search_index():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('search_index')
+
+
+def search(query, resources=None, limit=DEFAULT_LIMIT):
+    """Ranked hits for query over resources (all searchable ones by default).
+
+    Every word must match, as a prefix, in the name or body of a document.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return []
+    hits = get_search_index().search(terms, resources or list(SEARCH_FIELDS), limit)
+    results = []
+    for key, name, score, snippet in hits:
+        resource, entity_id = split_key(key)
+        results.append({'type': resource, 'id': entity_id, 'name': name, 'snippet': snippet, 'score': round(score, 4)})
+    return results
+
+
+def reindex(session, model, ids):
+    """Refresh the documents for ids, e.g. after a Core INSERT/UPDATE that
+    bypassed the ORM hooks below."""
+    resource = RESOURCES_BY_MODEL.get(model)
+    index = get_search_index()
+    if resource is None or index is None or not ids:
+        return
+    if not index.deferred:
+        stage(session, index, {doc_key(resource, id): None for id in ids})
+        return
+    _, _, name, body = SEARCH_FIELDS[resource]
+    columns = [model.__table__.c[column] for column in ('id', name, *body)]
+    rows = session.connection().execute(select(*columns).where(model.__table__.c.id.in_(ids)))
+    changes = {doc_key(resource, id): None for id in ids}
+    changes.update({doc_key(resource, row.id): document(resource, row._mapping) for row in rows})
+    stage(session, index, changes)
+
+
+def stage(session, index, changes):
+    if index.deferred:
+        session.info.setdefault('search_changes', {}).update(changes)
+    else:
+        # The job reads the rows again once they are committed.
+        jobs.enqueue(session, 'search.reindex', [{'key': key} for key in changes])
+
+
+@jobs.handler('search.reindex')
+def reindex_job(payloads):
+    """Index the committed text of the queued documents.
+
+    The rows are read in one transaction and the index written in another
+    that holds the write lock, as in documents.rebuild.
+    """
+    index = get_search_index()
+    if index is None:
+        return
+    changes = {payload['key']: None for payload in payloads}
+    ids = defaultdict(list)
+    for key in changes:
+        resource, entity_id = split_key(key)
+        ids[resource].append(entity_id)
+    for resource, resource_ids in ids.items():
+        _, model, name, body = SEARCH_FIELDS[resource]
+        columns = [model.__table__.c[column] for column in ('id', name, *body)]
+        for chunk in chunks(sorted(resource_ids)):
+            rows = db.session.execute(select(*columns).where(model.__table__.c.id.in_(chunk)))
+            changes.update({doc_key(resource, row.id): document(resource, row._mapping) for row in rows})
+    db.session.rollback()
+    # FTS5 reads before it writes, even for a DELETE, so take the lock first.
+    index.apply(None if index.deferred else db.session.connection(execution_options={'write_lock': True}), changes)
+
+
+def indexed_fields_changed(obj, resource):
+    _, _, name, body = SEARCH_FIELDS[resource]
+    attrs = inspect(obj).attrs
+    return any(attrs[column].history.has_changes() for column in (name, *body))
+
+
+@event.listens_for(db.session, 'after_flush')
+def index_flushed_objects(session, flush_context):
+    index = get_search_index()
+    if index is None:
+        return
+    changes = {}
+    for obj in (*session.new, *session.dirty):
+        resource = RESOURCES_BY_MODEL.get(type(obj))
+        if resource and (obj in session.new or indexed_fields_changed(obj, resource)):
+            _, _, name, body = SEARCH_FIELDS[resource]
+            changes[doc_key(resource, obj.id)] = document(resource, {
+                column: getattr(obj, column) for column in (name, *body)
+            })
+    for obj in session.deleted:
+        resource = RESOURCES_BY_MODEL.get(type(obj))
+        if resource:
+            changes[doc_key(resource, obj.id)] = None
+    if changes:
+        stage(session, index, changes)
+
+
+@event.listens_for(db.session, 'after_commit')
+def apply_deferred_changes(session):
+    changes = session.info.pop('search_changes', None)
+    index = get_search_index()
+    if changes and index is not None:
+        index.apply(None, changes)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_deferred_changes(session):
+    session.info.pop('search_changes', None)
+
+
+def exclude_search_tables(name, type_, parent_names):
+    """Keep autogenerate from dropping the FTS5 table and its shadow tables."""
+    return not (type_ == 'table' and name.startswith(SEARCH_TABLE))
+
+
+@search_cli.command('rebuild')
+def rebuild_command():
+    """Rebuild the search index from the searchable tables."""
+    get_search_index().rebuild(db.session.connection())
+    db.session.commit()
+    click.echo('Search index rebuilt.')
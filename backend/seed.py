@@ -1,88 +1,428 @@
 #!/usr/bin/env python3
+# backend/seed.py
+"""Sample and synthetic data: `flask --app app seed sample|generate`.
+
+`sample` adds the handful of demo rows the frontend expects. `generate`
+fills the database with synthetic rows at a configurable scale. Text comes
+from Faker pools built once per process, rows go in with chunked executemany
+Core INSERTs, and each chunk draws from its own generator seeded with
+(seed, table, chunk). The same seed and counts therefore give the same data
+whether the chunks are built in one process or spread over --workers
+processes (dates are relative to the day of generation).
+"""
+
+import random
+import time as timer
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, time, timedelta
+
+import click
+from faker import Faker
+from flask.cli import AppGroup
+from sqlalchemy import delete, func, select, text
+
+import ratings
+import recommendations
+from config import db
+from changes import current_token
+from models import (Band, BandNeighbor, Change, Job, Musician, Review, Show, ShowBand, ShowDocument, ShowNeighbor,
+                    User, Venue)
+from search import get_search_index
+
+seed_cli = AppGroup('seed', help='Load sample or synthetic data.')
+
+CHUNK_SIZE = 10_000
+POOL_SIZE = 2_000
+
+# venues, shows and reviews per scale; the other tables follow from these.
+SCALES = {
+    'tiny': {'venues': 100, 'shows': 1_000, 'reviews': 10_000},
+    'small': {'venues': 1_000, 'shows': 10_000, 'reviews': 100_000},
+    'large': {'venues': 10_000, 'shows': 100_000, 'reviews': 1_000_000},
+    'xlarge': {'venues': 50_000, 'shows': 500_000, 'reviews': 10_000_000},
+}
+
+GENRES = ['Rock', 'Jazz', 'Electronic', 'Folk', 'Hip Hop', 'Classical', 'Metal', 'Blues', 'Pop', 'Soul']
+INSTRUMENTS = ['Vocals', 'Guitar', 'Bass', 'Drums', 'Keyboards', 'Saxophone', 'Trumpet', 'Violin', 'DJ']
+VENUE_KINDS = ['Hall', 'Arena', 'Club', 'Theatre', 'Lounge', 'Ballroom', 'Warehouse']
+SHOW_TIMES = [time(hour, minute) for hour in range(18, 23) for minute in (0, 30)]
+RATING_WEIGHTS = [5, 10, 20, 35, 30]
+
+# Parents before children; reversed for --reset.
+MODELS = [Venue, Band, Musician, User, Show, ShowBand, Review]
+# Rows derived from MODELS, which --reset empties too. The change log is
+# pruned separately, as `flask changes prune` does.
+DERIVED_MODELS = [ShowDocument, BandNeighbor, ShowNeighbor, Job]
+# Jobs made redundant by the full rebuilds at the end of generate.
+REBUILT_JOBS = ['ratings.refresh', 'search.reindex', 'recommendations.refresh', 'recommendations.rebuild']
+
+
+def table_counts(scale='tiny', factor=1.0):
+    counts = {name: max(int(count * factor), 1) for name, count in SCALES[scale].items()}
+    counts['bands'] = max(counts['shows'] // 5, 1)
+    counts['musicians'] = counts['bands'] * 4
+    counts['users'] = max(counts['reviews'] // 20, 1)
+    return counts
+
+
+class Pools:
+    """Faker output drawn once, so a million rows cost a million random.choice() calls."""
+
+    def __init__(self, seed):
+        fake = Faker()
+        fake.seed_instance(seed)
+        self.sentences = [fake.sentence(nb_words=12) for _ in range(POOL_SIZE)]
+        self.paragraphs = [fake.paragraph(nb_sentences=3) for _ in range(POOL_SIZE // 4)]
+        self.words = [fake.word().title() for _ in range(POOL_SIZE)]
+        self.names = [fake.name() for _ in range(POOL_SIZE)]
+        self.first_names = [fake.first_name() for _ in range(POOL_SIZE // 4)]
+        self.last_names = [fake.last_name() for _ in range(POOL_SIZE // 4)]
+        self.cities = [fake.city() for _ in range(200)]
+        self.streets = [fake.street_address() for _ in range(POOL_SIZE)]
+        self.companies = [fake.last_name() for _ in range(POOL_SIZE // 4)]
+        self.phones = [fake.phone_number() for _ in range(POOL_SIZE // 4)]
+
+
+# Row builders: rows start..stop-1 of a table, given the id ranges of the new
+# rows in every table (ids[table] = (first id, count)).
+
+def venue_rows(start, stop, ids, pools, rng):
+    first, _ = ids['venues']
+    for i in range(start, stop):
+        yield {
+            'id': first + i,
+            'name': f'{rng.choice(pools.companies)} {rng.choice(VENUE_KINDS)} {first + i}',
+            'city': rng.choice(pools.cities),
+            'address': rng.choice(pools.streets),
+            'capacity': rng.choice([150, 300, 500, 1_000, 2_500, 5_000, 20_000]),
+            'phone': rng.choice(pools.phones),
+        }
+
+
+def band_rows(start, stop, ids, pools, rng):
+    first, _ = ids['bands']
+    for i in range(start, stop):
+        yield {
+            'id': first + i,
+            'name': f'{rng.choice(pools.words)} {rng.choice(pools.words)} {first + i}',
+            'genre': rng.choice(GENRES),
+            'description': rng.choice(pools.sentences),
+            'formed_year': rng.randint(1960, 2025),
+        }
+
+
+def musician_rows(start, stop, ids, pools, rng):
+    first, _ = ids['musicians']
+    first_band, bands = ids['bands']
+    for i in range(start, stop):
+        yield {
+            'id': first + i,
+            'name': rng.choice(pools.names),
+            'instrument': rng.choice(INSTRUMENTS),
+            'bio': rng.choice(pools.sentences),
+            'band_id': first_band + i % bands,
+        }
+
+
+def user_rows(start, stop, ids, pools, rng):
+    first, _ = ids['users']
+    for i in range(start, stop):
+        given, family = rng.choice(pools.first_names), rng.choice(pools.last_names)
+        yield {
+            'id': first + i,
+            'username': f'{given.lower()}.{family.lower()}{first + i}',
+            'email': f'user{first + i}@example.com',
+            'first_name': given,
+            'last_name': family,
+        }
+
+
+def show_rows(start, stop, ids, pools, rng):
+    first, _ = ids['shows']
+    first_venue, venues = ids['venues']
+    today = date.today()
+    for i in range(start, stop):
+        yield {
+            'id': first + i,
+            'title': f"{rng.choice(pools.words)} {rng.choice(['Night', 'Live', 'Sessions', 'Festival', 'Tour'])}",
+            'date': today + timedelta(days=rng.randint(-365, 365)),
+            'time': rng.choice(SHOW_TIMES),
+            'ticket_price': float(rng.choice([0, 15, 25, 35, 50, 75, 120])),
+            'description': rng.choice(pools.paragraphs),
+            'venue_id': first_venue + rng.randrange(venues),
+        }
+
+
+def show_band_rows(start, stop, ids, pools, rng):
+    # Counted in shows: each show gets a bill of one to three bands.
+    first_show, _ = ids['shows']
+    first_band, bands = ids['bands']
+    for i in range(start, stop):
+        lineup = rng.sample(range(bands), min(rng.randint(1, 3), bands))
+        for set_order, band in enumerate(lineup, start=1):
+            yield {'show_id': first_show + i, 'band_id': first_band + band, 'set_order': set_order}
+
+
+def review_rows(start, stop, ids, pools, rng):
+    first_user, users = ids['users']
+    first_show, shows = ids['shows']
+    for rating in rng.choices(range(1, 6), weights=RATING_WEIGHTS, k=stop - start):
+        yield {
+            'rating': rating,
+            'comment': rng.choice(pools.sentences),
+            'user_id': first_user + rng.randrange(users),
+            'show_id': first_show + rng.randrange(shows),
+        }
+
+
+ROW_BUILDERS = {
+    'venues': venue_rows,
+    'bands': band_rows,
+    'musicians': musician_rows,
+    'users': user_rows,
+    'shows': show_rows,
+    'show_bands': show_band_rows,
+    'reviews': review_rows,
+}
+
+_pools = {}
+
+
+def _get_pools(seed):
+    if seed not in _pools:
+        _pools[seed] = Pools(seed)
+    return _pools[seed]
+
+
+def build_chunk(task):
+    """Rows for one chunk; runs in the calling process or in a pool worker."""
+    table, start, stop, ids, seed = task
+    rng = random.Random(f'{seed}:{table}:{start}')
+    return list(ROW_BUILDERS[table](start, stop, ids, _get_pools(seed), rng))
+
+
+def chunk_tasks(table, count, ids, seed):
+    for start in range(0, count, CHUNK_SIZE):
+        yield table, start, min(start + CHUNK_SIZE, count), ids, seed
+
+
+def build_chunks(tasks, executor, workers):
+    """Yield built chunks in order, keeping at most 2 * workers in flight."""
+    if executor is None:
+        for task in tasks:
+            yield build_chunk(task)
+        return
+    pending = []
+    for task in tasks:
+        pending.append(executor.submit(build_chunk, task))
+        if len(pending) >= 2 * workers:
+            yield pending.pop(0).result()
+    for future in pending:
+        yield future.result()
+
+
+def next_ids(connection, counts):
+    """(first id, count) per table, continuing after the rows already there."""
+    ids = {}
+    for model in MODELS:
+        table = model.__tablename__
+        if table != 'show_bands':
+            last = connection.execute(select(func.coalesce(func.max(model.id), 0))).scalar()
+            ids[table] = (last + 1, counts[table])
+    return ids
+
+
+def reset_sequences(connection):
+    # Rows were inserted with explicit ids; move PostgreSQL's sequences past them.
+    if connection.dialect.name != 'postgresql':
+        return
+    for model in MODELS:
+        table = model.__tablename__
+        connection.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT COALESCE(MAX(id), 1) FROM {table}))"
+        ))
+
+
+def insert_rows(connection, table, chunks):
+    now = datetime.utcnow()
+    timestamps = {column: now for column in ('created_at', 'updated_at') if column in table.c}
+    total = 0
+    for rows in chunks:
+        for row in rows:
+            row.update(timestamps)
+        if rows:
+            connection.execute(table.insert(), rows)
+            total += len(rows)
+    return total
+
+
+def generate(session, counts, seed=0, workers=1, log=print):
+    """Add counts rows per table to the database behind session and commit.
+
+    New rows only reference each other, so generating into a populated
+    database adds an independent dataset. Rating aggregates, the search
+    index and the recommendation lists are rebuilt at the end, as
+    `flask ratings rebuild`, `flask search rebuild` and
+    `flask recommendations rebuild` would.
+    """
+    # Take the write lock before next_ids reads: a SQLite read transaction
+    # cannot wait to upgrade once another writer (a running app) commits.
+    connection = session.connection(execution_options={'write_lock': True})
+    ids = next_ids(connection, counts)
+    # show_bands rows are built per show.
+    sizes = dict(counts, show_bands=counts['shows'])
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    inserted = {}
+    try:
+        for model in MODELS:
+            table = model.__tablename__
+            started = timer.perf_counter()
+            chunks = build_chunks(chunk_tasks(table, sizes[table], ids, seed), executor, workers)
+            inserted[table] = insert_rows(connection, model.__table__, chunks)
+            log(f'{table}: {inserted[table]} rows in {timer.perf_counter() - started:.1f}s')
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    started = timer.perf_counter()
+    # Whatever these jobs were queued for, the rebuilds below cover it.
+    last_job = connection.execute(select(func.max(Job.id))).scalar()
+    reset_sequences(connection)
+    ratings.rebuild()
+    index = get_search_index()
+    if index is not None:
+        index.rebuild(connection)
+    session.commit()
+    log(f'rating aggregates and search index rebuilt in {timer.perf_counter() - started:.1f}s')
+
+    started = timer.perf_counter()
+    for resource in recommendations.GRAPHS:
+        recommendations.rebuild(resource)
+    log(f'recommendations rebuilt in {timer.perf_counter() - started:.1f}s')
+
+    if last_job is not None:
+        session.execute(delete(Job).where(Job.id <= last_job, Job.name.in_(REBUILT_JOBS)))
+        session.commit()
+    return inserted
+
+
+def clear(session):
+    """Delete every row of MODELS and what was derived from them. The change
+    log keeps only its newest entry, so clients holding an older token get
+    410 and resync."""
+    for model in reversed(MODELS):
+        session.execute(delete(model))
+    for model in DERIVED_MODELS:
+        session.execute(delete(model))
+    session.execute(delete(Change).where(Change.id < current_token()))
 
-from app import create_app, db
-from models import Band, Venue, Show, User, Review, ShowBand, Musician
-from datetime import datetime
 
 def create_sample_data():
-    app = create_app()
-    
-    with app.app_context():
-        # Create all tables
-        db.create_all()
-        
-        # Create sample venues
-        venue1 = Venue(name="Madison Square Garden", city="New York", address="4 Pennsylvania Plaza", capacity=20000)
-        venue2 = Venue(name="Blue Note", city="New York", address="131 W 3rd St", capacity=300)
-        venue3 = Venue(name="Warehouse District", city="Los Angeles", address="Downtown LA", capacity=1500)
-        
-        db.session.add_all([venue1, venue2, venue3])
-        db.session.commit()
-        
-        # Create sample bands
-        band1 = Band(name="Thunder Strike", genre="Rock", description="High-energy rock band", formed_year=2018)
-        band2 = Band(name="Midnight Ensemble", genre="Jazz", description="Smooth jazz collective", formed_year=2015)
-        band3 = Band(name="Neon Circuits", genre="Electronic", description="Electronic music pioneers", formed_year=2020)
-        
-        db.session.add_all([band1, band2, band3])
-        db.session.commit()
-        
-        # Create sample shows
-        show1 = Show(
-            title="Rock Legends Live",
-            date="2024-02-15",
-            time="20:00",
-            ticket_price=75.00,
-            description="An electrifying night of classic rock with legendary performances that will shake the venue to its core.",
-            venue_id=venue1.id
-        )
-        
-        show2 = Show(
-            title="Jazz Under the Stars",
-            date="2024-02-20",
-            time="19:30",
-            ticket_price=45.00,
-            description="Smooth jazz melodies under the moonlight with world-class musicians creating magical moments.",
-            venue_id=venue2.id
-        )
-        
-        show3 = Show(
-            title="Electronic Pulse",
-            date="2024-02-25",
-            time="21:00",
-            ticket_price=60.00,
-            description="Cutting-edge electronic music with mind-bending visuals and bass that you'll feel in your soul.",
-            venue_id=venue3.id
-        )
-        
-        db.session.add_all([show1, show2, show3])
-        db.session.commit()
-        
-        # Create show-band associations
-        show_band1 = ShowBand(show_id=show1.id, band_id=band1.id, set_order=1)
-        show_band2 = ShowBand(show_id=show2.id, band_id=band2.id, set_order=1)
-        show_band3 = ShowBand(show_id=show3.id, band_id=band3.id, set_order=1)
-        
-        db.session.add_all([show_band1, show_band2, show_band3])
-        db.session.commit()
-        
-        # Create sample user
-        user1 = User(username="musicfan", email="fan@music.com", first_name="Music", last_name="Fan")
-        db.session.add(user1)
-        db.session.commit()
-        
-        # Create sample reviews
-        review1 = Review(rating=5, comment="Absolutely incredible! The energy was off the charts and the sound quality was perfect.", user_id=user1.id, show_id=show1.id)
-        review2 = Review(rating=5, comment="Pure magic! The atmosphere was perfect and the musicians were world-class.", user_id=user1.id, show_id=show2.id)
-        
-        db.session.add_all([review1, review2])
-        db.session.commit()
-        
-        print("✅ Sample data created successfully!")
-        print(f"Created {len(db.session.query(Show).all())} shows")
-        print(f"Created {len(db.session.query(Band).all())} bands")
-        print(f"Created {len(db.session.query(Venue).all())} venues")
-        print(f"Created {len(db.session.query(Review).all())} reviews")
+    """The demo venues, bands, shows and reviews, in one transaction."""
+    venue1 = Venue(name="Madison Square Garden", city="New York", address="4 Pennsylvania Plaza", capacity=20000)
+    venue2 = Venue(name="Blue Note", city="New York", address="131 W 3rd St", capacity=300)
+    venue3 = Venue(name="Warehouse District", city="Los Angeles", address="Downtown LA", capacity=1500)
+
+    band1 = Band(name="Thunder Strike", genre="Rock", description="High-energy rock band", formed_year=2018)
+    band2 = Band(name="Midnight Ensemble", genre="Jazz", description="Smooth jazz collective", formed_year=2015)
+    band3 = Band(name="Neon Circuits", genre="Electronic", description="Electronic music pioneers", formed_year=2020)
+
+    user1 = User(username="musicfan", email="fan@music.com", first_name="Music", last_name="Fan")
+
+    db.session.add_all([venue1, venue2, venue3])
+    db.session.flush()
+    db.session.add_all([band1, band2, band3])
+    db.session.flush()
+
+    show1 = Show(
+        title="Rock Legends Live",
+        date=date(2024, 2, 15),
+        time=time(20, 0),
+        ticket_price=75.00,
+        description="An electrifying night of classic rock with legendary performances that will shake the venue to its core.",
+        venue_id=venue1.id
+    )
+    show2 = Show(
+        title="Jazz Under the Stars",
+        date=date(2024, 2, 20),
+        time=time(19, 30),
+        ticket_price=45.00,
+        description="Smooth jazz melodies under the moonlight with world-class musicians creating magical moments.",
+        venue_id=venue2.id
+    )
+    show3 = Show(
+        title="Electronic Pulse",
+        date=date(2024, 2, 25),
+        time=time(21, 0),
+        ticket_price=60.00,
+        description="Cutting-edge electronic music with mind-bending visuals and bass that you'll feel in your soul.",
+        venue_id=venue3.id
+    )
+    db.session.add_all([show1, show2, show3])
+    db.session.flush()
+
+    db.session.add_all([
+        ShowBand(show_id=show1.id, band_id=band1.id, set_order=1),
+        ShowBand(show_id=show2.id, band_id=band2.id, set_order=1),
+        ShowBand(show_id=show3.id, band_id=band3.id, set_order=1),
+    ])
+    db.session.add(user1)
+    db.session.flush()
+
+    db.session.add_all([
+        Review(rating=5, comment="Absolutely incredible! The energy was off the charts and the sound quality was perfect.", user_id=user1.id, show_id=show1.id),
+        Review(rating=5, comment="Pure magic! The atmosphere was perfect and the musicians were world-class.", user_id=user1.id, show_id=show2.id),
+    ])
+    db.session.flush()
+    ratings.rebuild()
+    db.session.commit()
+
+
+@seed_cli.command('sample')
+@click.option('--force', is_flag=True, help='Add the sample rows even if the database already has venues.')
+def sample_command(force):
+    """Add the demo rows (skipped when the database is not empty)."""
+    if not force and db.session.execute(select(Venue.id).limit(1)).first() is not None:
+        click.echo('Database already has data; skipping sample data.')
+        return
+    create_sample_data()
+    click.echo('✅ Sample data created successfully!')
+    for model in (Show, Band, Venue, Review):
+        click.echo(f'{model.__tablename__}: {db.session.scalar(select(func.count()).select_from(model))} rows')
+
+
+def parse_counts(values):
+    counts = {}
+    for value in values:
+        table, _, count = value.partition('=')
+        if table not in ROW_BUILDERS or table == 'show_bands' or not count.isdigit():
+            raise click.BadParameter(f'expected TABLE=N with TABLE one of venues, bands, musicians, users, shows, '
+                                     f'reviews; got {value!r}', param_hint='--rows')
+        counts[table] = int(count)
+    return counts
+
+
+@seed_cli.command('generate')
+@click.option('--scale', type=click.Choice(list(SCALES)), default='tiny', show_default=True)
+@click.option('--factor', type=float, default=1.0, show_default=True, help='Multiply every row count.')
+@click.option('--rows', 'overrides', multiple=True, metavar='TABLE=N', help='Override one table\'s row count.')
+@click.option('--seed', type=int, default=0, show_default=True, help='Same seed and counts, same data.')
+@click.option('--workers', type=int, default=1, show_default=True, help='Processes building rows.')
+@click.option('--reset', is_flag=True, help='Delete every existing row first.')
+def generate_command(scale, factor, overrides, seed, workers, reset):
+    """Generate synthetic venues, bands, musicians, users, shows and reviews."""
+    counts = dict(table_counts(scale, factor), **parse_counts(overrides))
+    if reset:
+        clear(db.session)
+    started = timer.perf_counter()
+    inserted = generate(db.session, counts, seed=seed, workers=max(workers, 1), log=click.echo)
+    click.echo(f'Inserted {sum(inserted.values())} rows in {timer.perf_counter() - started:.1f}s')
+
 
 if __name__ == '__main__':
-    create_sample_data()
\ No newline at end of file
+    from app import app, upgrade_database
+
+    with app.app_context():
+        upgrade_database()
+        create_sample_data()
+        print("✅ Sample data created successfully!")
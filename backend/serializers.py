@@ -0,0 +1,467 @@
+# backend/serializers.py
+
+from collections import defaultdict
+from datetime import date, datetime, time
+from functools import cache
+from itertools import islice
+
+from flask import abort, g, has_request_context, jsonify, make_response, request
+from sqlalchemy import Date, DateTime, Time, inspect, select
+from sqlalchemy.orm import MANYTOONE, configure_mappers, joinedload, load_only, selectinload
+
+from config import db
+from metrics import timed_serialization
+from models import Show, Review, User, Band, Venue, Musician, ShowBand
+
+# Backref attributes such as Show.venue and Review.user only exist once the
+# mappers are configured.
+configure_mappers()
+
+# Loader options per resource, mirroring exactly what each model's to_dict()
+# touches. Collections use selectinload (one extra SELECT per level, and safe
+# with yield_per streaming); many-to-ones ride along with a joinedload. A list
+# of N rows therefore costs a constant number of queries.
+LOAD_PLANS = {
+    'shows': [
+        joinedload(Show.venue),
+        selectinload(Show.show_bands).joinedload(ShowBand.band).selectinload(Band.musicians),
+        selectinload(Show.reviews).joinedload(Review.user),
+    ],
+    'bands': [
+        selectinload(Band.musicians),
+    ],
+    'venues': [],
+    'users': [],
+    'reviews': [
+        joinedload(Review.user),
+    ],
+    'musicians': [],
+}
+
+MODELS = {
+    'shows': Show,
+    'bands': Band,
+    'venues': Venue,
+    'users': User,
+    'reviews': Review,
+    'musicians': Musician,
+}
+
+
+# Shape of each model for ?fields= / ?expand=. "columns" and the relations
+# marked default reproduce to_dict() exactly; "extra_columns" and the other
+# relations are only returned when asked for explicitly.
+SCHEMAS = {
+    Show: {
+        'columns': ['id', 'title', 'date', 'time', 'ticket_price', 'description', 'created_at'],
+        'extra_columns': ['venue_id', 'rating_count', 'rating_avg'],
+        'relations': {
+            'venue': {'attr': 'venue', 'model': Venue, 'default': True},
+            'bands': {'attr': 'show_bands', 'through': 'band', 'model': Band, 'many': True, 'default': True},
+            'reviews': {'attr': 'reviews', 'model': Review, 'many': True, 'default': True},
+        },
+    },
+    Band: {
+        'columns': ['id', 'name', 'genre', 'description', 'formed_year', 'created_at'],
+        'extra_columns': ['rating_count', 'rating_avg'],
+        'relations': {
+            'musicians': {'attr': 'musicians', 'model': Musician, 'many': True, 'default': True},
+        },
+    },
+    Venue: {
+        'columns': ['id', 'name', 'city', 'address', 'capacity', 'phone', 'created_at'],
+        'extra_columns': [],
+        'relations': {
+            'shows': {'attr': 'shows', 'model': Show, 'many': True},
+        },
+    },
+    User: {
+        'columns': ['id', 'username', 'email', 'first_name', 'last_name', 'created_at'],
+        'extra_columns': [],
+        'relations': {},
+    },
+    Review: {
+        'columns': ['id', 'rating', 'comment', 'show_id', 'created_at'],
+        'extra_columns': ['user_id'],
+        'relations': {
+            'user': {'attr': 'user', 'model': User, 'default': True},
+            'show': {'attr': 'show', 'model': Show},
+        },
+    },
+    Musician: {
+        'columns': ['id', 'name', 'instrument', 'bio', 'band_id', 'created_at'],
+        'extra_columns': [],
+        'relations': {
+            'band': {'attr': 'band', 'model': Band},
+        },
+    },
+}
+
+# (parent model, collection attribute) pairs that some payload embeds, e.g.
+# (Show, 'reviews'): a Review is part of its show's payload but not its user's.
+EMBEDDED_COLLECTIONS = {
+    (model, rel['attr']) for model, schema in SCHEMAS.items() for rel in schema['relations'].values()
+}
+
+
+@cache
+def embedding_relationships(model):
+    """Many-to-one relationships from model to a parent whose payload embeds it.
+
+    Cached: bulk writes ask once per row.
+    """
+    return tuple(
+        rel for rel in inspect(model).relationships
+        if rel.direction is MANYTOONE and (rel.mapper.class_, rel.back_populates) in EMBEDDED_COLLECTIONS
+    )
+
+
+def embedding_parents(obj):
+    """Yield (parent model, parent id) for each parent, old or new, whose payload embeds obj."""
+    state = inspect(obj)
+    for rel in embedding_relationships(state.mapper):
+        for column in rel.local_columns:
+            history = state.attrs[column.key].history
+            for value in {*history.added, *history.unchanged, *history.deleted}:
+                if value is not None:
+                    yield rel.mapper.class_, value
+
+
+def embedding_parent_ids(model, values):
+    """Like embedding_parents, for a plain dict of column values."""
+    for rel in embedding_relationships(model):
+        for column in rel.local_columns:
+            if values.get(column.key) is not None:
+                yield rel.mapper.class_, values[column.key]
+
+
+def planned_query(resource):
+    model = MODELS[resource]
+    return model.query.options(*LOAD_PLANS[resource])
+
+
+# Most relations one ?fields or ?expand path may pass through, e.g. three
+# for shows.bands.musicians on a venue.
+MAX_EXPAND_DEPTH = 3
+
+
+def parse_paths(value):
+    """Turn "title,venue.name,venue.city" into {'title': {}, 'venue': {'name': {}, 'city': {}}}."""
+    paths = {}
+    for path in value.split(','):
+        path = path.strip()
+        if not path:
+            continue
+        node = paths
+        for part in path.split('.'):
+            node = node.setdefault(part, {})
+    return paths
+
+
+def check_paths(model, paths, expand=False):
+    """Raise ValueError unless every parsed ?fields (or, with expand, ?expand)
+    path names a field of model, through at most MAX_EXPAND_DEPTH relations.
+
+    Relations can lead back to where they started (venue.shows.venue...), so
+    the depth is capped to bound the queries one request can ask for.
+    """
+    table = model.__tablename__
+
+    def check(model, paths, prefix, depth):
+        schema = SCHEMAS[model]
+        selectable = schema['columns'] + schema['extra_columns']
+        for name, children in paths.items():
+            path = prefix + name
+            if name in schema['relations']:
+                if depth == MAX_EXPAND_DEPTH:
+                    raise ValueError(f"'{path}' nests more than {MAX_EXPAND_DEPTH} relations")
+                check(schema['relations'][name]['model'], children, f'{path}.', depth + 1)
+            elif expand:
+                raise ValueError(f"Cannot expand '{path}' on {table}")
+            elif name not in selectable:
+                raise ValueError(f"Unknown field '{path}' for {table}")
+            elif children:
+                raise ValueError(f"Unknown field '{path}.{next(iter(children))}' for {table}")
+
+    check(model, paths, '', 0)
+
+
+def build_tree(model, fields=None, expand=None):
+    """Resolve parsed ?fields / ?expand paths, already checked with
+    check_paths, against SCHEMAS into a selection tree.
+
+    fields=None selects every default column, otherwise only the listed ones
+    (plus id). expand=None embeds the default relations and any named in
+    fields; otherwise only the listed relations, one level per dotted segment.
+    """
+    schema = SCHEMAS[model]
+    selectable = schema['columns'] + schema['extra_columns']
+
+    if fields:
+        columns = [c for c in selectable if c == 'id' or c in fields]
+    else:
+        columns = list(schema['columns'])
+
+    relations = {}
+    for name, rel in schema['relations'].items():
+        if fields and name not in fields:
+            continue
+        if expand is not None:
+            if name not in expand:
+                continue
+        elif not rel.get('default') and not fields:
+            continue
+        relations[name] = build_tree(
+            rel['model'],
+            (fields or {}).get(name) or None,
+            None if expand is None else expand[name],
+        )
+
+    return {'model': model, 'columns': columns, 'relations': relations}
+
+
+def loader_options(tree):
+    """Loader options that fetch exactly the columns and relations in the tree."""
+    model = tree['model']
+    options = [load_only(*[getattr(model, c) for c in tree['columns']])]
+
+    for name, subtree in tree['relations'].items():
+        rel = SCHEMAS[model]['relations'][name]
+        attr = getattr(model, rel['attr'])
+        if 'through' in rel:
+            association = attr.property.mapper.class_
+            target = getattr(association, rel['through'])
+            options.append(selectinload(attr).options(
+                load_only(*[getattr(association, c.key) for c in target.property.local_columns]),
+                joinedload(target).options(*loader_options(subtree)),
+            ))
+        else:
+            strategy = selectinload if rel.get('many') else joinedload
+            options.append(strategy(attr).options(*loader_options(subtree)))
+
+    return options
+
+
+def format_value(value):
+    if isinstance(value, time):
+        return value.strftime('%H:%M')
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def row_dict(obj):
+    """obj's own columns, without the related rows or rating aggregates to_dict() adds."""
+    schema = SCHEMAS[type(obj)]
+    return {column: format_value(getattr(obj, column))
+            for column in (*schema['columns'], *schema['extra_columns']) if not column.startswith('rating_')}
+
+
+def serialize_tree(obj, tree):
+    data = {column: format_value(getattr(obj, column)) for column in tree['columns']}
+
+    for name, subtree in tree['relations'].items():
+        rel = SCHEMAS[tree['model']]['relations'][name]
+        value = getattr(obj, rel['attr'])
+        if 'through' in rel:
+            value = [getattr(item, rel['through']) for item in value]
+        if rel.get('many'):
+            data[name] = [serialize_tree(item, subtree) if item is not None else None for item in value]
+        else:
+            data[name] = serialize_tree(value, subtree) if value is not None else None
+
+    return data
+
+
+# Core-row serialization for list endpoints. A RowLoader compiles a selection
+# tree once into plain SELECTs: the root rows come from the endpoint's query
+# (filters, order and limit intact) and each relation is one IN query per
+# level, like selectinload, but rows are turned straight into dicts without
+# building ORM objects or touching the identity map.
+IN_CHUNK_SIZE = 500
+
+COLUMN_FORMATTERS = {
+    Date: date.isoformat,
+    DateTime: datetime.isoformat,
+    Time: lambda value: value.strftime('%H:%M'),
+}
+
+
+def chunks(values, size=IN_CHUNK_SIZE):
+    iterator = iter(values)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def record_loaded_rows(table, ids):
+    # What cache.record_loaded_entity does for ORM loads, so cached list
+    # responses built from rows are tagged and invalidated the same way.
+    if has_request_context() and 'cache_tags' in g:
+        g.cache_tags.update(f'{table}:{id}' for id in ids)
+
+
+class RowLoader:
+    """Loads a selection tree from Core rows into the same dicts serialize_tree builds."""
+
+    def __init__(self, tree, key_column=None):
+        model = tree['model']
+        self.table = model.__table__
+        self.keys = list(tree['columns'])
+        self.formatters = [
+            (key, COLUMN_FORMATTERS[type(self.table.c[key].type)])
+            for key in self.keys if type(self.table.c[key].type) in COLUMN_FORMATTERS
+        ]
+        # Extra columns fetched after the output ones: the foreign keys that
+        # relations join on, and the column children are grouped by.
+        fetch = list(self.keys)
+
+        def position(column):
+            if column.key not in fetch:
+                fetch.append(column.key)
+            return fetch.index(column.key)
+
+        self.id_index = position(self.table.c.id)
+        self.key_index = position(key_column) if key_column is not None else None
+
+        self.relations = []
+        for name, subtree in tree['relations'].items():
+            rel = SCHEMAS[model]['relations'][name]
+            prop = getattr(model, rel['attr']).property
+            if 'through' in rel:
+                target = getattr(prop.mapper.class_, rel['through']).property
+                association = prop.mapper.local_table
+                self.relations.append((name, 'through', RowLoader(subtree), (
+                    next(iter(prop.remote_side)), next(iter(target.local_columns)), association,
+                    prop.order_by or [association.c.id]
+                )))
+            elif prop.direction is MANYTOONE:
+                column = next(iter(prop.local_columns))
+                self.relations.append((name, 'parent', RowLoader(subtree), position(column)))
+            else:
+                column = next(iter(prop.remote_side))
+                self.relations.append((name, 'children', RowLoader(subtree, key_column=column), column))
+
+        self.columns = [self.table.c[key] for key in fetch]
+
+    def rows(self, query):
+        """Dicts for the rows of query, an ORM query over this tree's model."""
+        return self.materialize(query.with_entities(*self.columns).all())
+
+    def batches(self, query, size):
+        """Like rows(), yielded in batches of size, with relations loaded per batch."""
+        result = iter(query.with_entities(*self.columns).yield_per(size))
+        while batch := list(islice(result, size)):
+            yield self.materialize(batch)
+
+    def fetch(self, column, values):
+        rows = []
+        for chunk in chunks(values):
+            rows.extend(db.session.execute(
+                select(*self.columns).where(column.in_(chunk)).order_by(self.table.c.id)
+            ))
+        return rows
+
+    def materialize(self, rows):
+        keys, formatters = self.keys, self.formatters
+        items = []
+        for row in rows:
+            item = dict(zip(keys, row))
+            for key, formatter in formatters:
+                if item[key] is not None:
+                    item[key] = formatter(item[key])
+            items.append(item)
+        record_loaded_rows(self.table.name, [row[self.id_index] for row in rows])
+
+        for name, kind, loader, link in self.relations:
+            if kind == 'parent':
+                ids = {row[link] for row in rows} - {None}
+                children = loader.by_id(loader.fetch(loader.table.c.id, ids))
+                for item, row in zip(items, rows):
+                    item[name] = children.get(row[link])
+            elif kind == 'children':
+                grouped = defaultdict(list)
+                child_rows = loader.fetch(link, [row[self.id_index] for row in rows])
+                for child_row, child in zip(child_rows, loader.materialize(child_rows)):
+                    grouped[child_row[loader.key_index]].append(child)
+                for item, row in zip(items, rows):
+                    item[name] = grouped.get(row[self.id_index], [])
+            else:
+                parent_column, target_column, association, order_by = link
+                links = []
+                for chunk in chunks([row[self.id_index] for row in rows]):
+                    links.extend(db.session.execute(
+                        select(parent_column, target_column, association.c.id)
+                        .where(parent_column.in_(chunk))
+                        .order_by(*order_by)
+                    ))
+                record_loaded_rows(association.name, [link_id for _, _, link_id in links])
+                children = loader.by_id(loader.fetch(loader.table.c.id, {target for _, target, _ in links} - {None}))
+                grouped = defaultdict(list)
+                for parent_id, target_id, _ in links:
+                    grouped[parent_id].append(children.get(target_id))
+                for item, row in zip(items, rows):
+                    item[name] = grouped.get(row[self.id_index], [])
+
+        return items
+
+    def by_id(self, rows):
+        return {row[self.id_index]: item for row, item in zip(rows, self.materialize(rows))}
+
+
+class Serializer:
+    """A resource's serializer for one selection tree.
+
+    Calling it serializes an ORM object (detail views); rows() and batches()
+    serialize a whole list query through its RowLoader.
+    """
+
+    def __init__(self, tree, to_dict=False):
+        self.tree = tree
+        self.loader = RowLoader(tree)
+        self.to_dict = to_dict
+
+    def __call__(self, obj):
+        with timed_serialization():
+            return obj.to_dict() if self.to_dict else serialize_tree(obj, self.tree)
+
+    def rows(self, query):
+        with timed_serialization():
+            return self.loader.rows(query)
+
+    def batches(self, query, size):
+        batches = self.loader.batches(query, size)
+        while True:
+            with timed_serialization():
+                batch = next(batches, None)
+            if batch is None:
+                return
+            yield batch
+
+
+# Compiled once: the default tree of each resource, which reproduces to_dict().
+DEFAULT_SERIALIZERS = {
+    resource: Serializer(build_tree(model), to_dict=True) for resource, model in MODELS.items()
+}
+
+
+def resource_query(resource):
+    """Return (query, serializer) for a GET endpoint, honouring ?fields= and ?expand=.
+
+    Without either parameter this is the load plan plus to_dict(); otherwise
+    the query loads only what the selection tree needs. List endpoints hand
+    the query to the serializer, which loads it as Core rows instead.
+    """
+    if 'fields' not in request.args and 'expand' not in request.args:
+        return planned_query(resource), DEFAULT_SERIALIZERS[resource]
+
+    model = MODELS[resource]
+    fields = parse_paths(request.args['fields']) if 'fields' in request.args else None
+    expand = parse_paths(request.args['expand']) if 'expand' in request.args else None
+    try:
+        check_paths(model, fields or {})
+        check_paths(model, expand or {}, expand=True)
+        tree = build_tree(model, fields, expand)
+    except ValueError as e:
+        abort(make_response(jsonify({'error': str(e)}), 400))
+
+    return model.query.options(*loader_options(tree)), Serializer(tree)
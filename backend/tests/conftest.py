@@ -0,0 +1,27 @@
+# backend/tests/conftest.py
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Read when app is imported: a throwaway database, no response cache (a hit
+# would skip the queries under test), no background workers or write limits.
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db')
+os.environ['CACHE_ENABLED'] = '0'
+os.environ['JOB_WORKERS'] = '0'
+os.environ['RATE_LIMIT_ENABLED'] = '0'
+os.environ['ADMISSION_ENABLED'] = '0'
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app, upgrade_database
+
+    with app.app_context():
+        upgrade_database()
+    return app
@@ -0,0 +1,65 @@
+# backend/tests/test_batch.py
+
+from sqlalchemy import event
+
+from batch import CHUNK_SIZE
+from config import db
+from seed import clear
+
+
+def band(i):
+    return {'name': f'Band {i}', 'genre': 'Rock', 'description': 'A band made up for the tests', 'formed_year': 2001}
+
+
+def test_create_is_one_insert_per_chunk(app):
+    with app.app_context():
+        clear(db.session)
+        db.session.commit()
+        engine = db.engine
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT INTO bands'):
+            statements.append(statement)
+
+    items = [band(i) for i in range(CHUNK_SIZE + 1)]
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        response = app.test_client().post('/api/bands/batch', json=items)
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+
+    assert response.json['succeeded'] == len(items)
+    assert len(statements) == 2
+    # Ids come back in item order, and name the rows the items created.
+    ids = [result['id'] for result in response.json['results']]
+    assert ids == sorted(ids)
+    client = app.test_client()
+    assert client.get(f'/api/bands/{ids[7]}').json['name'] == 'Band 7'
+    assert client.get(f'/api/bands/{ids[-1]}').json['name'] == f'Band {CHUNK_SIZE}'
+
+
+def test_conflicts_fail_alone(app):
+    with app.app_context():
+        clear(db.session)
+        db.session.commit()
+    client = app.test_client()
+    client.post('/api/users/', json={'username': 'taken', 'email': 'taken@example.com'})
+
+    response = client.post('/api/users/batch', json=[
+        {'username': 'a', 'email': 'a@example.com'},
+        {'username': 'b', 'email': 'b@example.com'},
+        {'username': 'a', 'email': 'c@example.com'},
+        {'username': 'taken'},
+        {'username': 'd', 'email': 'taken@example.com'},
+        {'email': 'nameless@example.com'},
+    ])
+    statuses = [result['status'] for result in response.json['results']]
+    assert statuses == [201, 201, 409, 409, 409, 400]
+
+    b = response.json['results'][1]['id']
+    response = client.patch('/api/users/batch', json=[
+        {'id': b, 'username': 'a'},
+        {'id': b, 'email': 'b@example.com', 'first_name': 'Bea'},
+    ])
+    assert [result['status'] for result in response.json['results']] == [409, 200]
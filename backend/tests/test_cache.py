@@ -0,0 +1,91 @@
+# backend/tests/test_cache.py
+"""Cached responses must never outlive the data they were built from: every
+write, whether single, batch or a job's Core UPDATE, invalidates them."""
+
+import pytest
+from sqlalchemy import select
+
+import jobs
+from cache import create_cache
+from config import db
+from models import Band, Show, ShowBand, User
+from seed import clear, generate, table_counts
+
+
+@pytest.fixture
+def client(app, monkeypatch):
+    # The suite runs with CACHE_ENABLED=0; turn it on for these tests only.
+    monkeypatch.setitem(app.extensions, 'response_cache', create_cache(None, ttl=300))
+    with app.app_context():
+        clear(db.session)
+        db.session.commit()
+        generate(db.session, table_counts('tiny', 0.01), seed=5, log=lambda message: None)
+    return app.test_client()
+
+
+def cached_get(client, url):
+    """GET url twice and return the second, cached, payload."""
+    client.get(url)
+    response = client.get(url)
+    assert response.headers['X-Cache'] == 'HIT', url
+    return response.json
+
+
+def fresh_get(client, url):
+    response = client.get(url)
+    assert response.headers['X-Cache'] == 'MISS', url
+    return response.json
+
+
+def first_id(app, query):
+    with app.app_context():
+        return db.session.execute(query).scalar()
+
+
+def test_single_write_invalidates(app, client):
+    show = first_id(app, select(Show.id).order_by(Show.id))
+    urls = [f'/api/shows/{show}', f'/api/shows/{show}?fields=title', '/api/shows/?fields=title&limit=5']
+    for url in urls:
+        cached_get(client, url)
+
+    assert client.patch(f'/api/shows/{show}', json={'title': 'Renamed Show'}).status_code == 200
+
+    assert fresh_get(client, urls[0])['title'] == 'Renamed Show'
+    assert fresh_get(client, urls[1])['title'] == 'Renamed Show'
+    assert fresh_get(client, urls[2])['items'][0]['title'] == 'Renamed Show'
+
+
+def test_batch_write_invalidates(app, client):
+    band = first_id(app, select(Band.id).order_by(Band.id))
+    urls = [f'/api/bands/{band}?fields=name', '/api/bands/?fields=name&limit=5']
+    for url in urls:
+        cached_get(client, url)
+
+    response = client.patch('/api/bands/batch', json=[{'id': band, 'name': 'Renamed Band'}])
+    assert response.json['succeeded'] == 1
+
+    assert fresh_get(client, urls[0])['name'] == 'Renamed Band'
+    assert fresh_get(client, urls[1])['items'][0]['name'] == 'Renamed Band'
+
+
+def test_rating_refresh_invalidates(app, client):
+    with app.app_context():
+        show, band = db.session.execute(select(ShowBand.show_id, ShowBand.band_id).order_by(ShowBand.id)).first()
+        user = db.session.execute(select(User.id).order_by(User.id)).scalar()
+        jobs.run_pending()
+    urls = [f'/api/shows/{show}?fields=rating_count', f'/api/bands/{band}?fields=rating_count',
+            '/api/shows/?fields=rating_count&limit=100']
+    before = [cached_get(client, url) for url in urls]
+    response = client.post('/api/reviews/', json={'rating': 4, 'comment': 'Worth the ticket', 'user_id': user,
+                                                  'show_id': show})
+    assert response.status_code == 201, response.json
+    # Cached again before the ratings.refresh job runs, with the old totals.
+    assert [cached_get(client, url) for url in urls] == before
+    with app.app_context():
+        jobs.run_pending()
+
+    after = [fresh_get(client, url) for url in urls]
+    assert after[0]['rating_count'] == before[0]['rating_count'] + 1
+    assert after[1]['rating_count'] == before[1]['rating_count'] + 1
+    listed = [{item['id']: item['rating_count'] for item in payload['items']}[show] for payload in (before[2], after[2])]
+    assert listed[1] == listed[0] + 1
@@ -0,0 +1,115 @@
+# backend/tests/test_query_counts.py
+"""The number of SQL statements a GET runs must not grow with the data it
+returns: each endpoint is requested against N and 2N shows, each with N
+bands, N reviews and their users, and the statement counts must match."""
+
+from datetime import date, time
+
+import pytest
+from sqlalchemy import event
+
+import jobs
+from config import db
+from models import Band, Musician, Review, Show, ShowBand, User, Venue
+from seed import clear
+
+SIZES = (3, 6)
+
+# Statements per request, counting the BEGIN of its transaction. A change
+# here is deliberate: update the number along with the load plan.
+ENDPOINTS = {
+    '/api/shows/': 8,
+    '/api/shows/?fields=title,rating_avg,venue.name,bands.name,reviews.rating': 6,
+    '/api/shows/upcoming?from=2000-01-01': 8,
+    '/api/shows/top': 2,
+    '/api/shows/{show}': 3,
+    '/api/shows/{show}?expand=reviews.show': 4,
+    '/api/shows/{show}/recommended': 6,
+    '/api/bands/': 3,
+    '/api/bands/top': 2,
+    '/api/bands/{band}': 4,
+    '/api/bands/{band}/similar': 4,
+    '/api/venues/': 2,
+    '/api/venues/?expand=shows': 3,
+    '/api/venues/{venue}': 3,
+    '/api/venues/{venue}?expand=shows': 4,
+    '/api/users/': 2,
+    '/api/users/{user}': 3,
+    '/api/reviews/': 3,
+    '/api/reviews/?expand=show': 3,
+    '/api/reviews/{review}': 3,
+    '/api/musicians/': 2,
+    '/api/musicians/?expand=band': 3,
+    '/api/musicians/{musician}': 3,
+}
+
+
+def seed(n):
+    """n shows at one venue, each with all n bands (two musicians each) on
+    the bill and a 5-star review from each of n users."""
+    clear(db.session)
+    venue = Venue(name='Test Hall', city='Testville', address='1 Test St', capacity=500)
+    bands = [Band(name=f'Band {i}', genre='rock', musicians=[Musician(name=f'Player {i}.{j}') for j in range(2)])
+             for i in range(n)]
+    users = [User(username=f'user{i}', email=f'user{i}@example.com') for i in range(n)]
+    shows = [Show(title=f'Show {i}', date=date(2099, 1, 1 + i), time=time(20), venue=venue) for i in range(n)]
+    db.session.add_all([venue, *bands, *users, *shows])
+    db.session.flush()
+    for show in shows:
+        db.session.add_all(ShowBand(show_id=show.id, band_id=band.id, set_order=order)
+                           for order, band in enumerate(bands, 1))
+        db.session.add_all(Review(show_id=show.id, user_id=user.id, rating=5, comment='Great night out')
+                           for user in users)
+    db.session.commit()
+    # Rating aggregates, show documents and recommendation lists.
+    jobs.run_pending()
+    return {
+        'show': shows[0].id, 'band': bands[0].id, 'venue': venue.id, 'user': users[0].id,
+        'review': db.session.query(Review.id).filter_by(show_id=shows[0].id).limit(1).scalar(),
+        'musician': bands[0].musicians[0].id,
+    }
+
+
+def count_queries(app, ids):
+    """{endpoint: statements executed} for every endpoint, after a warm-up pass."""
+    client = app.test_client()
+    with app.app_context():
+        engine = db.engine
+    counts = {}
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    for endpoint in ENDPOINTS:
+        url = endpoint.format(**ids)
+        assert client.get(url).status_code == 200, url
+        event.listen(engine, 'before_cursor_execute', count)
+        try:
+            statements.clear()
+            response = client.get(url)
+        finally:
+            event.remove(engine, 'before_cursor_execute', count)
+        assert response.status_code == 200, url
+        counts[endpoint] = len(statements)
+    return counts
+
+
+@pytest.fixture(scope='module')
+def query_counts(app):
+    counts = {}
+    for n in SIZES:
+        with app.app_context():
+            ids = seed(n)
+        counts[n] = count_queries(app, ids)
+    return counts
+
+
+@pytest.mark.parametrize('endpoint', ENDPOINTS)
+def test_query_count(query_counts, endpoint):
+    assert query_counts[SIZES[0]][endpoint] == ENDPOINTS[endpoint]
+
+
+@pytest.mark.parametrize('endpoint', ENDPOINTS)
+def test_query_count_does_not_grow_with_data(query_counts, endpoint):
+    assert query_counts[SIZES[0]][endpoint] == query_counts[SIZES[1]][endpoint]
@@ -0,0 +1,83 @@
+# backend/tests/test_recommendations.py
+"""Incremental refreshes must leave exactly the lists a full rebuild builds."""
+
+import pytest
+from sqlalchemy import select
+
+import jobs
+import recommendations
+from config import db
+from models import BandNeighbor, Review, ShowBand, ShowNeighbor, User
+from seed import clear, generate, table_counts
+
+
+def stored_lists():
+    return (
+        set(db.session.execute(select(BandNeighbor.band_id, BandNeighbor.rank, BandNeighbor.neighbor_id,
+                                      BandNeighbor.score, BandNeighbor.shared))),
+        set(db.session.execute(select(ShowNeighbor.show_id, ShowNeighbor.rank, ShowNeighbor.neighbor_id,
+                                      ShowNeighbor.score, ShowNeighbor.shared))),
+    )
+
+
+def likes(limit):
+    return db.session.execute(
+        select(Review.id, Review.show_id, Review.user_id).where(Review.rating >= recommendations.LIKE_RATING)
+        .order_by(Review.id).limit(limit)
+    ).all()
+
+
+@pytest.fixture
+def graph(app, monkeypatch):
+    # Always take the incremental path; past REBUILD_SHARE the job rebuilds,
+    # which would match trivially.
+    monkeypatch.setattr(recommendations, 'REBUILD_SHARE', 1.0)
+    with app.app_context():
+        clear(db.session)
+        db.session.commit()
+        generate(db.session, table_counts('tiny', 0.04), seed=3, log=lambda message: None)
+    return app
+
+
+def test_refresh_matches_rebuild(graph):
+    app = graph
+    client = app.test_client()
+    with app.app_context():
+        like = likes(6)
+        user = db.session.execute(select(User.id).join(Review).where(Review.rating >= 4).order_by(User.id.desc())).scalar()
+        bill = db.session.execute(select(ShowBand.id, ShowBand.band_id).order_by(ShowBand.id)).first()
+        dislike = db.session.execute(select(Review.id).where(Review.rating < 4).order_by(Review.id)).scalar()
+
+    def new_bill():
+        db.session.add(ShowBand(show_id=like[5].show_id, band_id=bill.band_id, set_order=99))
+        db.session.commit()
+
+    def remove_bill():
+        db.session.delete(db.session.get(ShowBand, bill.id))
+        db.session.commit()
+
+    writes = [
+        ('like', lambda: client.post('/api/reviews/', json={
+            'rating': 5, 'comment': 'Loved it, again', 'user_id': like[0].user_id, 'show_id': like[1].show_id})),
+        ('unlike', lambda: client.delete(f'/api/reviews/{like[2].id}')),
+        ('downgrade', lambda: client.patch(f'/api/reviews/{like[3].id}', json={'rating': 2})),
+        ('upgrade', lambda: client.patch(f'/api/reviews/{dislike}', json={'rating': 5})),
+        ('move', lambda: client.patch(f'/api/reviews/{like[4].id}', json={'show_id': like[0].show_id})),
+        ('batch create', lambda: client.post('/api/reviews/batch', json=[
+            {'rating': 4, 'comment': 'Loved it, again', 'user_id': like[1].user_id, 'show_id': like[0].show_id}])),
+        ('batch downgrade', lambda: client.patch('/api/reviews/batch', json=[{'id': like[1].id, 'rating': 1}])),
+        ('bill added', lambda: new_bill()),
+        ('bill removed', lambda: remove_bill()),
+        ('user deleted', lambda: client.delete(f'/api/users/{user}')),
+        ('show deleted', lambda: client.delete(f'/api/shows/{like[5].show_id}')),
+        ('band deleted', lambda: client.delete(f'/api/bands/{bill.band_id}')),
+    ]
+    for name, write in writes:
+        with app.app_context():
+            response = write()
+            assert response is None or response.status_code < 400, (name, response.json)
+            jobs.run_pending()
+            refreshed = stored_lists()
+            for resource in recommendations.GRAPHS:
+                recommendations.rebuild(resource)
+            assert refreshed == stored_lists(), name
@@ -0,0 +1,10 @@
+# backend/tests/test_upcoming.py
+
+import pytest
+
+
+@pytest.mark.parametrize('query', ['venue_id=abc', 'band_id=1.5', 'from=tomorrow', 'limit=0'])
+def test_bad_filters_are_rejected(app, query):
+    response = app.test_client().get(f'/api/shows/upcoming?{query}')
+    assert response.status_code == 400
+    assert 'error' in response.json
@@ -0,0 +1,118 @@
+# backend/validation.py
+
+from datetime import date, time
+
+# Each *_values function turns a request payload into column values for the
+# model, raising ValueError with a client-facing message when it is invalid.
+# The single-row create/update routes and the batch endpoints share them.
+
+
+def parse_show_schedule(data):
+    # Shows store typed DATE/TIME columns; the API speaks "YYYY-MM-DD" and "HH:MM".
+    data = dict(data)
+    try:
+        if data.get('date'):
+            data['date'] = date.fromisoformat(data['date'])
+        if data.get('time'):
+            data['time'] = time.fromisoformat(data['time'])
+    except (TypeError, ValueError):
+        raise ValueError('date must be YYYY-MM-DD and time HH:MM')
+    return data
+
+
+def pick(data, fields):
+    if not isinstance(data, dict):
+        raise ValueError('No data provided')
+    return {field: data.get(field) for field in fields}
+
+
+def show_values(data):
+    return parse_show_schedule(pick(data, ['title', 'date', 'time', 'ticket_price', 'description', 'venue_id']))
+
+
+def band_values(data):
+    if not data or not isinstance(data, dict):
+        raise ValueError('No data provided')
+
+    if not data.get('name') or len(str(data.get('name')).strip()) < 2:
+        raise ValueError('Band name must be at least 2 characters')
+
+    if not data.get('genre'):
+        raise ValueError('Genre is required')
+
+    if not data.get('description') or len(str(data.get('description')).strip()) < 10:
+        raise ValueError('Description must be at least 10 characters')
+
+    formed_year = data.get('formed_year')
+    try:
+        if not formed_year or int(formed_year) < 1900:
+            raise ValueError
+    except (TypeError, ValueError):
+        raise ValueError('Formation year must be a valid year after 1900')
+
+    return {
+        'name': str(data.get('name')).strip(),
+        'genre': str(data.get('genre')).strip(),
+        'description': str(data.get('description')).strip(),
+        'formed_year': int(formed_year)
+    }
+
+
+def venue_values(data):
+    return pick(data, ['name', 'city', 'address', 'capacity', 'phone'])
+
+
+def user_values(data):
+    return pick(data, ['username', 'email', 'first_name', 'last_name'])
+
+
+def is_rating(value):
+    return isinstance(value, int) and not isinstance(value, bool) and 1 <= value <= 5
+
+
+def review_values(data):
+    if not data or not isinstance(data, dict):
+        raise ValueError('No data provided')
+
+    if not is_rating(data.get('rating')):
+        raise ValueError('Rating must be an integer between 1 and 5')
+
+    if not isinstance(data.get('comment'), str) or len(data.get('comment').strip()) < 10:
+        raise ValueError('Comment must be at least 10 characters')
+
+    if not data.get('user_id') or not isinstance(data.get('user_id'), int):
+        raise ValueError('Valid user_id is required')
+
+    if not data.get('show_id') or not isinstance(data.get('show_id'), int):
+        raise ValueError('Valid show_id is required')
+
+    return pick(data, ['rating', 'comment', 'user_id', 'show_id'])
+
+
+def review_update_values(data):
+    if 'rating' in data and not is_rating(data['rating']):
+        raise ValueError('Rating must be an integer between 1 and 5')
+
+    if 'comment' in data and (not isinstance(data['comment'], str) or len(data['comment'].strip()) < 10):
+        raise ValueError('Comment must be at least 10 characters')
+
+    return data
+
+
+def musician_values(data):
+    return pick(data, ['name', 'instrument', 'bio', 'band_id'])
+
+
+CREATE_VALUES = {
+    'shows': show_values,
+    'bands': band_values,
+    'venues': venue_values,
+    'users': user_values,
+    'reviews': review_values,
+    'musicians': musician_values,
+}
+
+UPDATE_VALUES = {
+    'shows': parse_show_schedule,
+    'reviews': review_update_values,
+}
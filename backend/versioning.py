@@ -0,0 +1,127 @@
+# backend/versioning.py
+
+import hashlib
+from collections import defaultdict
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import Response, g, make_response, request
+from sqlalchemy import event, func, select, update
+
+from config import db
+from models import Show, Review, User, Band, Venue, Musician, ShowBand
+from serializers import embedding_parents
+
+
+def _max_updated(model, *where):
+    return select(func.max(model.updated_at)).where(*where).scalar_subquery()
+
+
+def show_version(show_id):
+    band_ids = select(ShowBand.band_id).where(ShowBand.show_id == show_id)
+    user_ids = select(Review.user_id).where(Review.show_id == show_id)
+    venue_id = select(Show.venue_id).where(Show.id == show_id).scalar_subquery()
+    return select(
+        _max_updated(Show, Show.id == show_id),
+        _max_updated(Venue, Venue.id == venue_id),
+        _max_updated(Band, Band.id.in_(band_ids)),
+        _max_updated(Musician, Musician.band_id.in_(band_ids)),
+        _max_updated(Review, Review.show_id == show_id),
+        _max_updated(User, User.id.in_(user_ids)),
+    )
+
+
+def band_version(band_id):
+    return select(
+        _max_updated(Band, Band.id == band_id),
+        _max_updated(Musician, Musician.band_id == band_id),
+    )
+
+
+def review_version(review_id):
+    user_id = select(Review.user_id).where(Review.id == review_id).scalar_subquery()
+    return select(
+        _max_updated(Review, Review.id == review_id),
+        _max_updated(User, User.id == user_id),
+    )
+
+
+def entity_version(model):
+    def version(entity_id):
+        return select(_max_updated(model, model.id == entity_id))
+    return version
+
+
+# One aggregate SELECT per resource covering every row its detail payload
+# embeds. The first column is the entity itself and is NULL when it does not
+# exist. Deleted children are covered by touch_embedding_parents below.
+VERSION_QUERIES = {
+    'shows': show_version,
+    'bands': band_version,
+    'venues': entity_version(Venue),
+    'users': entity_version(User),
+    'reviews': review_version,
+    'musicians': entity_version(Musician),
+}
+
+
+def last_modified(resource, entity_id):
+    row = db.session.execute(VERSION_QUERIES[resource](entity_id)).one()
+    if row[0] is None:
+        return None
+    return max(value for value in row if value is not None).replace(tzinfo=timezone.utc)
+
+
+def conditional(resource):
+    """Answer If-None-Match / If-Modified-Since on a detail view with a 304.
+
+    The ETag hashes the request path and query (so ?fields= variants differ)
+    with the newest updated_at in the payload; a match never reaches the view,
+    which otherwise finds that timestamp in g.last_modified.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            modified = last_modified(resource, next(iter(kwargs.values())))
+            if modified is None:
+                return view(**kwargs)
+            g.last_modified = modified
+
+            etag = hashlib.sha1(f'{request.full_path}|{modified.isoformat()}'.encode()).hexdigest()
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            else:
+                since = request.if_modified_since
+                not_modified = since is not None and modified.replace(microsecond=0) <= since
+
+            if not_modified:
+                response = Response(status=304)
+            else:
+                response = make_response(view(**kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.last_modified = modified
+            return response
+        return wrapper
+    return decorator
+
+
+@event.listens_for(db.session, 'after_flush')
+def touch_embedding_parents(session, flush_context):
+    """Bump updated_at on parents that lost or gained an embedded child, so
+    deletes and moves show up in the parent's MAX(updated_at)."""
+    touched = defaultdict(set)
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        for parent, parent_id in embedding_parents(obj):
+            touched[parent].add(parent_id)
+    touch(session, touched)
+
+
+def touch(session, touched):
+    """Set updated_at to now on the rows in touched ({model: ids})."""
+    now = datetime.utcnow()
+    connection = session.connection()
+    for model, ids in touched.items():
+        if ids:
+            connection.execute(update(model.__table__).where(model.__table__.c.id.in_(ids)).values(updated_at=now))
@@ -0,0 +1,16 @@
+"""Benchmark and load-test suite for the Music Band API.
+
+Run ``python -m benchmarks --help`` from the repository root. The backend's
+modules use flat imports (``from config import db``), so backend/ is put on
+sys.path here; the app itself is only imported once DATABASE_URL points at
+the benchmark database (see runner.load_app).
+"""
+
+import os
+import sys
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(os.path.dirname(BENCHMARKS_DIR), 'backend')
+
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
@@ -0,0 +1,137 @@
+"""Command line entry point: python -m benchmarks {generate,run,startup,compare}."""
+
+import json
+import os
+import sys
+
+import click
+
+import seed as seeding
+
+from benchmarks import report, runner
+
+DEFAULT_DATABASE = os.path.join(report.RESULTS_DIR, 'bench-{scale}.db')
+
+
+def database_path(database, scale):
+    return os.path.abspath(database or DEFAULT_DATABASE.format(scale=scale))
+
+
+def counts_path(path):
+    return path + '.counts.json'
+
+
+@click.group()
+def cli():
+    """Benchmark and load-test the Music Band API."""
+
+
+@cli.command()
+@click.option('--scale', type=click.Choice(list(seeding.SCALES)), default='tiny', show_default=True)
+@click.option('--factor', type=float, default=1.0, show_default=True, help='Multiply every row count.')
+@click.option('--seed', type=int, default=0, show_default=True)
+@click.option('--workers', type=int, default=1, show_default=True, help='Processes building rows.')
+@click.option('--database', help='SQLite file to create (default: benchmarks/results/bench-<scale>.db).')
+def generate(scale, factor, seed, workers, database):
+    """Create a fresh benchmark database."""
+    path = database_path(database, scale)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    app = runner.load_app(f'sqlite:///{path}')
+    counts = seeding.table_counts(scale, factor)
+    from config import db
+    with app.app_context():
+        seeding.generate(db.session, counts, seed=seed, workers=workers, log=click.echo)
+    with open(counts_path(path), 'w') as output:
+        json.dump({'scale': scale, 'factor': factor, 'seed': seed, 'counts': counts}, output, indent=2)
+    click.echo(f'Wrote {path}')
+
+
+@cli.command()
+@click.option('--scale', type=click.Choice(list(seeding.SCALES)), default='tiny', show_default=True)
+@click.option('--database', help='Database made by `generate` (default: benchmarks/results/bench-<scale>.db).')
+@click.option('--mode', type=click.Choice(['client', 'gunicorn']), default='client', show_default=True)
+@click.option('--requests', 'requests_per_endpoint', type=int, default=100, show_default=True,
+              help='Timed requests per endpoint.')
+@click.option('--concurrency', type=int, default=8, show_default=True, help='Client threads (gunicorn mode).')
+@click.option('--workers', type=int, default=2, show_default=True, help='Gunicorn workers.')
+@click.option('--threads', type=int, default=4, show_default=True, help='Threads per gunicorn worker.')
+@click.option('--worker-class', default='gthread', show_default=True)
+@click.option('--cache/--no-cache', default=False, show_default=True, help='Enable the response cache.')
+@click.option('--accept-encoding', help='Accept-Encoding header to send, e.g. "gzip" (default: none).')
+@click.option('--endpoint', 'selected', multiple=True, help='Only run these endpoints (repeatable).')
+@click.option('--seed', type=int, default=0, show_default=True)
+@click.option('--output', help='Result file (default: benchmarks/results/<commit>-<mode>-<scale>.json).')
+def run(scale, database, mode, requests_per_endpoint, concurrency, workers, threads, worker_class, cache,
+        accept_encoding, selected, seed, output):
+    """Run the workload and save the results as JSON.
+
+    The workload writes to the database; regenerate it to compare runs on
+    identical data.
+    """
+    path = database_path(database, scale)
+    if not os.path.exists(counts_path(path)):
+        raise click.ClickException(f'No benchmark database at {path}; run `python -m benchmarks generate` first.')
+    with open(counts_path(path)) as source:
+        counts = json.load(source)['counts']
+    url = f'sqlite:///{path}'
+
+    settings = dict(mode=mode, scale=scale, requests_per_endpoint=requests_per_endpoint, cache=cache,
+                    accept_encoding=accept_encoding, seed=seed, counts=counts)
+    if mode == 'client':
+        results = runner.run_in_process(runner.load_app(url, cache), counts, requests_per_endpoint, seed, selected,
+                                        accept_encoding, log=click.echo)
+    else:
+        settings.update(concurrency=concurrency, workers=workers, threads=threads, worker_class=worker_class)
+        server = runner.Gunicorn(url, workers, threads, worker_class, cache, accept_encoding)
+        try:
+            server.wait_ready()
+            results = runner.run_gunicorn(server, counts, requests_per_endpoint, concurrency, seed, selected,
+                                          log=click.echo)
+        finally:
+            server.stop()
+
+    click.echo(f'Saved {report.save(results, report.run_metadata(**settings), output)}')
+
+
+@cli.command()
+@click.option('--scale', type=click.Choice(list(seeding.SCALES)), default='tiny', show_default=True)
+@click.option('--database', help='Database made by `generate` (default: benchmarks/results/bench-<scale>.db).')
+@click.option('--workers', type=int, default=2, show_default=True, help='Gunicorn workers.')
+@click.option('--threads', type=int, default=4, show_default=True, help='Threads per gunicorn worker.')
+@click.option('--recycles', type=int, default=5, show_default=True, help='Times to kill and replace the workers.')
+@click.option('--output', help='Result file (default: benchmarks/results/<commit>-startup-<scale>.json).')
+def startup(scale, database, workers, threads, recycles, output):
+    """Measure gunicorn cold start, worker recycle time and worker memory,
+    with and without preload_app."""
+    path = database_path(database, scale)
+    if not os.path.exists(counts_path(path)):
+        raise click.ClickException(f'No benchmark database at {path}; run `python -m benchmarks generate` first.')
+    url = f'sqlite:///{path}'
+    results = {
+        'preload': runner.measure_startup(url, workers, threads, True, recycles, log=click.echo),
+        'no_preload': runner.measure_startup(url, workers, threads, False, recycles, log=click.echo),
+    }
+    meta = report.run_metadata(mode='startup', scale=scale, workers=workers, threads=threads, recycles=recycles)
+    click.echo(f'Saved {report.save(results, meta, output)}')
+
+
+@cli.command()
+@click.argument('baseline', type=click.Path(exists=True))
+@click.argument('current', type=click.Path(exists=True))
+@click.option('--threshold', type=float, default=0.10, show_default=True,
+              help='Relative change that counts as a regression.')
+@click.option('--regressions-only', is_flag=True)
+def compare(baseline, current, threshold, regressions_only):
+    """Diff two result files; exits with status 1 if anything regressed."""
+    rows = report.compare(report.load(baseline), report.load(current), threshold)
+    click.echo(report.format_comparison(rows, regressions_only))
+    if any(regressed for *_, regressed in rows):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    cli()
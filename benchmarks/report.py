@@ -0,0 +1,91 @@
+"""Saving runs as JSON baselines and diffing two of them."""
+
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+from benchmarks import BENCHMARKS_DIR
+
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, 'results')
+
+# (metric, True when higher is better)
+COMPARED_METRICS = [
+    ('p50_ms', False),
+    ('p95_ms', False),
+    ('p99_ms', False),
+    ('throughput_rps', True),
+    ('sql_queries', False),
+    ('response_bytes', False),
+    ('cpu_ms', False),
+    ('peak_rss_mb', False),
+    ('cold_start_ms', False),
+    ('recycle_ms', False),
+    ('worker_private_mb', False),
+]
+
+
+def git_revision():
+    def git(*args):
+        return subprocess.run(['git', *args], cwd=BENCHMARKS_DIR, capture_output=True, text=True).stdout.strip()
+    commit = git('rev-parse', '--short', 'HEAD') or 'unknown'
+    return commit + ('-dirty' if git('status', '--porcelain', '--untracked-files=no') else '')
+
+
+def run_metadata(**settings):
+    return {
+        'commit': git_revision(),
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        **settings,
+    }
+
+
+def save(results, meta, path=None):
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{meta['commit']}-{meta['mode']}-{meta['scale']}.json")
+    with open(path, 'w') as output:
+        json.dump({'meta': meta, 'endpoints': results}, output, indent=2, sort_keys=True)
+        output.write('\n')
+    return path
+
+
+def load(path):
+    with open(path) as source:
+        return json.load(source)
+
+
+def compare(baseline, current, threshold=0.10):
+    """Rows of (endpoint, metric, before, after, relative change, regressed).
+
+    A metric regresses when it moves the wrong way by more than threshold
+    (a fraction); SQL query counts regress on any increase.
+    """
+    rows = []
+    for name, after in current['endpoints'].items():
+        before = baseline['endpoints'].get(name)
+        if before is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS:
+            old, new = before.get(metric), after.get(metric)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else 0.0
+            worse = -change if higher_is_better else change
+            limit = 0.0 if metric == 'sql_queries' else threshold
+            rows.append((name, metric, old, new, change, worse > limit))
+    return rows
+
+
+def format_comparison(rows, only_regressions=False):
+    lines = [f"{'endpoint':28} {'metric':15} {'baseline':>10} {'current':>10} {'change':>8}"]
+    for name, metric, old, new, change, regressed in rows:
+        if only_regressions and not regressed:
+            continue
+        flag = '  REGRESSION' if regressed else ''
+        lines.append(f'{name:28} {metric:15} {old:10g} {new:10g} {change:+8.1%}{flag}')
+    return '\n'.join(lines)
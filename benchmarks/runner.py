@@ -0,0 +1,360 @@
+"""Runs the workload in-process (Flask test client) or against gunicorn.
+
+In-process runs are sequential and also count SQL statements per request
+through an engine event. Gunicorn runs spread each endpoint's requests over
+a thread pool of keep-alive HTTP connections and sample the workers' RSS
+from /proc. Both record the bytes received per request and the CPU time the
+server spent on it (in-process, that includes the test client).
+"""
+
+import http.client
+import json
+import os
+import random
+import resource
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import compress
+
+from benchmarks import BACKEND_DIR
+from benchmarks.workload import Context, endpoints
+
+WARMUP_REQUESTS = 3
+
+
+def load_app(database_url, cache=False):
+    """Import the backend app against database_url and migrate the database."""
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['CACHE_ENABLED'] = '1' if cache else '0'
+    # The workload is one client writing far faster than any real one.
+    os.environ['RATE_LIMIT_ENABLED'] = '0'
+    from app import app, upgrade_database
+    with app.app_context():
+        upgrade_database()
+    return app
+
+
+class Transport:
+    """request() returns (status, body as received, its Content-Encoding)."""
+
+    def __init__(self, accept_encoding=None):
+        self.headers = {'Accept-Encoding': accept_encoding} if accept_encoding else {}
+
+    @staticmethod
+    def json(body, encoding=None):
+        return json.loads(compress.decompress(body, encoding))
+
+
+class ClientTransport(Transport):
+    def __init__(self, app, accept_encoding=None):
+        super().__init__(accept_encoding)
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None):
+        response = self.client.open(path, method=method, json=body, headers=self.headers)
+        return response.status_code, response.get_data(), response.headers.get('Content-Encoding')
+
+
+class HTTPTransport(Transport):
+    """Thread-safe: each thread keeps its own keep-alive connection."""
+
+    def __init__(self, host, port, accept_encoding=None):
+        super().__init__(accept_encoding)
+        self.host, self.port = host, port
+        self.local = threading.local()
+
+    def connection(self):
+        if getattr(self.local, 'connection', None) is None:
+            self.local.connection = http.client.HTTPConnection(self.host, self.port, timeout=120)
+        return self.local.connection
+
+    def request(self, method, path, body=None):
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = dict(self.headers, **({'Content-Type': 'application/json'} if payload is not None else {}))
+        for attempt in range(2):
+            connection = self.connection()
+            try:
+                connection.request(method, path, body=payload, headers=headers)
+                response = connection.getresponse()
+                return response.status, response.read(), response.getheader('Content-Encoding')
+            except (http.client.HTTPException, ConnectionError):
+                # The worker closed the keep-alive connection (e.g. max_requests); reconnect once.
+                connection.close()
+                self.local.connection = None
+                if attempt:
+                    raise
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def summarize(latencies, errors, elapsed, **extra):
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        **extra,
+    }
+
+
+def prepared_requests(endpoint, ctx, transport, count):
+    requests = []
+    for _ in range(count):
+        ctx.values = endpoint.prepare(ctx, transport) if endpoint.prepare else {}
+        requests.append(endpoint.build(ctx))
+    return requests
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux.
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def run_in_process(app, counts, requests_per_endpoint, seed=0, selected=None, accept_encoding=None, log=print):
+    from sqlalchemy import event
+
+    from config import db
+
+    transport = ClientTransport(app, accept_encoding)
+    statements = [0]
+
+    def count_statement(*args):
+        statements[0] += 1
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count_statement)
+
+    results = {}
+    try:
+        for endpoint in endpoints():
+            if selected and endpoint.name not in selected:
+                continue
+            ctx = Context(counts, random.Random(f'{seed}:{endpoint.name}'))
+            for request in prepared_requests(endpoint, ctx, transport, WARMUP_REQUESTS):
+                transport.request(request.method, request.path, request.body)
+            requests = prepared_requests(endpoint, ctx, transport, requests_per_endpoint)
+
+            latencies, errors, received = [], 0, 0
+            statements[0] = 0
+            started, cpu_started = time.perf_counter(), time.process_time()
+            for request in requests:
+                begin = time.perf_counter()
+                status, body, _ = transport.request(request.method, request.path, request.body)
+                latencies.append(time.perf_counter() - begin)
+                errors += status >= 400
+                received += len(body)
+            elapsed = time.perf_counter() - started
+            cpu = time.process_time() - cpu_started
+
+            results[endpoint.name] = summarize(
+                latencies, errors, elapsed,
+                response_bytes=round(received / len(requests)),
+                cpu_ms=round(cpu / len(requests) * 1000, 3),
+                sql_queries=round(statements[0] / len(requests), 2),
+                peak_rss_mb=peak_rss_mb(),
+            )
+            log(format_row(endpoint.name, results[endpoint.name]))
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_statement)
+    return results
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def child_pids(parent):
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as stat:
+                fields = stat.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == parent:
+            children.append(int(entry))
+    return children
+
+
+def cpu_seconds(pid):
+    """User plus system CPU time pid has used, from /proc/<pid>/stat."""
+    try:
+        with open(f'/proc/{pid}/stat') as stat:
+            fields = stat.read().rsplit(')', 1)[1].split()
+    except OSError:
+        return 0.0
+    # utime and stime are fields 14 and 15 of stat(5), in clock ticks.
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def private_mb(pid):
+    """Memory pid does not share with other processes (e.g. pages copied
+    from the gunicorn master on write), from /proc/<pid>/smaps_rollup."""
+    total = 0
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as smaps:
+            for line in smaps:
+                if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                    total += int(line.split()[1])
+    except OSError:
+        pass
+    return total / 1024
+
+
+def rss_mb(pid, field='VmRSS'):
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+class Gunicorn:
+    """A gunicorn process serving backend/app.py on a free local port."""
+
+    def __init__(self, database_url, workers, threads, worker_class='gthread', cache=False, accept_encoding=None,
+                 preload=True):
+        self.port = free_port()
+        env = dict(os.environ, DATABASE_URL=database_url, CACHE_ENABLED='1' if cache else '0', RATE_LIMIT_ENABLED='0',
+                   WEB_CONCURRENCY=str(workers), GUNICORN_THREADS=str(threads),
+                   GUNICORN_WORKER_CLASS=worker_class, GUNICORN_PRELOAD='1' if preload else '0', PORT=str(self.port))
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{self.port}',
+             '--access-logfile', '/dev/null', '--max-requests', '0', 'app:app'],
+            cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+        self.transport = HTTPTransport('127.0.0.1', self.port, accept_encoding)
+
+    def wait_ready(self, timeout=60):
+        # Once the master listens, a request waits in the accept queue until
+        # a worker has booted, so this returns as soon as one can serve.
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError('gunicorn exited:\n' + self.process.stderr.read().decode(errors='replace'))
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=timeout)
+                connection.request('GET', '/health')
+                if connection.getresponse().status == 200:
+                    return
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError('gunicorn did not become ready')
+
+    def worker_pids(self):
+        return child_pids(self.process.pid)
+
+    def worker_cpu_seconds(self):
+        return sum(cpu_seconds(pid) for pid in child_pids(self.process.pid))
+
+    def worker_peak_rss_mb(self):
+        return round(max((rss_mb(pid, 'VmHWM') for pid in child_pids(self.process.pid)), default=0.0), 1)
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def run_gunicorn(server, counts, requests_per_endpoint, concurrency, seed=0, selected=None, log=print):
+    transport = server.transport
+    results = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for endpoint in endpoints():
+            if selected and endpoint.name not in selected:
+                continue
+            ctx = Context(counts, random.Random(f'{seed}:{endpoint.name}'))
+            for request in prepared_requests(endpoint, ctx, transport, WARMUP_REQUESTS):
+                transport.request(request.method, request.path, request.body)
+            requests = prepared_requests(endpoint, ctx, transport, requests_per_endpoint)
+
+            def timed(request):
+                begin = time.perf_counter()
+                status, body, _ = transport.request(request.method, request.path, request.body)
+                return time.perf_counter() - begin, status, len(body)
+
+            started, cpu_started = time.perf_counter(), server.worker_cpu_seconds()
+            outcomes = list(pool.map(timed, requests))
+            elapsed = time.perf_counter() - started
+            cpu = server.worker_cpu_seconds() - cpu_started
+
+            results[endpoint.name] = summarize(
+                [latency for latency, _, _ in outcomes],
+                sum(status >= 400 for _, status, _ in outcomes),
+                elapsed,
+                response_bytes=round(sum(size for _, _, size in outcomes) / len(outcomes)),
+                cpu_ms=round(cpu / len(outcomes) * 1000, 3),
+                sql_queries=None,
+                peak_rss_mb=server.worker_peak_rss_mb(),
+            )
+            log(format_row(endpoint.name, results[endpoint.name]))
+    return results
+
+
+def measure_startup(database_url, workers, threads, preload, recycles=5, log=print):
+    """Time gunicorn from launch to its first response, and from killing
+    every worker to the first response from their replacements (what a
+    crash or max_requests recycle costs), and measure each worker's private
+    memory after some traffic."""
+    started = time.perf_counter()
+    server = Gunicorn(database_url, workers, threads, preload=preload)
+    try:
+        server.wait_ready()
+        cold_start = time.perf_counter() - started
+        for _ in range(10 * workers):
+            for path in ('/health', '/api/shows/?limit=20', '/api/bands/1'):
+                server.transport.request('GET', path)
+        private = [private_mb(pid) for pid in server.worker_pids()]
+
+        recycle_times = []
+        for _ in range(recycles):
+            pids = server.worker_pids()
+            begin = time.perf_counter()
+            for pid in pids:
+                os.kill(pid, signal.SIGKILL)
+            server.wait_ready()
+            recycle_times.append(time.perf_counter() - begin)
+    finally:
+        server.stop()
+
+    result = {
+        'cold_start_ms': round(cold_start * 1000, 1),
+        'recycle_ms': round(percentile(recycle_times, 0.5) * 1000, 1),
+        'recycle_max_ms': round(max(recycle_times) * 1000, 1),
+        'worker_private_mb': round(sum(private) / len(private), 1),
+    }
+    log(f"{'preload' if preload else 'no preload':12} cold start {result['cold_start_ms']:8.1f}ms  "
+        f"recycle p50 {result['recycle_ms']:8.1f}ms  max {result['recycle_max_ms']:8.1f}ms  "
+        f"private {result['worker_private_mb']:6.1f}MB per worker")
+    return result
+
+
+def format_row(name, result):
+    sql = '-' if result['sql_queries'] is None else f"{result['sql_queries']:g}"
+    return (f"{name:28} p50 {result['p50_ms']:8.2f}ms  p95 {result['p95_ms']:8.2f}ms  p99 {result['p99_ms']:8.2f}ms  "
+            f"{result['throughput_rps']:8.1f} rps  sql {sql:>5}  {result['response_bytes']:8d}B  "
+            f"cpu {result['cpu_ms']:7.2f}ms  rss {result['peak_rss_mb']:7.1f}MB  errors {result['errors']}")
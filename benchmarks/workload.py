@@ -0,0 +1,165 @@
+"""The scripted workload: one Endpoint per route worth measuring.
+
+Each endpoint builds its requests from the dataset's row counts and a seeded
+random generator, so runs against the same data issue the same requests.
+Endpoints that destroy rows (DELETE) create their targets first through the
+API; that setup is not timed.
+"""
+
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Callable, Optional
+from urllib.parse import quote
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    body: object = None
+
+
+@dataclass
+class Endpoint:
+    name: str
+    build: Callable  # (ctx) -> Request
+    prepare: Optional[Callable] = None  # (ctx, transport) -> dict merged into ctx for build
+
+
+class Context:
+    def __init__(self, counts, rng):
+        self.counts = counts
+        self.rng = rng
+        self.serial = 0
+        self.values = {}
+
+    def id(self, table):
+        return self.rng.randint(1, self.counts[table])
+
+    def unique(self, prefix):
+        self.serial += 1
+        return f'{prefix} bench {self.rng.getrandbits(32):08x}{self.serial}'
+
+
+def get(path):
+    return lambda ctx: Request('GET', path)
+
+
+def get_entity(resource, table=None):
+    return lambda ctx: Request('GET', f'/api/{resource}/{ctx.id(table or resource)}')
+
+
+def get_related(resource, suffix):
+    return lambda ctx: Request('GET', f'/api/{resource}/{ctx.id(resource)}/{suffix}')
+
+
+def band_body(ctx):
+    return {'name': ctx.unique('Band'), 'genre': 'Rock', 'description': 'A band made by the benchmark suite', 'formed_year': 2020}
+
+
+def venue_body(ctx):
+    return {'name': ctx.unique('Venue'), 'city': 'Benchmark City', 'address': '1 Load Test Way', 'capacity': 500}
+
+
+def user_body(ctx):
+    name = ctx.unique('user').replace(' ', '_')
+    return {'username': name, 'email': f'{name}@example.com', 'first_name': 'Bench', 'last_name': 'Mark'}
+
+
+def show_body(ctx):
+    return {
+        'title': ctx.unique('Show'),
+        'date': (date.today() + timedelta(days=ctx.rng.randint(1, 90))).isoformat(),
+        'time': '20:00',
+        'ticket_price': 25.0,
+        'description': 'A show made by the benchmark suite',
+        'venue_id': ctx.id('venues'),
+    }
+
+
+def review_body(ctx):
+    return {'rating': ctx.rng.randint(1, 5), 'comment': 'Benchmark review comment', 'user_id': ctx.id('users'),
+            'show_id': ctx.id('shows')}
+
+
+def musician_body(ctx):
+    return {'name': ctx.unique('Musician'), 'instrument': 'Drums', 'bio': 'Benchmark bio', 'band_id': ctx.id('bands')}
+
+
+BODIES = {
+    'shows': show_body,
+    'bands': band_body,
+    'venues': venue_body,
+    'users': user_body,
+    'reviews': review_body,
+    'musicians': musician_body,
+}
+
+PATCHES = {
+    'shows': lambda ctx: {'ticket_price': float(ctx.rng.randint(10, 90))},
+    'bands': lambda ctx: {'genre': ctx.rng.choice(['Rock', 'Jazz', 'Folk'])},
+    'venues': lambda ctx: {'capacity': ctx.rng.randint(100, 5000)},
+    'users': lambda ctx: {'first_name': ctx.rng.choice(['Ada', 'Grace', 'Linus'])},
+    'reviews': lambda ctx: {'rating': ctx.rng.randint(1, 5)},
+    'musicians': lambda ctx: {'instrument': ctx.rng.choice(['Bass', 'Guitar', 'Vocals'])},
+}
+
+
+def create(resource):
+    return lambda ctx: Request('POST', f'/api/{resource}/', BODIES[resource](ctx))
+
+
+def patch(resource):
+    return lambda ctx: Request('PATCH', f'/api/{resource}/{ctx.id(resource)}', PATCHES[resource](ctx))
+
+
+def delete(resource):
+    # Each request deletes a row its prepare step just created.
+    def prepare(ctx, transport):
+        status, body, encoding = transport.request('POST', f'/api/{resource}/', BODIES[resource](ctx))
+        if status != 201:
+            raise RuntimeError(f'Could not create a {resource} row to delete: {status} {body[:200]!r}')
+        return {'target': transport.json(body, encoding)['id']}
+    return Endpoint(f'{resource}.delete', lambda ctx: Request('DELETE', f"/api/{resource}/{ctx.values['target']}"),
+                    prepare)
+
+
+def batch_create(resource, size=100):
+    return lambda ctx: Request('POST', f'/api/{resource}/batch', [BODIES[resource](ctx) for _ in range(size)])
+
+
+def search(ctx):
+    return Request('GET', f"/api/search/?q={quote(ctx.rng.choice(SEARCH_TERMS))}")
+
+
+SEARCH_TERMS = ['rock', 'jazz night', 'guitar', 'live', 'hall', 'fest', 'drum', 'tour']
+
+
+def endpoints():
+    workload = [
+        Endpoint('health', get('/health')),
+        Endpoint('search', search),
+    ]
+    for resource in BODIES:
+        workload += [
+            Endpoint(f'{resource}.list', get(f'/api/{resource}/?limit=50')),
+            Endpoint(f'{resource}.list_fields', get(f'/api/{resource}/?limit=200&fields=id,created_at')),
+            Endpoint(f'{resource}.detail', get_entity(resource)),
+            Endpoint(f'{resource}.create', create(resource)),
+            Endpoint(f'{resource}.update', patch(resource)),
+            delete(resource),
+        ]
+    workload += [
+        Endpoint('shows.upcoming', get('/api/shows/upcoming?limit=50')),
+        Endpoint('shows.top', get('/api/shows/top')),
+        Endpoint('bands.top', get('/api/bands/top')),
+        Endpoint('bands.similar', get_related('bands', 'similar?fields=name,genre')),
+        Endpoint('shows.recommended', get_related('shows', 'recommended?fields=title,date,venue.name')),
+        Endpoint('bands.batch_create', batch_create('bands')),
+        Endpoint('reviews.batch_create', batch_create('reviews')),
+        Endpoint('analytics.shows_per_city', get('/api/analytics/shows-per-city')),
+        Endpoint('analytics.ticket_prices', get('/api/analytics/ticket-prices')),
+        Endpoint('analytics.band_ratings', get('/api/analytics/band-ratings')),
+        Endpoint('analytics.gross', get('/api/analytics/gross?by=venue')),
+    ]
+    return workload
@@ -6,11 +6,13 @@ import apiWithFallback from '../../utils/apiWithFallback';
 const BandDetail = () => {
   const { id } = useParams();
   const [band, setBand] = useState(null);
+  const [similarBands, setSimilarBands] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
   useEffect(() => {
     fetchBandDetails();
+    apiWithFallback.getSimilarBands(id).then(setSimilarBands);
   }, [id]);
 
   const fetchBandDetails = async () => {
@@ -180,6 +182,29 @@ const BandDetail = () => {
             </div>
           )}
 
+          {/* Similar Bands */}
+          {similarBands.length > 0 && (
+            <div className="card p-6">
+              <h3 className="text-xl font-bold text-gray-900 mb-4 flex items-center">
+                <span className="mr-3">🤝</span>
+                Often on the Bill With
+              </h3>
+              <div className="space-y-3">
+                {similarBands.map(similar => (
+                  <Link key={similar.id} to={`/bands/${similar.id}`} className="flex items-center space-x-3 p-3 bg-gray-50 rounded-lg hover:bg-gray-100 transition-colors">
+                    <div className="text-2xl">{getGenreEmoji(similar.genre)}</div>
+                    <div>
+                      <div className="font-semibold text-gray-900">{similar.name}</div>
+                      <div className="text-sm text-gray-600">
+                        {similar.genre} · {similar.shared_shows} shared {similar.shared_shows === 1 ? 'show' : 'shows'}
+                      </div>
+                    </div>
+                  </Link>
+                ))}
+              </div>
+            </div>
+          )}
+
           {/* Actions */}
           <div className="card p-6">
             <h3 className="text-xl font-bold text-gray-900 mb-4 flex items-center">
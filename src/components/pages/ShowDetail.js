@@ -7,11 +7,13 @@ const ShowDetail = () => {
   const { id } = useParams();
   const [show, setShow] = useState(null);
   const [reviews, setReviews] = useState([]);
+  const [recommendedShows, setRecommendedShows] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
   useEffect(() => {
     fetchShowDetails();
+    apiWithFallback.getRecommendedShows(id).then(setRecommendedShows);
   }, [id]);
 
   const fetchShowDetails = async () => {
@@ -267,6 +269,26 @@ const ShowDetail = () => {
             </div>
           </div>
 
+          {/* Recommended Shows */}
+          {recommendedShows.length > 0 && (
+            <div className="card p-6">
+              <h3 className="text-xl font-bold text-gray-900 mb-4 flex items-center">
+                <span className="mr-3">💜</span>
+                Fans Also Liked
+              </h3>
+              <div className="space-y-3">
+                {recommendedShows.map(recommended => (
+                  <Link key={recommended.id} to={`/shows/${recommended.id}`} className="block p-3 bg-gray-50 rounded-lg hover:bg-gray-100 transition-colors">
+                    <div className="font-semibold text-gray-900">{recommended.title}</div>
+                    <div className="text-sm text-gray-600">
+                      {recommended.venue?.name}{recommended.date && ` · ${new Date(recommended.date).toLocaleDateString()}`}
+                    </div>
+                  </Link>
+                ))}
+              </div>
+            </div>
+          )}
+
           {/* Actions */}
           <div className="card p-6">
             <h3 className="text-xl font-bold text-gray-900 mb-4 flex items-center">
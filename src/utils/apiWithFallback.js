@@ -121,6 +121,28 @@ const apiWithFallback = {
     }
   },
 
+  getSimilarBands: async (id) => {
+    try {
+      const response = await fetch(`${API_BASE_URL}/api/bands/${id}/similar?limit=5&fields=name,genre`);
+      if (!response.ok) throw new Error('Backend unavailable');
+      return await response.json();
+    } catch (error) {
+      console.log('No similar bands available');
+      return [];
+    }
+  },
+
+  getRecommendedShows: async (id) => {
+    try {
+      const response = await fetch(`${API_BASE_URL}/api/shows/${id}/recommended?limit=5&fields=title,date,venue.name`);
+      if (!response.ok) throw new Error('Backend unavailable');
+      return await response.json();
+    } catch (error) {
+      console.log('No recommended shows available');
+      return [];
+    }
+  },
+
   createBand: async (bandData) => {
     try {
       const response = await fetch(`${API_BASE_URL}/api/bands/`, {